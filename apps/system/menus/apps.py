@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class MenusConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "system.menus"
+
+    def ready(self):
+        from system.menus import routes
+
+        # 菜单、角色、授权变化时重新渲染异步路由
+        routes.connect()
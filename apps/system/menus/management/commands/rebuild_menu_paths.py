@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from system.menus.models import Menu
+from utils.tree import compute_paths
+
+
+class Command(BaseCommand):
+    help = "按parentId重新计算所有菜单的树路径(tree_path)，如：manage.py rebuild_menu_paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="每批更新的记录数")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rows = list(Menu.objects.values_list("pk", "parentId_id", "tree_path"))
+            paths, unreachable = compute_paths([(pk, parent_id) for pk, parent_id, tree_path in rows])
+            changed = [
+                Menu(pk=pk, tree_path=paths.get(pk, ""))
+                for pk, parent_id, tree_path in rows
+                if paths.get(pk, "") != tree_path
+            ]
+            Menu.objects.bulk_update(changed, ["tree_path"], batch_size=options["batch_size"])
+        if unreachable:
+            self.stderr.write(self.style.WARNING(f"以下菜单的上级链路成环，路径已清空: {sorted(unreachable)}"))
+        self.stdout.write(self.style.SUCCESS(f"共{len(rows)}个菜单，更新了{len(changed)}个路径"))
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-18 08:07
+
+from django.db import migrations, models
+
+from utils.tree import compute_paths
+
+
+def fill_tree_path(apps, schema_editor):
+    Menu = apps.get_model("menus", "Menu")
+    paths, unreachable = compute_paths(list(Menu.objects.values_list("pk", "parentId_id")))
+    menus = [Menu(pk=pk, tree_path=path) for pk, path in paths.items()]
+    Menu.objects.bulk_update(menus, ["tree_path"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0005_rename_parent_menu_parentid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menu',
+            name='tree_path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255, verbose_name='树路径'),
+        ),
+        migrations.RunPython(fill_tree_path, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,13 @@
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from django.utils.translation import gettext_lazy as _
 
 
 class Menu(models.Model):
+    # 按钮类型的菜单不生成路由，编码作为上级菜单的按钮权限(meta.auths)
+    TYPE_BUTTON = "BUTTON"
+
     name = models.CharField(max_length=100, verbose_name=_("名称"))
     code = models.CharField(max_length=100, unique=True, verbose_name=_("编码"))
     type = models.CharField(max_length=50, verbose_name=_("类型"))
@@ -17,6 +22,50 @@ class Menu(models.Model):
     enable = models.BooleanField(default=True, verbose_name=_("启用"))
     layout = models.CharField(null=True, blank=True, max_length=50, verbose_name=_("布局"))
     keepAlive = models.BooleanField(default=False, verbose_name=_("KeepAlive"))
+    # 物化路径，由上级到自身的id组成，如"/1/5/12/"，子树查询用前缀匹配
+    tree_path = models.CharField(max_length=255, default="", db_index=True, editable=False, verbose_name=_("树路径"))
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        """
+        保存后维护自身和下级的路径；更换上级时整个子树的路径一条UPDATE改写
+        上级和自身当前的路径从数据库读取，不依赖内存中可能过期的值
+        """
+        paths = dict(Menu.objects.filter(pk__in=[self.parentId_id, self.pk]).values_list("pk", "tree_path"))
+        parent_path = paths[self.parentId_id] if self.parentId_id is not None else "/"
+        old_path = paths.get(self.pk, "")
+        if old_path and parent_path.startswith(old_path):
+            raise ValueError("不能把菜单移动到自身或下级菜单下")
+        super().save(*args, **kwargs)
+        new_path = f"{parent_path}{self.pk}/"
+        if old_path == new_path:
+            self.tree_path = new_path
+            return
+        if old_path:
+            Menu.objects.filter(tree_path__startswith=old_path).update(
+                tree_path=Concat(Value(new_path), Substr("tree_path", len(old_path) + 1))
+            )
+        else:
+            Menu.objects.filter(pk=self.pk).update(tree_path=new_path)
+        self.tree_path = new_path
+
+    def get_ancestor_ids(self):
+        return [int(pk) for pk in self.tree_path.strip("/").split("/")[:-1]]
+
+    def get_ancestors(self):
+        """
+        上级菜单，由顶层到直接上级，按主键一次查询
+        """
+        ancestors = Menu.objects.in_bulk(self.get_ancestor_ids())
+        return [ancestors[pk] for pk in self.get_ancestor_ids() if pk in ancestors]
+
+    def get_descendants(self, include_self=False):
+        queryset = Menu.objects.filter(tree_path__startswith=self.tree_path)
+        return queryset if include_self else queryset.exclude(pk=self.pk)
+
+    def is_ancestor_of(self, other, include_self=False):
+        if not other.tree_path.startswith(self.tree_path):
+            return False
+        return include_self or other.pk != self.pk
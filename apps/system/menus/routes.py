@@ -0,0 +1,208 @@
+# 前端异步路由
+import gzip
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from system.menus.models import Menu
+from system.roles.models import Role
+from utils.base_models import soft_deleted
+from utils.lru import LRUCache
+
+ROUTES_VERSION_KEY = "menus:routes:version"
+# 超级管理员不按角色过滤
+ALL_MENUS = "*"
+
+# 每个角色组合渲染一次，进程内保存编码好的结果
+rendered_routes = LRUCache(maxsize=256, timeout=60 * 60)
+
+MENU_FIELDS = ("id", "name", "code", "type", "parentId_id", "path", "icon", "component", "order", "show", "keepAlive")
+
+
+def get_version():
+    return cache.get_or_set(ROUTES_VERSION_KEY, 1, None)
+
+
+def invalidate(*args, **kwargs):
+    # 菜单和授权变化很少，直接切换版本号，所有角色组合重新渲染
+    try:
+        cache.incr(ROUTES_VERSION_KEY)
+    except ValueError:
+        cache.set(ROUTES_VERSION_KEY, 1, None)
+
+
+def get_role_key(user):
+    """
+    用户的角色组合，认证用户快照上有role_codes，会话认证的用户按角色查询
+    """
+    if user.is_superuser:
+        return ALL_MENUS
+    role_codes = getattr(user, "role_codes", None)
+    if role_codes is None:
+        role_codes = user.roles.filter(enable=True).values_list("code", flat=True)
+    return ",".join(sorted(role_codes))
+
+
+def build_route(menu, children, auths):
+    route = {
+        "pk": menu["id"],
+        "name": menu["code"],
+        "rank": menu["order"],
+        "path": menu["path"] or "",
+        "component": menu["component"] or "",
+        "meta": {
+            "title": menu["name"],
+            "icon": menu["icon"] or "",
+            "showParent": False,
+            "showLink": menu["show"],
+            "extraIcon": "",
+            "keepAlive": menu["keepAlive"],
+            "frameSrc": "",
+            "frameLoading": False,
+            "transition": {"enterTransition": "", "leaveTransition": ""},
+            "hiddenTag": False,
+            "dynamicLevel": 0,
+            "auths": auths,
+        },
+        "parent": menu["parentId_id"],
+        "menu_type": 0 if children else 1,
+        "is_active": True,
+        "menu_type_display": "目录" if children else "菜单",
+        "model": [],
+        "field": [],
+    }
+    if children:
+        route["children"] = children
+    return route
+
+
+def build_routes(menus, granted_ids=None):
+    """
+    由启用的菜单构建路由树，granted_ids为None时不过滤
+    授权的菜单连同其上级目录一起返回，按钮归到上级菜单的meta.auths
+    """
+    by_id = {menu["id"]: menu for menu in menus}
+    children = {}
+    for menu in menus:
+        children.setdefault(menu["parentId_id"], []).append(menu)
+
+    visible = set(by_id)
+    if granted_ids is not None:
+        visible = set()
+        for menu_id in granted_ids:
+            # 上级被停用时by_id中找不到，上级成环时回到链路中，整条链路都不可见
+            chain = []
+            while menu_id is not None and menu_id not in visible:
+                menu = by_id.get(menu_id)
+                if menu is None or menu_id in chain:
+                    chain = []
+                    break
+                chain.append(menu_id)
+                menu_id = menu["parentId_id"]
+            visible.update(chain)
+
+    def build(parent_id):
+        routes = []
+        for menu in sorted(children.get(parent_id, ()), key=lambda item: (item["order"], item["id"])):
+            if menu["id"] not in visible or menu["type"] == Menu.TYPE_BUTTON:
+                continue
+            auths = [
+                child["code"]
+                for child in children.get(menu["id"], ())
+                if child["type"] == Menu.TYPE_BUTTON and child["id"] in visible
+            ]
+            routes.append(build_route(menu, build(menu["id"]), auths))
+        return routes
+
+    return build(None)
+
+
+def get_enabled_menus():
+    """
+    停用菜单的下级也不可见，上级成环的菜单到不了根节点，同样不可见
+    """
+    menus = list(Menu.objects.filter(enable=True).values(*MENU_FIELDS))
+    enabled = {menu["id"] for menu in menus}
+    by_id = {menu["id"]: menu for menu in menus}
+
+    def is_reachable(menu):
+        seen = {menu["id"]}
+        while menu["parentId_id"] is not None:
+            if menu["parentId_id"] not in enabled or menu["parentId_id"] in seen:
+                return False
+            seen.add(menu["parentId_id"])
+            menu = by_id[menu["parentId_id"]]
+        return True
+
+    return [menu for menu in menus if is_reachable(menu)]
+
+
+def render_routes(role_key):
+    """
+    两条查询：菜单、角色的授权；返回编码好的响应体、gzip压缩后的响应体和各自的ETag
+    两种编码的响应体字节不同，强ETag也要区分，gzip的ETag带-gzip后缀
+    """
+    granted_ids = None
+    if role_key == "":
+        granted_ids = set()
+    elif role_key != ALL_MENUS:
+        grants = Role.menus.through.objects.filter(
+            role__code__in=role_key.split(","), role__enable=True, role__is_deleted=False
+        )
+        granted_ids = set(grants.values_list("menu_id", flat=True))
+    body = json.dumps(
+        {"data": build_routes(get_enabled_menus(), granted_ids)}, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+    digest = hashlib.sha1(body).hexdigest()
+    # mtime固定为0，同样的内容压缩结果相同
+    return {
+        "body": body,
+        "etag": '"%s"' % digest,
+        "gzip": gzip.compress(body, mtime=0),
+        "gzip_etag": '"%s-gzip"' % digest,
+    }
+
+
+def accepts_gzip(accept_encoding):
+    """
+    按Accept-Encoding的q值判断客户端是否接受gzip，gzip;q=0表示拒绝，未列出gzip时按*处理
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def get_rendered_routes(user):
+    role_key = get_role_key(user)
+    key = (get_version(), role_key)
+    rendered = rendered_routes.get(key)
+    if rendered is None:
+        rendered = render_routes(role_key)
+        rendered_routes.set(key, rendered)
+    return rendered
+
+
+def handle_soft_deleted(sender, **kwargs):
+    if sender is Role:
+        invalidate()
+
+
+def connect():
+    post_save.connect(invalidate, sender=Menu, dispatch_uid="menu-routes:menu-save")
+    post_delete.connect(invalidate, sender=Menu, dispatch_uid="menu-routes:menu-delete")
+    post_save.connect(invalidate, sender=Role, dispatch_uid="menu-routes:role-save")
+    post_delete.connect(invalidate, sender=Role, dispatch_uid="menu-routes:role-delete")
+    m2m_changed.connect(invalidate, sender=Role.menus.through, dispatch_uid="menu-routes:grants")
+    soft_deleted.connect(handle_soft_deleted, dispatch_uid="menu-routes:soft-deleted")
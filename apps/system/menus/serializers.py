@@ -1,39 +1,56 @@
+from django.db import transaction
 from rest_framework import serializers
+
 from .models import Menu
+from .tree import MenuTreeUpsert, get_subtree
+
+
+class MenuChildrenField(serializers.Field):
+    """
+    读取时一次查询返回整个子树，写入时原样交给MenuTreeUpsert逐层校验
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "*"
+        super().__init__(**kwargs)
+
+    def to_representation(self, menu):
+        return get_subtree(menu)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError("children必须是列表")
+        return {"children": data}
 
-class RecursiveField(serializers.Serializer):
-    def to_representation(self, value):
-        serializer = self.parent.parent.__class__(value, context=self.context)
-        return serializer.data
 
 class MenuSerializer(serializers.ModelSerializer):
-    children = RecursiveField(many=True, required=False)
+    children = MenuChildrenField(required=False)
 
     class Meta:
         model = Menu
         fields = "__all__"
 
+    def validate_parentId(self, value):
+        # 路径前缀判断，不需要逐级向上查询
+        if value is not None and self.instance is not None and self.instance.is_ancestor_of(value, include_self=True):
+            raise serializers.ValidationError("不能把菜单移动到自身或下级菜单下")
+        return value
+
     def create(self, validated_data):
-        children_data = validated_data.pop("children", [])
-        menu = Menu.objects.create(**validated_data)
-        for child_data in children_data:
-            Menu.objects.create(parent=menu, **child_data)
+        children_data = validated_data.pop("children", None)
+        with transaction.atomic():
+            menu = Menu.objects.create(**validated_data)
+            if children_data:
+                MenuTreeUpsert(menu).run(children_data)
         return menu
 
     def update(self, instance, validated_data):
+        # 传了children时以传入的为准，增删改整个子树
         children_data = validated_data.pop("children", None)
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-
-        if children_data:
-            for child_data in children_data:
-                child_id = child_data.get("id")
-                if child_id:
-                    child = Menu.objects.filter(id=child_id).first()
-                    if child:
-                        for child_attr, child_value in child_data.items():
-                            setattr(child, child_attr, child_value)
-                        child.save()
-
-        instance.save()
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+            if children_data is not None:
+                MenuTreeUpsert(instance).run(children_data)
         return instance
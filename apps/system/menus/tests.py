@@ -1 +1,315 @@
-# Create your tests here.
+import gzip
+import json
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from system.menus.models import Menu
+from system.menus.routes import rendered_routes
+from system.roles.models import Role
+from system.users.authentication import user_cache
+from system.users.tokens import RevocableRefreshToken
+
+
+class AsyncRoutesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        rendered_routes.clear()
+        self.client = APIClient()
+        self.system = Menu.objects.create(name='系统管理', code='system', type='MENU', path='/system', order=1)
+        self.users = Menu.objects.create(
+            name='用户管理', code='SystemUser', type='MENU', parentId=self.system, path='/system/user', order=2
+        )
+        self.add_user = Menu.objects.create(name='新增', code='user:add', type='BUTTON', parentId=self.users)
+        self.roles = Menu.objects.create(
+            name='角色管理', code='SystemRole', type='MENU', parentId=self.system, path='/system/role', order=3
+        )
+        self.logs = Menu.objects.create(name='日志', code='logs', type='MENU', path='/logs', order=4, enable=False)
+        self.role = Role.objects.create(name='用户管理员', code='USER_ADMIN')
+        self.role.menus.set([self.users, self.add_user])
+        self.user = get_user_model().objects.create_user(username='router', password='12345')
+        self.user.roles.add(self.role)
+        token = RevocableRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get_routes(self, **extra):
+        return self.client.get(reverse('async-routes'), **extra)
+
+    def test_routes_follow_role_grants(self):
+        response = self.get_routes()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        routes = json.loads(response.content)['data']
+        self.assertEqual([route['name'] for route in routes], ['system'])
+        children = routes[0]['children']
+        self.assertEqual([route['name'] for route in children], ['SystemUser'])
+        self.assertEqual(children[0]['meta']['auths'], ['user:add'])
+
+        response = self.client.put(
+            reverse('role-menus', args=[self.role.pk]), {'menuIds': [self.roles.pk, self.logs.pk]}, format='json'
+        )
+        self.assertEqual(response.data['data']['menuIds'], [self.roles.pk, self.logs.pk])
+        routes = json.loads(self.get_routes().content)['data']
+        self.assertEqual([route['name'] for route in routes[0]['children']], ['SystemRole'])
+
+    def test_superuser_sees_all_enabled_menus(self):
+        root = get_user_model().objects.create_superuser('root', mobile='1', password='1')
+        self.client.force_authenticate(user=root)
+        routes = json.loads(self.get_routes().content)['data']
+        self.assertEqual([route['name'] for route in routes], ['system'])
+        self.assertEqual([route['name'] for route in routes[0]['children']], ['SystemUser', 'SystemRole'])
+
+    def test_rendered_once_with_etag_and_gzip(self):
+        first = self.get_routes()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get_routes(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), first.content)
+
+        response = self.get_routes(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # 两种编码的响应体不同，ETag也不同
+        gzipped = self.get_routes(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotEqual(gzipped['ETag'], first['ETag'])
+        self.assertIn('Accept-Encoding', gzipped['Vary'])
+        response = self.get_routes(HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.get_routes(HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=gzipped['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        for accept_encoding in ('gzip;q=0, deflate', 'identity', '*;q=0', 'br, *;q=0'):
+            response = self.get_routes(HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertFalse(response.has_header('Content-Encoding'), accept_encoding)
+            self.assertEqual(response.content, first.content)
+        for accept_encoding in ('GZIP;q=0.5', 'br, *', 'gzip ; q=1.0, *;q=0'):
+            response = self.get_routes(HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertEqual(response['Content-Encoding'], 'gzip', accept_encoding)
+
+        self.users.name = '用户'
+        self.users.save()
+        response = self.get_routes(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_parent_cycle_is_not_visible(self):
+        # 绕过保存时的校验写入成环的上级
+        Menu.objects.filter(pk=self.system.pk).update(parentId=self.users)
+        self.role.menus.add(self.roles)
+        self.assertEqual(json.loads(self.get_routes().content)['data'], [])
+        root = get_user_model().objects.create_superuser('root', mobile='1', password='1')
+        self.client.force_authenticate(user=root)
+        self.assertEqual(json.loads(self.get_routes().content)['data'], [])
+
+    def test_existing_roles_are_granted_existing_menus(self):
+        grant_existing_menus = import_module('system.roles.migrations.0008_grant_existing_menus').grant_existing_menus
+        other = Role.objects.create(name='其它', code='OTHER')
+        grant_existing_menus(apps, None)
+        self.assertEqual(other.menus.count(), Menu.objects.count())
+        self.assertEqual(self.role.menus.count(), Menu.objects.count())
+
+
+class MenuTreeTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=get_user_model().objects.create_user(username='menus', password='12345'))
+        parents = [None]
+        # 5层，每层3个节点挂在上一层的第一个节点下
+        for level in range(5):
+            menus = [
+                Menu.objects.create(
+                    name=f'm{level}{i}', code=f'm{level}{i}', type='MENU', parentId=parents[0], order=-i
+                )
+                for i in range(3)
+            ]
+            parents = list(reversed(menus))
+        Menu.objects.create(name='off', code='off', type='MENU', enable=False)
+
+    def get_tree(self, **params):
+        response = self.client.get(reverse('menu-tree'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['data']
+
+    def test_tree_is_single_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            tree = self.get_tree()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([node['code'] for node in tree], ['m02', 'm01', 'm00'])
+        self.assertEqual(tree[2]['children'], [])
+        node, levels = tree[0], 1
+        while node['children']:
+            node, levels = node['children'][0], levels + 1
+        self.assertEqual(levels, 5)
+        self.assertEqual(set(tree[0]), {f.name for f in Menu._meta.concrete_fields} | {'children'})
+
+    def test_root_and_depth(self):
+        root = Menu.objects.get(code='m12')
+        tree = self.get_tree(root=root.pk, depth=2)
+        self.assertEqual([node['code'] for node in tree], ['m12'])
+        self.assertEqual([node['code'] for node in tree[0]['children']], ['m22', 'm21', 'm20'])
+        self.assertEqual(tree[0]['children'][0]['children'], [])
+
+        response = self.client.get(reverse('menu-tree'), {'root': Menu.objects.get(code='off').pk})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('menu-tree'), {'depth': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MenuTreePathTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=get_user_model().objects.create_user(username='paths', password='12345'))
+        self.a = Menu.objects.create(name='a', code='a', type='MENU')
+        self.b = Menu.objects.create(name='b', code='b', type='MENU', parentId=self.a)
+        self.c = Menu.objects.create(name='c', code='c', type='MENU', parentId=self.b)
+        self.d = Menu.objects.create(name='d', code='d', type='MENU')
+
+    def test_paths_follow_moves(self):
+        self.assertEqual(self.c.tree_path, f'/{self.a.pk}/{self.b.pk}/{self.c.pk}/')
+        self.b.parentId = self.d
+        self.b.save()
+        self.c.refresh_from_db()
+        self.assertEqual(self.c.tree_path, f'/{self.d.pk}/{self.b.pk}/{self.c.pk}/')
+        self.assertEqual(list(self.d.get_descendants().order_by('pk')), [self.b, self.c])
+        self.assertEqual(self.c.get_ancestors(), [self.d, self.b])
+
+    def test_cycle_is_rejected(self):
+        response = self.client.patch(
+            reverse('menu-detail', args=[self.a.pk]), {'parentId': self.c.pk}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.a.parentId = self.c
+        with self.assertRaises(ValueError):
+            self.a.save()
+
+    def test_rebuild_command(self):
+        Menu.objects.update(tree_path='')
+        call_command('rebuild_menu_paths', stdout=StringIO())
+        self.c.refresh_from_db()
+        self.assertEqual(self.c.tree_path, f'/{self.a.pk}/{self.b.pk}/{self.c.pk}/')
+
+
+class MenuTreeUpsertTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=get_user_model().objects.create_user(username='upsert', password='12345'))
+
+    def make_tree(self, width):
+        return {
+            'name': 'root', 'code': f'root{width}', 'type': 'MENU',
+            'children': [
+                {
+                    'name': f'a{i}', 'code': f'{width}a{i}', 'type': 'MENU', 'order': i,
+                    'children': [
+                        {'name': f'b{i}{j}', 'code': f'{width}b{i}{j}', 'type': 'BUTTON'} for j in range(width)
+                    ],
+                }
+                for i in range(width)
+            ],
+        }
+
+    def create(self, payload):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('menu-list'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data['data'], len(ctx.captured_queries)
+
+    def test_create_queries_do_not_grow_with_tree_size(self):
+        small, small_queries = self.create(self.make_tree(2))
+        large, large_queries = self.create(self.make_tree(6))
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(len(large['children']), 6)
+        self.assertEqual(len(large['children'][5]['children']), 6)
+        leaf = Menu.objects.get(code='6b53')
+        self.assertEqual(leaf.tree_path, f"/{large['id']}/{large['children'][5]['id']}/{leaf.pk}/")
+
+    def test_update_diffs_subtree(self):
+        root, _ = self.create(self.make_tree(2))
+        a0, a1 = root['children']
+        payload = {
+            'name': 'root', 'code': 'root2', 'type': 'MENU',
+            'children': [
+                # a1改名并排到前面，a0的下级不传保持不变
+                {'id': a1['id'], 'name': 'a1*', 'code': a1['code'], 'type': 'MENU', 'order': -1, 'children': [
+                    # 把a0的一个按钮移动到a1下
+                    {'id': a0['children'][0]['id'], 'name': 'moved', 'code': 'moved', 'type': 'BUTTON'},
+                    {'name': 'new', 'code': 'new', 'type': 'BUTTON'},
+                ]},
+                {'id': a0['id'], 'name': 'a0', 'code': a0['code'], 'type': 'MENU'},
+            ],
+        }
+        response = self.client.put(reverse('menu-detail', args=[root['id']]), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        children = response.data['data']['children']
+        self.assertEqual([child['name'] for child in children], ['a1*', 'a0'])
+        self.assertEqual([child['code'] for child in children[0]['children']], ['moved', 'new'])
+        # a1原有的按钮不在数据中，已删除；a0只剩没被移动的按钮
+        self.assertFalse(Menu.objects.filter(code__in=[b['code'] for b in a1['children']]).exists())
+        self.assertEqual([child['code'] for child in children[1]['children']], [a0['children'][1]['code']])
+        moved = Menu.objects.get(code='moved')
+        self.assertEqual(moved.tree_path, f"/{root['id']}/{a1['id']}/{moved.pk}/")
+
+    def test_duplicate_codes_are_rejected(self):
+        payload = self.make_tree(2)
+        payload['children'][1]['children'][0]['code'] = payload['children'][0]['code']
+        response = self.client.post(reverse('menu-list'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Menu.objects.exists())
+
+    def test_move_out_of_moved_subtree(self):
+        root, _ = self.create(self.make_tree(2))
+        a0, a1 = root['children']
+        b00, b01 = a0['children']
+        b10, b11 = a1['children']
+        # b10下有一个按钮，不在数据中，跟随b10移动
+        leaf = Menu.objects.create(name='leaf', code='leaf', type='BUTTON', parentId_id=b10['id'])
+        payload = {
+            'name': 'root', 'code': 'root2', 'type': 'MENU',
+            'children': [
+                {'id': a0['id'], 'name': 'a0', 'code': a0['code'], 'type': 'MENU', 'children': [
+                    # a1连同原有下级移动到a0下，其中的b10再移动到b00下
+                    {'id': a1['id'], 'name': 'a1', 'code': a1['code'], 'type': 'MENU'},
+                    {'id': b00['id'], 'name': 'b00', 'code': b00['code'], 'type': 'MENU', 'children': [
+                        {'id': b10['id'], 'name': 'b10', 'code': b10['code'], 'type': 'MENU'},
+                    ]},
+                    {'id': b01['id'], 'name': 'b01', 'code': b01['code'], 'type': 'BUTTON'},
+                ]},
+            ],
+        }
+        response = self.client.put(reverse('menu-detail', args=[root['id']]), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        paths = dict(Menu.objects.values_list('pk', 'tree_path'))
+        prefix = f"/{root['id']}/{a0['id']}/"
+        self.assertEqual(paths[a1['id']], f"{prefix}{a1['id']}/")
+        self.assertEqual(paths[b11['id']], f"{prefix}{a1['id']}/{b11['id']}/")
+        self.assertEqual(paths[b10['id']], f"{prefix}{b00['id']}/{b10['id']}/")
+        self.assertEqual(paths[leaf.pk], f"{prefix}{b00['id']}/{b10['id']}/{leaf.pk}/")
+
+    def test_swap_codes(self):
+        root, _ = self.create(self.make_tree(2))
+        a0, a1 = root['children']
+        payload = {
+            'name': 'root', 'code': 'root2', 'type': 'MENU',
+            'children': [
+                {'id': a0['id'], 'name': 'a0', 'code': a1['code'], 'type': 'MENU'},
+                {'id': a1['id'], 'name': 'a1', 'code': a0['code'], 'type': 'MENU'},
+                # 新节点使用改名的按钮释放的编码
+                {'id': a1['children'][0]['id'], 'name': 'b', 'code': 'renamed', 'type': 'BUTTON'},
+                {'name': 'new', 'code': a1['children'][0]['code'], 'type': 'BUTTON'},
+            ],
+        }
+        response = self.client.put(reverse('menu-detail', args=[root['id']]), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(Menu.objects.get(pk=a0['id']).code, a1['code'])
+        self.assertEqual(Menu.objects.get(pk=a1['id']).code, a0['code'])
+        self.assertTrue(Menu.objects.filter(code=a1['children'][0]['code'], name='new').exists())
@@ -0,0 +1,207 @@
+# 菜单树的读取与批量写入
+import uuid
+from collections import Counter
+
+from django.db import transaction
+from rest_framework import serializers
+
+from system.menus import routes
+from system.menus.models import Menu
+from utils.tree import build_tree, compute_paths
+
+MENU_FIELDS = {field.name: field.attname for field in Menu._meta.concrete_fields}
+
+
+def menu_rows(queryset):
+    """
+    菜单转成与MenuSerializer字段一致的dict，parentId为上级的id
+    """
+    rows = queryset.order_by("order", "id").values(*MENU_FIELDS.values())
+    return [{name: row[attname] for name, attname in MENU_FIELDS.items()} for row in rows]
+
+
+def get_subtree(menu):
+    """
+    一次查询取出menu的全部下级，返回menu的children
+    """
+    tree = build_tree(menu_rows(menu.get_descendants(include_self=True)), root=menu.pk)
+    return tree[0]["children"] if tree else []
+
+
+class MenuNodeSerializer(serializers.ModelSerializer):
+    """
+    树中的一个节点，带id的更新已有菜单，不带id的新建；children为下一层的原始数据，逐层校验
+    code的唯一性按层批量校验
+    """
+
+    id = serializers.IntegerField(required=False)
+    children = serializers.ListField(child=serializers.DictField(), required=False)
+
+    class Meta:
+        model = Menu
+        exclude = ("parentId",)
+        extra_kwargs = {"code": {"validators": []}}
+
+
+class MenuTreeUpsert:
+    """
+    把嵌套的children写入root的子树，整个操作一个事务
+    - 先逐层校验并在内存中确定每个节点的上级，code冲突全部层一次查询
+    - 每层一次bulk_create，新节点的主键作为下一层的上级
+    - 所有tree_path在内存中算出最终值，连同其他字段一次bulk_update
+    - 带children的节点以传入的数据为准，未出现的原有下级连同子树删除；不带children的节点下级保持不变
+    - 带id的节点必须属于root的子树，可以在子树内移动
+    bulk操作不触发信号，结束后手动刷新异步路由缓存
+    """
+
+    batch_size = 500
+
+    def __init__(self, root):
+        self.root = root
+        self.existing = {menu.pk: menu for menu in root.get_descendants()}
+        self.seen_ids = set()
+        self.seen_codes = set()
+        self.replaced = [root]
+        self.created = []
+        self.updated = []
+        # 编码有变化的已有节点 {pk: 原编码}
+        self.renamed = {}
+
+    def run(self, children):
+        with transaction.atomic():
+            level = [(self.root, children)]
+            depth = 0
+            while level:
+                depth += 1
+                level = self.build_level(self.validate_level(level, depth))
+            self.check_conflicts()
+            self.stage_renamed()
+            for menus in self.created:
+                self.create(menus)
+            deleted = self.delete_missing()
+            self.write(deleted)
+        routes.invalidate()
+
+    def validate_level(self, level, depth):
+        nodes = []
+        for parent, children in level:
+            serializer = MenuNodeSerializer(data=children, many=True)
+            if not serializer.is_valid():
+                raise serializers.ValidationError({"children": {"depth": depth, "errors": serializer.errors}})
+            nodes.extend((parent, data) for data in serializer.validated_data)
+
+        codes = Counter(data["code"] for parent, data in nodes)
+        duplicated = {code for code, count in codes.items() if count > 1 or code in self.seen_codes}
+        if duplicated:
+            raise serializers.ValidationError({"children": f"菜单编码重复: {sorted(duplicated)}"})
+        self.seen_codes.update(codes)
+        return nodes
+
+    def build_level(self, nodes):
+        """
+        只修改内存中的对象，新节点的上级可能还没有主键，写入在全部层校验通过后进行
+        """
+        to_create, next_level = [], []
+        for parent, data in nodes:
+            children = data.pop("children", None)
+            pk = data.pop("id", None)
+            if pk is None:
+                menu = Menu(parentId=parent, **data)
+                to_create.append(menu)
+            else:
+                menu = self.existing.get(pk)
+                if menu is None or pk in self.seen_ids:
+                    raise serializers.ValidationError({"children": f"菜单{pk}不属于当前子树或重复出现"})
+                self.seen_ids.add(pk)
+                if data["code"] != menu.code:
+                    self.renamed[pk] = menu.code
+                for attr, value in data.items():
+                    setattr(menu, attr, value)
+                menu.parentId = parent
+                self.updated.append(menu)
+            if children is not None:
+                self.replaced.append(menu)
+                next_level.append((menu, children))
+        if to_create:
+            self.created.append(to_create)
+        return next_level
+
+    def check_conflicts(self):
+        """
+        数据中的编码不能被子树之外或本次要删除的菜单占用，本次出现的已有菜单之间可以互换编码
+        """
+        conflicts = Menu.objects.filter(code__in=self.seen_codes).exclude(pk__in=self.seen_ids)
+        duplicated = set(conflicts.values_list("code", flat=True))
+        if duplicated:
+            raise serializers.ValidationError({"children": f"菜单编码重复: {sorted(duplicated)}"})
+
+    def stage_renamed(self):
+        """
+        互换编码时，逐行更新的唯一约束会在中途冲突；改名的节点先换成临时编码释放原编码
+        """
+        if not self.renamed:
+            return
+        staged = [Menu(pk=pk, code=f"~{uuid.uuid4().hex}") for pk in self.renamed]
+        Menu.objects.bulk_update(staged, ["code"], batch_size=self.batch_size)
+
+    def create(self, menus):
+        # tree_path在write中与其他节点一起写入
+        Menu.objects.bulk_create(menus, batch_size=self.batch_size)
+        # MySQL的bulk_create不回填主键，按唯一的code补查
+        if menus[0].pk is None:
+            pks = dict(Menu.objects.filter(code__in=[menu.code for menu in menus]).values_list("code", "pk"))
+            for menu in menus:
+                menu.pk = pks[menu.code]
+
+    def delete_missing(self):
+        """
+        带children的节点下，没有出现在数据中的原有下级连同子树删除，已移动到别处的节点保留
+        返回删除的主键
+        """
+        kept_parents = {menu.pk for menu in self.replaced}
+        deleted = {
+            menu.pk
+            for menu in self.existing.values()
+            if menu.pk not in self.seen_ids and menu.parentId_id in kept_parents
+        }
+        if not deleted:
+            return deleted
+        prefixes = [self.existing[pk].tree_path for pk in deleted]
+        # 被删除节点的下级，除非本次已移动到别处
+        deleted.update(
+            menu.pk
+            for menu in self.existing.values()
+            if menu.pk not in self.seen_ids and any(menu.tree_path.startswith(prefix) for prefix in prefixes)
+        )
+        Menu.objects.filter(pk__in=deleted).delete()
+        return deleted
+
+    def write(self, deleted):
+        """
+        按最终的上级关系算出子树内所有节点的路径，数据中的节点和路径有变化的其余下级一次写入
+        """
+        written = [menu for menus in self.created for menu in menus] + self.updated
+        pairs = [(self.root.pk, None)]
+        pairs.extend((menu.pk, menu.parentId.pk) for menu in written)
+        pairs.extend(
+            (menu.pk, menu.parentId_id)
+            for pk, menu in self.existing.items()
+            if pk not in self.seen_ids and pk not in deleted
+        )
+        # 数据本身是一棵树，不在数据中的节点上级不变，所有节点都能到达root
+        paths, _ = compute_paths(pairs)
+        # compute_paths以root为顶层，换成root的实际路径
+        prefix = self.root.tree_path
+        offset = len(f"/{self.root.pk}/")
+        for menu in written:
+            menu.tree_path = prefix + paths[menu.pk][offset:]
+        written_ids = {menu.pk for menu in written}
+        for pk, menu in self.existing.items():
+            if pk in written_ids or pk in deleted:
+                continue
+            tree_path = prefix + paths[pk][offset:]
+            if menu.tree_path != tree_path:
+                menu.tree_path = tree_path
+                written.append(menu)
+        fields = [name for name in MENU_FIELDS if name != "id"]
+        Menu.objects.bulk_update(written, fields, batch_size=self.batch_size)
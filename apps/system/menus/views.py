@@ -1,8 +1,16 @@
-from rest_framework import viewsets, status
+from rest_framework import serializers, viewsets, status
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 
 from system.menus.models import Menu
 from system.menus.serializers import MenuSerializer
+from system.menus.tree import menu_rows
+from utils.tree import build_tree
+
+
+class MenuTreeParamsSerializer(serializers.Serializer):
+    root = serializers.IntegerField(required=False)
+    depth = serializers.IntegerField(required=False, min_value=1)
 
 
 class MenuViewSet(viewsets.ModelViewSet):
@@ -10,13 +18,10 @@ class MenuViewSet(viewsets.ModelViewSet):
     serializer_class = MenuSerializer
 
     def create(self, request, *args, **kwargs):
-        children_data = request.data.pop("children", None)
+        # children由MenuSerializer按层批量写入
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        menu = serializer.save()
-        if children_data is not None:
-            for child_data in children_data:
-                Menu.objects.create(parent=menu, **child_data)
+        serializer.save()
         headers = self.get_success_headers(serializer.data)
         return Response(
             {"code": 0, "message": "OK", "data": serializer.data},
@@ -25,13 +30,30 @@ class MenuViewSet(viewsets.ModelViewSet):
         )
 
     def list(self, request, *args, **kwargs):
-        queryset = Menu.objects.filter(parentId=None)
-        serializer = self.get_serializer(queryset, many=True)
+        params = MenuTreeParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        tree = self.get_tree(**params.validated_data)
+        if tree is None:
+            raise NotFound()
         return Response(
-            {"code": 0, "message": "OK", "data": serializer.data},
+            {"code": 0, "message": "OK", "data": tree},
             status=status.HTTP_200_OK,
         )
 
+    @staticmethod
+    def get_tree(root=None, depth=None):
+        """
+        一次查询取出所有启用的菜单，在内存中按parentId组装，结构与MenuSerializer一致
+        """
+        queryset = Menu.objects.filter(enable=True)
+        if root is not None:
+            # 子树按路径前缀匹配，先取根节点路径，前缀是常量时能走tree_path索引
+            root_path = Menu.objects.filter(pk=root, enable=True).values_list("tree_path", flat=True).first()
+            if root_path is None:
+                return None
+            queryset = queryset.filter(tree_path__startswith=root_path)
+        return build_tree(menu_rows(queryset), root=root, depth=depth)
+
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop("partial", False)
         instance = self.get_object()
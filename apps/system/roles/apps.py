@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class RolesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "system.roles"
+
+    def ready(self):
+        from system.roles.models import role_trigram_index
+        from system.roles.permissions import permission_registry
+
+        # 保存时同步三元组索引
+        role_trigram_index.connect()
+        # 角色、角色权限、用户角色变化时重新编译权限
+        permission_registry.connect()
@@ -0,0 +1,96 @@
+# 角色成员批量维护
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+
+
+class RoleMembership:
+    """
+    按集合维护角色成员，差集在数据库中计算，直接批量写tb_users_roles
+    目标用户可以是用户ID列表，也可以是用户查询集(按过滤条件)；每批chunk_size行，整个操作一个事务
+    批量写入不会触发m2m_changed，这里按批补发post_add/post_remove，缓存等监听方照常失效
+    """
+
+    chunk_size = 5000
+    # 一次请求最多传入的用户ID数，replace时这些ID整体作为NOT IN的参数；更大的集合按filter传
+    max_user_ids = 1000
+
+    def __init__(self, role, chunk_size=None):
+        self.role = role
+        self.chunk_size = chunk_size or self.chunk_size
+        self.User = get_user_model()
+        self.Through = self.User.roles.through
+        self.members = self.Through.objects.filter(role_id=role.pk)
+
+    def apply(self, action, user_ids=None, users=None):
+        """
+        action为add、remove或replace，返回{"added": 新增数, "removed": 移除数}
+        """
+        added = removed = 0
+        with transaction.atomic():
+            if action == "replace":
+                removed = self.remove_others(user_ids, users)
+            if action in ("add", "replace"):
+                added = sum(self.add(chunk) for chunk in self.iter_targets(user_ids, users))
+            if action == "remove":
+                removed = sum(self.remove(chunk) for chunk in self.iter_targets(user_ids, users))
+        return {"added": added, "removed": removed}
+
+    def iter_targets(self, user_ids, users):
+        """
+        把目标用户拆成每批不超过chunk_size个用户的查询集
+        """
+        if user_ids is not None:
+            user_ids = sorted(set(user_ids))
+            for start in range(0, len(user_ids), self.chunk_size):
+                yield self.User.objects.filter(pk__in=user_ids[start : start + self.chunk_size])
+            return
+        # 按主键分批，避免一次取出全部候选用户
+        last_pk = None
+        users = users.order_by("pk")
+        while True:
+            chunk = users.filter(pk__gt=last_pk) if last_pk is not None else users
+            pks = list(chunk.values_list("pk", flat=True)[: self.chunk_size])
+            if not pks:
+                return
+            yield self.User.objects.filter(pk__in=pks)
+            last_pk = pks[-1]
+
+    def add(self, users):
+        # 目标用户中还不是成员的部分
+        pks = list(users.exclude(pk__in=self.members.values("user_id")).values_list("pk", flat=True))
+        if not pks:
+            return 0
+        self.Through.objects.bulk_create(
+            [self.Through(user_id=pk, role_id=self.role.pk) for pk in pks], ignore_conflicts=True
+        )
+        self.send("post_add", pks)
+        return len(pks)
+
+    def remove(self, users):
+        pks = list(self.members.filter(user_id__in=users.values("pk")).values_list("user_id", flat=True))
+        return self.remove_pks(pks)
+
+    def remove_others(self, user_ids, users):
+        # replace：先移除不在目标集合中的成员，差集在数据库中计算
+        keep = user_ids if user_ids is not None else users.values("pk")
+        pks = list(self.members.exclude(user_id__in=keep).values_list("user_id", flat=True))
+        return self.remove_pks(pks)
+
+    def remove_pks(self, pks):
+        for start in range(0, len(pks), self.chunk_size):
+            chunk = pks[start : start + self.chunk_size]
+            self.members.filter(user_id__in=chunk).delete()
+            self.send("post_remove", chunk)
+        return len(pks)
+
+    def send(self, action, pks):
+        m2m_changed.send(
+            sender=self.Through,
+            instance=self.role,
+            action=action,
+            reverse=True,
+            model=self.User,
+            pk_set=set(pks),
+            using=self.members.db,
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('roles', '0002_role_enable'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='role',
+            index=models.Index(fields=['order', 'group_ptr'], name='roles_role_order_pk_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.3 on 2026-10-18 07:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roles', '0003_role_roles_role_order_pk_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoleTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=50, verbose_name='字段')),
+                ('gram', models.CharField(max_length=3, verbose_name='三元组')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='roles.role', verbose_name='角色')),
+            ],
+            options={
+                'verbose_name': '角色三元组索引',
+                'verbose_name_plural': '角色三元组索引',
+                'indexes': [models.Index(fields=['field', 'gram', 'owner'], name='roles_trigram_gram_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='roletrigram',
+            constraint=models.UniqueConstraint(fields=('owner', 'field', 'gram'), name='roles_trigram_uniq'),
+        ),
+    ]
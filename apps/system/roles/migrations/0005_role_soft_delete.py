@@ -0,0 +1,39 @@
+# Generated by Django 5.0.3 on 2026-10-18 07:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('roles', '0004_roletrigram'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='role',
+            name='roles_role_order_pk_idx',
+        ),
+        migrations.AddField(
+            model_name='role',
+            name='create_time',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='创建时间'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='role',
+            name='is_deleted',
+            field=models.BooleanField(default=False, verbose_name='逻辑删除'),
+        ),
+        migrations.AddField(
+            model_name='role',
+            name='update_time',
+            field=models.DateTimeField(auto_now=True, verbose_name='更新时间'),
+        ),
+        migrations.AddIndex(
+            model_name='role',
+            index=models.Index(fields=['is_deleted', 'order', 'group_ptr'], name='roles_role_del_order_pk_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.3 on 2026-10-18 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0005_rename_parent_menu_parentid'),
+        ('roles', '0005_role_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='role',
+            name='menus',
+            field=models.ManyToManyField(blank=True, related_name='roles', to='menus.menu', verbose_name='菜单'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.3 on 2026-10-18 08:45
+
+import django.contrib.auth.models
+import system.roles.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roles', '0006_role_menus'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='role',
+            options={'default_manager_name': 'objects'},
+        ),
+        migrations.AlterModelManagers(
+            name='role',
+            managers=[
+                ('objects', system.roles.models.RoleManager()),
+                ('all_objects', django.contrib.auth.models.GroupManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def grant_existing_menus(apps, schema_editor):
+    # 异步路由按角色授权之前所有用户都能看到全部菜单，已有角色授予全部已有菜单，升级后看到的菜单不变
+    Role = apps.get_model("roles", "Role")
+    Menu = apps.get_model("menus", "Menu")
+    Grant = Role.menus.through
+    role_ids = list(Role.objects.filter(is_deleted=False).values_list("pk", flat=True))
+    menu_ids = list(Menu.objects.values_list("pk", flat=True))
+    Grant.objects.bulk_create(
+        [Grant(role_id=role_id, menu_id=menu_id) for role_id in role_ids for menu_id in menu_ids],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menus', '0006_menu_tree_path'),
+        ('roles', '0007_role_soft_delete_managers'),
+    ]
+
+    operations = [
+        migrations.RunPython(grant_existing_menus, migrations.RunPython.noop),
+    ]
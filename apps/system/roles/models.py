@@ -1,13 +1,49 @@
-from django.contrib.auth.models import Group
+from django.contrib.auth.models import Group, GroupManager
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from utils.base_models import BaseModel, SoftDeleteManagerMixin
+from utils.trigram import BaseTrigram, TrigramIndex
 
-class Role(Group):
+
+class RoleManager(SoftDeleteManagerMixin, GroupManager):
+    pass
+
+
+class Role(Group, BaseModel):
     code = models.CharField(max_length=100, unique=True, verbose_name=_("角色编码"))
     order = models.IntegerField(default=0, verbose_name=_("排序"))
     enable = models.BooleanField(default=True, verbose_name=_("启用"))
     description = models.TextField(blank=True, null=True, verbose_name=_("描述"))
+    menus = models.ManyToManyField("menus.Menu", blank=True, related_name="roles", verbose_name=_("菜单"))
+
+    # Group的objects(GroupManager)在继承顺序中排在BaseModel之前，逻辑删除的管理器需要在这里重新声明
+    objects = RoleManager()
+    # 包含已逻辑删除的角色
+    all_objects = GroupManager()
+
+    class Meta:
+        # 关联查询(user.roles等)也使用过滤了逻辑删除的管理器
+        default_manager_name = "objects"
+        # 列表只查未删除的数据，is_deleted放在最前面；游标分页按(order, pk)定位
+        indexes = [models.Index(fields=["is_deleted", "order", "group_ptr"], name="roles_role_del_order_pk_idx")]
 
     def __str__(self):
         return self.code
+
+
+class RoleTrigram(BaseTrigram):
+    """
+    角色三元组索引，支撑name、code的子串搜索
+    """
+
+    owner = models.ForeignKey(Role, on_delete=models.CASCADE, related_name="trigrams", verbose_name=_("角色"))
+
+    class Meta:
+        verbose_name = _("角色三元组索引")
+        verbose_name_plural = verbose_name
+        constraints = [models.UniqueConstraint(fields=["owner", "field", "gram"], name="roles_trigram_uniq")]
+        indexes = [models.Index(fields=["field", "gram", "owner"], name="roles_trigram_gram_idx")]
+
+
+role_trigram_index = TrigramIndex(Role, RoleTrigram, fields=("name", "code"))
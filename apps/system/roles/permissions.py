@@ -0,0 +1,110 @@
+# 按角色编译的权限集合
+import threading
+
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from system.roles.models import Role
+from utils.base_models import soft_deleted
+from utils.lru import LRUCache
+
+PERMISSIONS_VERSION_KEY = "roles:permissions:version"
+
+
+class PermissionRegistry:
+    """
+    每个角色编译成权限标识("app_label.codename")的frozenset，用户的权限为其启用角色的并集
+    编译结果保存在进程内，全局版本号(cache)变化时重新编译；角色、角色权限、用户角色变化时版本号自增
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.roles = {}
+        # (版本号, 角色组合) -> 权限集合
+        self.combinations = LRUCache(maxsize=1024, timeout=60 * 60)
+
+    @staticmethod
+    def get_version():
+        return cache.get_or_set(PERMISSIONS_VERSION_KEY, 1, None)
+
+    @staticmethod
+    def invalidate(*args, **kwargs):
+        try:
+            cache.incr(PERMISSIONS_VERSION_KEY)
+        except ValueError:
+            cache.set(PERMISSIONS_VERSION_KEY, 1, None)
+
+    @staticmethod
+    def compile():
+        """
+        一次查询编译所有启用角色的权限
+        """
+        rows = Role.objects.filter(enable=True, is_deleted=False).values_list(
+            "code", "permissions__content_type__app_label", "permissions__codename"
+        )
+        roles = {}
+        for code, app_label, codename in rows:
+            perms = roles.setdefault(code, set())
+            if codename is not None:
+                perms.add(f"{app_label}.{codename}")
+        return {code: frozenset(perms) for code, perms in roles.items()}
+
+    def get_role_permissions(self):
+        version = self.get_version()
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.roles = self.compile()
+                    self.version = version
+        return self.roles
+
+    def get_user_role_codes(self, user):
+        """
+        认证用户快照上有role_codes，其它用户按角色查询后按用户缓存
+        """
+        role_codes = getattr(user, "role_codes", None)
+        if role_codes is not None:
+            return frozenset(role_codes)
+        key = (self.version, "user", user.pk)
+        role_codes = self.combinations.get(key)
+        if role_codes is None:
+            role_codes = frozenset(user.roles.filter(enable=True).values_list("code", flat=True))
+            self.combinations.set(key, role_codes)
+        return role_codes
+
+    def get_user_permissions(self, user):
+        roles = self.get_role_permissions()
+        role_codes = self.get_user_role_codes(user)
+        key = (self.version, role_codes)
+        perms = self.combinations.get(key)
+        if perms is None:
+            perms = frozenset().union(*(roles.get(code, ()) for code in role_codes))
+            self.combinations.set(key, perms)
+        return perms
+
+    def has_perms(self, user, perms):
+        """
+        认证用户快照上的extra_permissions为用户直接分配的权限和Django用户组的权限
+        """
+        if not user.is_active:
+            return False
+        if user.is_superuser:
+            return True
+        perms = set(perms)
+        role_perms = self.get_user_permissions(user)
+        return perms <= role_perms or perms <= role_perms | user.extra_permissions
+
+    def connect(self):
+        from system.users.models import User
+
+        post_save.connect(self.invalidate, sender=Role, dispatch_uid="role-permissions:role-save")
+        post_delete.connect(self.invalidate, sender=Role, dispatch_uid="role-permissions:role-delete")
+        m2m_changed.connect(
+            self.invalidate, sender=Role.permissions.through, dispatch_uid="role-permissions:permissions"
+        )
+        m2m_changed.connect(self.invalidate, sender=User.roles.through, dispatch_uid="role-permissions:user-roles")
+        soft_deleted.connect(self.invalidate, dispatch_uid="role-permissions:soft-deleted")
+
+
+permission_registry = PermissionRegistry()
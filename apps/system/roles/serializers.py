@@ -1,13 +1,66 @@
 from django.contrib.auth.models import Permission
 from rest_framework import serializers
+
+from system.menus.models import Menu
+from system.roles.membership import RoleMembership
+from utils.base_serializers import BulkPrimaryKeyRelatedField, EagerLoadingMixin, SoftDeleteUniqueMixin
 from .models import Role
 
 
-class RoleSerializer(serializers.ModelSerializer):
-    permissionIds = serializers.PrimaryKeyRelatedField(
-        source="permissions", many=True, queryset=Permission.objects.all()
-    )
+class RoleSerializer(SoftDeleteUniqueMixin, EagerLoadingMixin, serializers.ModelSerializer):
+    permissionIds = BulkPrimaryKeyRelatedField(source="permissions", many=True, queryset=Permission.objects.all())
+
+    # permissionIds只需要主键，预加载permissions后不再逐个角色查询
+    prefetch_related_fields = ("permissions",)
 
     class Meta:
         model = Role
         fields = ("id", "name", "code", "order", "enable", "description", "permissionIds")
+
+
+class RoleMenusSerializer(serializers.Serializer):
+    """
+    角色授权的菜单，整体替换
+    """
+
+    menuIds = BulkPrimaryKeyRelatedField(source="menus", many=True, queryset=Menu.objects.all())
+
+
+class UserFilterSerializer(serializers.Serializer):
+    """
+    按条件选择用户，字段与用户列表的查询参数一致；不允许未知字段和空条件，避免误操作全表
+    """
+
+    enable = serializers.BooleanField(required=False)
+    gender = serializers.ChoiceField(choices=("1", "2"), required=False)
+    username = serializers.CharField(required=False)
+    name = serializers.CharField(required=False)
+    mobile = serializers.CharField(required=False)
+    email = serializers.CharField(required=False)
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict):
+            unknown = sorted(set(data) - set(self.fields))
+            if unknown:
+                raise serializers.ValidationError(f"不支持的过滤条件：{', '.join(unknown)}")
+        attrs = super().to_internal_value(data)
+        if not attrs:
+            raise serializers.ValidationError("过滤条件不能为空")
+        return attrs
+
+
+class RoleMembersSerializer(serializers.Serializer):
+    """
+    批量维护角色成员，userIds和filter二选一，filter与用户列表的查询参数一致
+    """
+
+    action = serializers.ChoiceField(choices=("add", "remove", "replace"))
+    userIds = serializers.ListField(
+        child=serializers.IntegerField(), required=False, max_length=RoleMembership.max_user_ids
+    )
+    filter = UserFilterSerializer(required=False)
+
+    def validate(self, attrs):
+        if ("userIds" in attrs) == ("filter" in attrs):
+            raise serializers.ValidationError("userIds和filter必须且只能传一个")
+        return attrs
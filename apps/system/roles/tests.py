@@ -1 +1,192 @@
-# Create your tests here.
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from system.roles.membership import RoleMembership
+from system.roles.models import Role
+from system.roles.permissions import permission_registry
+from system.users.authentication import CachedUser
+
+
+class RoleCursorPaginationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(7):
+            Role.objects.create(name=f'role{i}', code=f'ROLE_{i}', order=i % 3)
+        self.expected = list(Role.objects.order_by('order', 'pk').values_list('code', flat=True))
+
+    def test_walk_pages(self):
+        codes, cursor = [], ''
+        while cursor is not None:
+            response = self.client.get(reverse('role-list'), {'size': 3, 'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.data['data']
+            codes.extend(role['code'] for role in data['list'])
+            cursor = data['next']
+        self.assertEqual(codes, self.expected)
+
+    def test_page_number_ordered(self):
+        codes = []
+        for page in range(1, 4):
+            response = self.client.get(reverse('role-list'), {'size': 3, 'page': page})
+            codes.extend(role['code'] for role in response.data['data']['list'])
+        self.assertEqual(codes, self.expected)
+
+
+class RoleSoftDeleteTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.kept = Role.objects.create(name='kept', code='KEPT')
+        self.doomed = Role.objects.create(name='doomed', code='DOOMED')
+        self.user = get_user_model().objects.create(username='holder', mobile='13800000000', password='!')
+        self.user.roles.add(self.kept, self.doomed)
+        self.client.delete(reverse('role-detail', args=[self.doomed.pk]))
+
+    def test_deleted_role_is_hidden(self):
+        response = self.client.get(reverse('role-list'), {'size': 20})
+        self.assertEqual([role['code'] for role in response.data['data']['list']], ['KEPT'])
+        response = self.client.get(reverse('role-detail', args=[self.doomed.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(list(self.user.roles.values_list('code', flat=True)), ['KEPT'])
+        self.assertEqual(CachedUser.from_user(self.user).role_codes, frozenset({'KEPT'}))
+        # 关联关系保留，逻辑删除可以恢复
+        self.assertTrue(Role.all_objects.filter(pk=self.doomed.pk, is_deleted=True).exists())
+        self.assertEqual(self.user.roles.through.objects.filter(role_id=self.doomed.pk).count(), 1)
+
+    def test_deleted_role_cannot_be_assigned(self):
+        payload = {
+            'username': 'assignee', 'password': '12345', 'mobile': '13800000000',
+            'roleIds': [self.kept.pk, self.doomed.pk],
+        }
+        response = self.client.post(reverse('user-list'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(self.doomed.pk), str(response.data))
+
+    def test_code_of_deleted_role_is_taken(self):
+        response = self.client.post(reverse('role-list'), {'name': 'again', 'code': 'DOOMED'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('code', response.data)
+
+
+class RoleMembersTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(name='member', code='MEMBER')
+        User = get_user_model()
+        self.users = User.objects.bulk_create(
+            [User(username=f'member{i:02d}', mobile='13800000000', password='!', enable=i % 2 == 0) for i in range(10)]
+        )
+        self.ids = [user.pk for user in self.users]
+
+    def post(self, payload):
+        response = self.client.post(reverse('role-members', args=[self.role.pk]), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['data']
+
+    def member_ids(self):
+        return set(self.role.users.values_list('pk', flat=True))
+
+    def test_add_remove_replace_by_ids(self):
+        received = []
+        handler = lambda sender, action, pk_set, **kwargs: received.append((action, pk_set))  # noqa: E731
+        m2m_changed.connect(handler, sender=get_user_model().roles.through)
+        try:
+            with mock.patch.object(RoleMembership, 'chunk_size', 3):
+                self.assertEqual(self.post({'action': 'add', 'userIds': self.ids[:6]}), {'added': 6, 'removed': 0})
+                self.assertEqual(self.post({'action': 'add', 'userIds': self.ids[:7]}), {'added': 1, 'removed': 0})
+                self.assertEqual(self.post({'action': 'remove', 'userIds': self.ids[:2]}), {'added': 0, 'removed': 2})
+                self.assertEqual(
+                    self.post({'action': 'replace', 'userIds': self.ids[5:]}), {'added': 3, 'removed': 3}
+                )
+        finally:
+            m2m_changed.disconnect(handler, sender=get_user_model().roles.through)
+        self.assertEqual(self.member_ids(), set(self.ids[5:]))
+        self.assertEqual(set().union(*(pks for action, pks in received if action == 'post_add')), set(self.ids))
+
+    def test_replace_by_filter(self):
+        self.post({'action': 'add', 'userIds': self.ids[:3]})
+        self.assertEqual(self.post({'action': 'replace', 'filter': {'enable': False}}), {'added': 4, 'removed': 2})
+        self.assertEqual(self.member_ids(), {user.pk for user in self.users if not user.enable})
+
+    def test_invalid_filter(self):
+        self.post({'action': 'add', 'userIds': self.ids[:3]})
+        for payload in (
+            {'action': 'replace', 'filter': {}},
+            {'action': 'remove', 'filter': {}},
+            {'action': 'remove', 'filter': {'is_superuser': True}},
+            {'action': 'remove', 'filter': {'gender': '9'}},
+        ):
+            response = self.client.post(reverse('role-members', args=[self.role.pk]), payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, payload)
+        self.assertEqual(self.member_ids(), set(self.ids[:3]))
+
+    def test_ids_and_filter_are_exclusive(self):
+        response = self.client.post(
+            reverse('role-members', args=[self.role.pk]), {'action': 'add', 'userIds': [1], 'filter': {}}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_user_ids_are_capped(self):
+        user_ids = self.ids + list(range(self.ids[-1] + 1, self.ids[-1] + RoleMembership.max_user_ids))
+        response = self.client.post(
+            reverse('role-members', args=[self.role.pk]), {'action': 'replace', 'userIds': user_ids}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.member_ids(), set())
+
+
+class RolePermissionRegistryTestCase(TestCase):
+    def setUp(self):
+        permission_registry.invalidate()
+        self.role = Role.objects.create(name='editor', code='EDITOR')
+        self.role.permissions.add(Permission.objects.get(codename='view_role'))
+        self.user = get_user_model().objects.create(username='editor', mobile='13800000000', password='!')
+        self.user.roles.add(self.role)
+        self.cached = CachedUser.from_user(self.user)
+
+    def test_compiled_once(self):
+        self.assertTrue(self.cached.has_perm('roles.view_role'))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.cached.has_perms(['roles.view_role']))
+            self.assertFalse(self.cached.has_perm('roles.change_role'))
+
+    def test_model_backend(self):
+        self.assertTrue(self.user.has_perm('roles.view_role'))
+        user = get_user_model().objects.get(pk=self.user.pk)
+        # 角色权限不再查询，只有ModelBackend读取用户权限、用户组权限，结果缓存在用户对象上
+        with self.assertNumQueries(2):
+            self.assertTrue(user.has_perm('roles.view_role'))
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('roles.view_role'))
+            self.assertFalse(user.has_perm('roles.change_role'))
+
+    def test_user_and_group_permissions(self):
+        self.user.user_permissions.add(Permission.objects.get(codename='change_role'))
+        group = Group.objects.create(name='django-group')
+        group.permissions.add(Permission.objects.get(codename='delete_role'))
+        self.user.groups.add(group)
+        user = get_user_model().objects.get(pk=self.user.pk)
+        self.assertEqual(user.get_all_permissions(), {'roles.view_role', 'roles.change_role', 'roles.delete_role'})
+        cached = CachedUser.from_user(user)
+        with self.assertNumQueries(0):
+            self.assertTrue(cached.has_perms(['roles.view_role', 'roles.change_role', 'roles.delete_role']))
+            self.assertFalse(cached.has_perm('roles.add_role'))
+
+    def test_invalidate_on_change(self):
+        self.assertFalse(self.cached.has_perm('roles.change_role'))
+        self.role.permissions.add(Permission.objects.get(codename='change_role'))
+        self.assertTrue(self.cached.has_perm('roles.change_role'))
+        self.role.enable = False
+        self.role.save()
+        self.assertFalse(self.cached.has_perm('roles.view_role'))
+
+    def test_superuser(self):
+        self.cached.is_superuser = True
+        with self.assertNumQueries(0):
+            self.assertTrue(self.cached.has_perm('roles.delete_role'))
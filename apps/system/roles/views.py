@@ -1,39 +1,67 @@
-from django.contrib.auth.models import Permission
+from django.contrib.auth import get_user_model
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from system.roles.models import Role
-from system.roles.serializers import RoleSerializer
-from utils.base_viewset import CustomModelViewSet
+from system.roles.models import Role, role_trigram_index
+from system.roles.membership import RoleMembership
+from system.roles.serializers import RoleMembersSerializer, RoleMenusSerializer, RoleSerializer
+from system.users.filters import filter_users
+from utils.base_viewset import CustomModelViewSet, CustomResponse, ExportMixin
+from utils.constant import BusinessStatusCode
 
 
-class RoleViewSet(CustomModelViewSet):
-    queryset = Role.objects.all()
+class RoleViewSet(ExportMixin, CustomModelViewSet):
+    # 页码分页与游标分页同样按(order, pk)排序，走roles_role_del_order_pk_idx索引
+    queryset = Role.objects.order_by("order", "pk")
     serializer_class = RoleSerializer
-    pagination_class = PageNumberPagination
+    cursor_ordering = ("order", "pk")
 
     def get_queryset(self):
         queryset = super().get_queryset()
         enable = self.request.query_params.get("enable", None)
-        name = self.request.query_params.get("name", None)
         if enable is not None:
             queryset = queryset.filter(enable=enable)
-        if name is not None:
-            queryset = queryset.filter(name__icontains=name)
+        # 子串搜索走三元组索引
+        for field in role_trigram_index.fields:
+            value = self.request.query_params.get(field, None)
+            if value is not None:
+                queryset = role_trigram_index.filter(queryset, field, value)
         return queryset
 
     def create(self, request, *args, **kwargs):
-        data = request.data
-        permission_ids = data.get("permissionIds", None)
-        serializer = self.get_serializer(data=data)
+        # permissionIds校验时已解析为权限对象，保存时直接写入
+        serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        role = serializer.save()
-
-        permissions = Permission.objects.filter(id__in=permission_ids)
-        role.permissions.set(permissions)
+        serializer.save()
 
         return Response(
             {"code": 0, "message": "OK", "data": serializer.data},
             status=status.HTTP_201_CREATED,
         )
+
+    # 批量添加、移除或替换角色成员
+    @action(detail=True, methods=["post"], serializer_class=RoleMembersSerializer)
+    def members(self, request, *args, **kwargs):
+        role = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        users = None
+        if "filter" in data:
+            users = filter_users(get_user_model().objects.all(), data["filter"])
+        result = RoleMembership(role).apply(data["action"], user_ids=data.get("userIds", None), users=users)
+        return CustomResponse(data=result, status=status.HTTP_200_OK, busi_status=BusinessStatusCode.OPERATION_SUCCESS)
+
+    # 查看、替换角色授权的菜单
+    @action(detail=True, methods=["get", "put"], serializer_class=RoleMenusSerializer)
+    def menus(self, request, *args, **kwargs):
+        role = self.get_object()
+        if request.method == "PUT":
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            role.menus.set(serializer.validated_data["menus"])
+        menu_ids = sorted(role.menus.values_list("pk", flat=True))
+        return CustomResponse(
+            data={"menuIds": menu_ids}, status=status.HTTP_200_OK, busi_status=BusinessStatusCode.OPERATION_SUCCESS
+        )
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "system.users"
+
+    def ready(self):
+        # checks导入时注册启动检查
+        from system.users import authentication, checks, profile  # noqa: F401
+        from system.users.models import user_trigram_index
+
+        # 保存时同步三元组索引
+        user_trigram_index.connect()
+        # 用户、角色变化时清理用户信息缓存
+        profile.connect()
+        # 用户状态、密码、角色变化时清理认证用的用户缓存
+        authentication.connect()
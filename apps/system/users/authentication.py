@@ -0,0 +1,200 @@
+# JWT认证，用户信息缓存在进程内
+import copy
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from system.roles.models import Role
+from system.roles.permissions import permission_registry
+from system.users.models import User
+from utils.base_models import soft_deleted
+from utils.lru import LRUCache
+
+USER_CACHE = {"MAX_SIZE": 10000, "TIMEOUT": 10, **getattr(settings, "JWT_USER_CACHE", {})}
+
+user_cache = LRUCache(maxsize=USER_CACHE["MAX_SIZE"], timeout=USER_CACHE["TIMEOUT"])
+
+
+class CachedUser:
+    """
+    认证用的用户快照，只包含鉴权需要的字段
+    访问快照上没有的属性(roles、groups、save()、get_username()等)时按id查询完整的用户，之后转发给它
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+    # 快照上的字段，其它属性的读写都转发给完整的用户
+    fields = (
+        "id",
+        "username",
+        "is_active",
+        "enable",
+        "is_staff",
+        "is_superuser",
+        "role_codes",
+        "extra_permissions",
+        "password_hash",
+    )
+
+    def __init__(
+        self,
+        id,
+        username,
+        is_active,
+        enable,
+        is_staff,
+        is_superuser,
+        role_codes,
+        extra_permissions=frozenset(),
+        password_hash=None,
+    ):
+        self.id = id
+        self.username = username
+        self.is_active = is_active
+        self.enable = enable
+        self.is_staff = is_staff
+        self.is_superuser = is_superuser
+        self.role_codes = role_codes
+        self.extra_permissions = extra_permissions
+        self.password_hash = password_hash
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __getattr__(self, name):
+        # 只有快照上找不到的属性才会进入这里；特殊方法不转发，copy等按普通对象处理
+        if name.startswith("__") or name == "_user":
+            raise AttributeError(name)
+        return getattr(self.get_model(), name)
+
+    def __setattr__(self, name, value):
+        if name not in self.fields:
+            setattr(self.get_model(), name, value)
+            return
+        object.__setattr__(self, name, value)
+        # 已经查询过完整的用户时同步修改，保存时不丢失
+        user = self.__dict__.get("_user")
+        if user is not None and hasattr(user, name):
+            setattr(user, name, value)
+
+    def get_model(self):
+        """
+        完整的用户，第一次访问时查询
+        """
+        user = self.__dict__.get("_user")
+        if user is None:
+            user = self.__dict__["_user"] = User.objects.get(pk=self.id)
+        return user
+
+    def __str__(self):
+        return self.username
+
+    def has_perm(self, perm, obj=None):
+        return obj is None and permission_registry.has_perms(self, [perm])
+
+    def has_perms(self, perm_list, obj=None):
+        return obj is None and permission_registry.has_perms(self, perm_list)
+
+    def __eq__(self, other):
+        return isinstance(other, (CachedUser, User)) and self.id == other.pk
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @classmethod
+    def from_user(cls, user):
+        # 用户直接分配的权限和Django用户组的权限，角色的权限由permission_registry按role_codes读取
+        backend = ModelBackend()
+        return cls(
+            id=user.pk,
+            username=user.username,
+            is_active=user.is_active,
+            enable=user.enable,
+            is_staff=user.is_staff,
+            is_superuser=user.is_superuser,
+            role_codes=frozenset(user.roles.filter(enable=True).values_list("code", flat=True)),
+            extra_permissions=frozenset(backend.get_user_permissions(user) | backend.get_group_permissions(user)),
+            password_hash=get_md5_hash_password(user.password) if api_settings.CHECK_REVOKE_TOKEN else None,
+        )
+
+
+# 用户按id缓存，命中时认证只需一次字典查找
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = user_cache.get(user_id)
+        if user is None:
+            try:
+                user = CachedUser.from_user(self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id}))
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            user_cache.set(user_id, user)
+        # 缓存中的快照在请求间共享，每个请求使用副本，查询到的完整用户只属于当前请求
+        user = copy.copy(user)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != user.password_hash:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+def handle_user_change(sender, instance, update_fields=None, **kwargs):
+    # 登录时只更新last_login
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    user_cache.delete_many([instance.pk])
+
+
+def handle_soft_deleted(sender, pk_set, **kwargs):
+    if sender is User:
+        user_cache.delete_many(pk_set)
+    elif sender is Role:
+        user_cache.clear()
+
+
+def handle_role_change(sender, instance, **kwargs):
+    user_cache.clear()
+
+
+def handle_roles_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        user_cache.delete_many([instance.pk])
+    elif pk_set:
+        user_cache.delete_many(pk_set)
+    else:
+        user_cache.clear()
+
+
+def connect():
+    post_save.connect(handle_user_change, sender=User, dispatch_uid="user-cache:user-save")
+    post_delete.connect(handle_user_change, sender=User, dispatch_uid="user-cache:user-delete")
+    post_save.connect(handle_role_change, sender=Role, dispatch_uid="user-cache:role-save")
+    post_delete.connect(handle_role_change, sender=Role, dispatch_uid="user-cache:role-delete")
+    m2m_changed.connect(handle_roles_changed, sender=User.roles.through, dispatch_uid="user-cache:roles")
+    m2m_changed.connect(handle_roles_changed, sender=User.groups.through, dispatch_uid="user-cache:groups")
+    m2m_changed.connect(
+        handle_roles_changed, sender=User.user_permissions.through, dispatch_uid="user-cache:user-permissions"
+    )
+    # Role继承自Group，两者共用同一张权限关联表
+    m2m_changed.connect(
+        handle_role_change, sender=Group.permissions.through, dispatch_uid="user-cache:group-permissions"
+    )
+    soft_deleted.connect(handle_soft_deleted, dispatch_uid="user-cache:soft-deleted")
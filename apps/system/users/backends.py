@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from system.roles.permissions import permission_registry
+from utils.hashing import get_dummy_password, verify_password_in_pool
+
+UserModel = get_user_model()
+
+
+class RoleModelBackend(ModelBackend):
+    """
+    全局认证后端(admin、session登录等)，密码在当前线程校验；权限从编译好的角色权限集合中读取
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        """
+        角色的权限从编译好的角色权限集合中读取，不再每次联表查询；
+        用户直接分配的权限和Django用户组的权限仍由ModelBackend读取，结果缓存在user_obj上
+        """
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if user_obj.is_superuser:
+            return super().get_all_permissions(user_obj, obj)
+        return {*super().get_all_permissions(user_obj, obj), *permission_registry.get_user_permissions(user_obj)}
+
+
+class PooledModelBackend(RoleModelBackend):
+    """
+    用户名密码认证，PBKDF2计算放到登录哈希进程池中，登录高峰时不占用请求线程的CPU
+    排队已满或进程池异常时抛出DRF的APIException(429/503)，只由登录接口直接调用，不放进AUTHENTICATION_BACKENDS
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            verify_password_in_pool(password, get_dummy_password())
+            return None
+        is_correct, must_update = verify_password_in_pool(password, user.password)
+        if is_correct and self.user_can_authenticate(user):
+            self.upgrade_password(user, password, must_update)
+            return user
+        return None
+
+    @staticmethod
+    def upgrade_password(user, password, must_update):
+        # 哈希算法或迭代次数调整后，登录成功时重新计算
+        if must_update:
+            user.set_password(password)
+            user.save(update_fields=["password"])
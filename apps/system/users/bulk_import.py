@@ -0,0 +1,166 @@
+# 用户批量导入
+import csv
+import io
+import json
+
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+
+from system.roles.models import Role
+from system.users.models import User, user_trigram_index
+from utils.count_strategy import CachedCount
+from utils.hashing import make_passwords
+
+
+class UserImportRowSerializer(serializers.ModelSerializer):
+    """
+    导入行校验，用户名唯一性改为按批次一次查询校验
+    """
+
+    roleIds = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    class Meta:
+        model = User
+        fields = ("username", "password", "name", "email", "mobile", "avatar", "enable", "gender", "roleIds")
+        extra_kwargs = {
+            # 只去掉逐行查询的UniqueValidator，保留模型的用户名字符校验
+            "username": {"min_length": 4, "max_length": 20, "validators": [UnicodeUsernameValidator()]},
+            "password": {"min_length": 4, "max_length": 20},
+        }
+
+
+def iter_csv_rows(stream):
+    for row in csv.DictReader(stream):
+        # 角色ID在csv中用逗号分隔，如"1,2"
+        role_ids = row.pop("roleIds", None)
+        row = {key: value for key, value in row.items() if value not in (None, "")}
+        if role_ids:
+            row["roleIds"] = [item.strip() for item in role_ids.split(",") if item.strip()]
+        yield row
+
+
+def iter_ndjson_rows(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+class UserImporter:
+    """
+    逐行读取上传文件，按batch_size分批校验，批量写入用户、用户角色关系和三元组索引
+    每批一个事务，批内校验失败的行不写入，其余行照常导入
+    """
+
+    batch_size = 1000
+    max_errors = 1000
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or self.batch_size
+        self.role_ids = set(Role.objects.values_list("pk", flat=True))
+        self.seen_usernames = set()
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, file, file_format):
+        stream = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+        rows = iter_csv_rows(stream) if file_format == "csv" else iter_ndjson_rows(stream)
+        batch = []
+        # 行号从1开始，csv不计表头
+        for line_no, row in enumerate(rows, start=1):
+            batch.append((line_no, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        if self.created:
+            CachedCount.invalidate(sender=User)
+        self.errors.sort(key=lambda error: error["row"])
+        return {"created": self.created, "failed": self.failed, "errors": self.errors}
+
+    def add_error(self, line_no, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": line_no, "errors": errors})
+
+    def validate_batch(self, batch):
+        valid = []
+        for line_no, row in batch:
+            if not isinstance(row, dict):
+                self.add_error(line_no, {"non_field_errors": [_("无法解析的行")]})
+                continue
+            serializer = UserImportRowSerializer(data=row)
+            if not serializer.is_valid():
+                self.add_error(line_no, serializer.errors)
+                continue
+            data = serializer.validated_data
+            missing = set(data["roleIds"]) - self.role_ids
+            if missing:
+                self.add_error(line_no, {"roleIds": [_("角色不存在: %s") % sorted(missing)]})
+                continue
+            if data["username"] in self.seen_usernames:
+                self.add_error(line_no, {"username": [_("文件中用户名重复")]})
+                continue
+            self.seen_usernames.add(data["username"])
+            valid.append((line_no, data))
+
+        # 已存在的用户名一次查询，逻辑删除的用户仍占用用户名
+        existing = set(
+            User.all_objects.filter(username__in=[data["username"] for line_no, data in valid]).values_list(
+                "username", flat=True
+            )
+        )
+        result = []
+        for line_no, data in valid:
+            if data["username"] in existing:
+                self.add_error(line_no, {"username": [_("用户名已存在")]})
+            else:
+                result.append((line_no, data))
+        return result
+
+    def import_batch(self, batch):
+        rows = self.validate_batch(batch)
+        if not rows:
+            return
+        hashes = make_passwords(data.pop("password") for line_no, data in rows)
+        users = []
+        role_ids = []
+        for (line_no, data), password in zip(rows, hashes):
+            role_ids.append(data.pop("roleIds"))
+            users.append(User(password=password, **data))
+
+        try:
+            self.write_batch(users, role_ids)
+        except IntegrityError as e:
+            # 并发写入等导致的冲突，整批回滚并记录到每一行
+            for line_no, data in rows:
+                self.add_error(line_no, {"non_field_errors": [str(e)]})
+            return
+        self.created += len(users)
+
+    def write_batch(self, users, role_ids):
+        with transaction.atomic():
+            users = User.objects.bulk_create(users)
+            # MySQL的bulk_create不回填主键，按用户名补查
+            if users and users[0].pk is None:
+                pks = dict(
+                    User.objects.filter(username__in=[user.username for user in users]).values_list("username", "pk")
+                )
+                for user in users:
+                    user.pk = pks[user.username]
+            Through = User.roles.through
+            Through.objects.bulk_create(
+                [Through(user_id=user.pk, role_id=role_id) for user, ids in zip(users, role_ids) for role_id in ids],
+                ignore_conflicts=True,
+            )
+            user_trigram_index.bulk_index(
+                [(user.pk, *user_trigram_index.get_values(user)) for user in users], batch_size=self.batch_size
+            )
@@ -0,0 +1,30 @@
+# 启动检查
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.checks import Error, Tags, register
+
+# 只在当前进程内生效的缓存后端
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    用户信息、异步路由、角色权限的缓存靠共享缓存中的版本号失效，非DEBUG环境使用进程内缓存时报错
+    其它进程看不到版本号变化，撤销的角色权限会一直有效；确认单进程部署时可通过SILENCED_SYSTEM_CHECKS忽略
+    """
+    if settings.DEBUG:
+        return []
+    backend = settings.CACHES.get(DEFAULT_CACHE_ALIAS, {}).get("BACKEND")
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Error(
+            f"默认缓存使用{backend}，只在当前进程内生效",
+            hint="配置共享缓存(如设置REDIS_URL使用RedisCache)，否则其它进程的用户信息、路由、角色权限缓存不会失效",
+            id="users.E001",
+        )
+    ]
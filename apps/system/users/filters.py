@@ -0,0 +1,19 @@
+from system.users.models import user_trigram_index
+
+
+def filter_users(queryset, params):
+    """
+    用户列表的过滤条件，用户列表、导出和批量分配角色共用
+    """
+    enable = params.get("enable", None)
+    gender = params.get("gender", None)
+    if enable is not None:
+        queryset = queryset.filter(enable=enable)
+    if gender is not None:
+        queryset = queryset.filter(gender=gender)
+    # 子串搜索走三元组索引
+    for field in user_trigram_index.fields:
+        value = params.get(field, None)
+        if value is not None:
+            queryset = user_trigram_index.filter(queryset, field, value)
+    return queryset
@@ -0,0 +1,134 @@
+import itertools
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from system.users.models import User
+from system.users.seed import Seeder
+from system.users.tokens import RevocableRefreshToken
+from utils.bench import BenchmarkRunner, compare, dump_results, load_results
+
+PREFIX = "bench"
+SCENARIOS = ["login", "refresh", "users-list", "users-search", "async-routes", "menu-tree", "role-create"]
+
+
+class Command(BaseCommand):
+    help = "进程内压测主要接口，输出吞吐量、延迟分位数、每个请求的SQL条数和内存峰值，并与基线对比，如：manage.py bench"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200, help="每个场景计时的请求数")
+        parser.add_argument("--warmup", type=int, default=20, help="每个场景计时前预热的请求数")
+        parser.add_argument("--users", type=int, default=10000, help="数据库中没有压测数据时生成的用户数")
+        parser.add_argument(
+            "--allow-seed",
+            action="store_true",
+            help="DEBUG关闭时也允许生成压测数据；数据写入默认数据库且不会自动清理",
+        )
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="只运行指定场景，可重复")
+        parser.add_argument("--output", help="结果写入的JSON文件")
+        parser.add_argument(
+            "--baseline",
+            default=os.path.join(settings.BASE_DIR, "tests", "bench_baseline.json"),
+            help="对比的基线文件",
+        )
+        parser.add_argument("--update-baseline", action="store_true", help="用本次结果覆盖基线")
+        parser.add_argument(
+            "--tolerance", type=float, help="p50延迟允许超出基线的比例，不给出时只比较SQL条数，如：--tolerance 0.3"
+        )
+
+    def handle(self, *args, **options):
+        if not User.all_objects.filter(username=f"{PREFIX}0000000").exists():
+            database = connection.settings_dict["NAME"]
+            # 压测数据写入当前配置的默认数据库且不会清理，避免误连生产库时写入
+            if not (settings.DEBUG or options["allow_seed"]):
+                raise CommandError(
+                    f"数据库{database}中没有压测数据，生成数据需要DEBUG环境或--allow-seed，"
+                    f"建议使用DJANGO_SETTINGS_MODULE=mortal.settings_sqlite"
+                )
+            self.stdout.write(f"生成压测数据：{options['users']}个用户，写入数据库{database}")
+            for name, rows, elapsed in Seeder(users=options["users"], prefix=PREFIX).run():
+                self.stdout.write(f"{name}: 写入{rows}行(含关联表)，耗时{elapsed:.1f}秒")
+
+        runner = BenchmarkRunner(iterations=options["iterations"], warmup=options["warmup"])
+        self.user = User.objects.get(username=f"{PREFIX}0000000")
+        results = {}
+        for name in options["scenario"] or SCENARIOS:
+            # 每个场景在回滚的事务中执行，不改变压测数据
+            with transaction.atomic():
+                scenario, status = getattr(self, f"scenario_{name.replace('-', '_')}")(runner)
+                results[name] = runner.run(scenario, status)
+                transaction.set_rollback(True)
+            self.stdout.write(self.format_result(name, results[name]))
+
+        if options["output"]:
+            dump_results(options["output"], results)
+        if options["update_baseline"]:
+            dump_results(options["baseline"], results)
+            self.stdout.write(self.style.SUCCESS(f"基线已更新：{options['baseline']}"))
+            return
+        if not os.path.exists(options["baseline"]):
+            self.stdout.write(self.style.WARNING(f"基线文件不存在：{options['baseline']}"))
+            return
+        regressions = compare(results, load_results(options["baseline"])["results"], options["tolerance"])
+        if regressions:
+            raise CommandError("与基线相比出现回归：\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("与基线相比没有回归"))
+
+    @staticmethod
+    def format_result(name, result):
+        return (
+            f"{name:<14} {result['throughput']:>8.1f}/s  p50 {result['p50_ms']:.2f}ms  p95 {result['p95_ms']:.2f}ms  "
+            f"p99 {result['p99_ms']:.2f}ms  SQL {result['queries']}  RSS {result['peak_rss_mb']}MB"
+        )
+
+    def get_client(self):
+        client = APIClient()
+        access = RevocableRefreshToken.for_user(self.user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return client
+
+    def scenario_login(self, runner):
+        client, url = APIClient(), reverse("login")
+        payload = {"username": self.user.username, "password": "12345"}
+        return lambda: client.post(url, payload, format="json"), 200
+
+    def scenario_refresh(self, runner):
+        # 刷新令牌可能只能使用一次，提前生成，不计入耗时
+        client, url = APIClient(), reverse("refresh")
+        tokens = iter(
+            [str(RevocableRefreshToken.for_user(self.user)) for _ in range(runner.warmup + runner.iterations)]
+        )
+        return lambda: client.post(url, {"refresh": next(tokens)}, format="json"), 200
+
+    def scenario_users_list(self, runner):
+        client, url = self.get_client(), reverse("user-list")
+        return lambda: client.get(url, {"size": 20}), 200
+
+    def scenario_users_search(self, runner):
+        client, url = self.get_client(), reverse("user-list")
+        return lambda: client.get(url, {"size": 20, "enable": "1", "username": f"{PREFIX}00012"}), 200
+
+    def scenario_async_routes(self, runner):
+        client, url = self.get_client(), reverse("async-routes")
+        return lambda: client.get(url), 200
+
+    def scenario_menu_tree(self, runner):
+        client, url = self.get_client(), reverse("menu-tree")
+        return lambda: client.get(url), 200
+
+    def scenario_role_create(self, runner):
+        client, url = self.get_client(), reverse("role-list")
+        counter = itertools.count()
+        permission_ids = list(self.user.roles.values_list("permissions", flat=True).distinct()[:10])
+        permission_ids = [pk for pk in permission_ids if pk is not None]
+
+        def create():
+            i = next(counter)
+            payload = {"name": f"{PREFIX}-new-{i}", "code": f"BENCH_NEW_{i}", "permissionIds": permission_ids}
+            return client.post(url, payload, format="json")
+
+        return create, 201
@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from system.users.token_purge import TokenPartitions, TokenPurger
+
+
+class Command(BaseCommand):
+    help = "分批清理过期的OutstandingToken和BlacklistedToken，如：manage.py purge_expired_tokens --batch-size 2000 --sleep 0.1"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="每批删除的token数")
+        parser.add_argument("--sleep", type=float, default=0, help="批次之间休眠的秒数")
+        parser.add_argument("--grace-hours", type=float, default=0, help="过期超过多少小时才删除")
+        parser.add_argument("--max-batches", type=int, default=None, help="本次最多执行的批次数")
+        parser.add_argument("--report-every", type=int, default=10, help="每隔多少批输出一次进度")
+        parser.add_argument(
+            "--partitions",
+            choices=("layout", "create", "drop"),
+            help="MySQL按过期日分区：layout输出分区DDL，create创建未来的分区，drop删除已过期的分区",
+        )
+        parser.add_argument("--days-ahead", type=int, default=8, help="提前创建的分区天数")
+
+    def handle(self, *args, **options):
+        for name in ("batch_size", "report_every", "max_batches"):
+            if options[name] is not None and options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')}必须大于等于1")
+        if options["days_ahead"] < 0:
+            raise CommandError("--days-ahead不能小于0")
+        if options["partitions"]:
+            return self.handle_partitions(options)
+
+        purger = TokenPurger(
+            batch_size=options["batch_size"],
+            sleep=options["sleep"],
+            grace=timedelta(hours=options["grace_hours"]),
+            max_batches=options["max_batches"],
+        )
+        stats = None
+        for stats in purger.run():
+            if stats["batches"] % options["report_every"] == 0:
+                self.stdout.write(self.format_stats(stats))
+        if stats is None:
+            self.stdout.write(self.style.SUCCESS("没有过期的token"))
+            return
+        self.stdout.write(self.style.SUCCESS(self.format_stats(stats)))
+
+    @staticmethod
+    def format_stats(stats):
+        return (
+            f"批次{stats['batches']}: 已删除OutstandingToken {stats['outstanding']}条、"
+            f"BlacklistedToken {stats['blacklisted']}条，耗时{stats['elapsed']:.1f}秒，{stats['rate']:.0f}条/秒"
+        )
+
+    def handle_partitions(self, options):
+        partitions = TokenPartitions()
+        if not partitions.supported:
+            raise CommandError(
+                f"按过期日分区只支持MySQL，当前数据库为{partitions.connection.vendor}，去掉--partitions按批次删除"
+            )
+        if options["partitions"] == "layout":
+            for sql in partitions.layout_sql(options["days_ahead"]):
+                self.stdout.write(f"{sql};")
+        elif options["partitions"] == "create":
+            created = partitions.create_ahead(options["days_ahead"])
+            self.stdout.write(self.style.SUCCESS(f"已创建分区: {', '.join(created) or '无'}"))
+        else:
+            cutoff = timezone.now() - timedelta(hours=options["grace_hours"])
+            dropped = partitions.drop_expired(cutoff, batch_size=options["batch_size"], sleep=options["sleep"])
+            self.stdout.write(self.style.SUCCESS(f"已删除分区: {', '.join(dropped) or '无'}"))
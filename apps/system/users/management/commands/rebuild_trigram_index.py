@@ -0,0 +1,28 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.trigram import trigram_registry
+
+
+class Command(BaseCommand):
+    help = "全量重建三元组子串索引，默认重建所有已注册的模型，如：manage.py rebuild_trigram_index users.User"
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*", help="模型标识，如users.User、roles.Role")
+        parser.add_argument("--batch-size", type=int, default=2000, help="每批读取和写入的记录数")
+
+    def handle(self, *args, **options):
+        if options["models"]:
+            try:
+                models = [apps.get_model(label) for label in options["models"]]
+            except (LookupError, ValueError) as e:
+                raise CommandError(e)
+        else:
+            models = list(trigram_registry)
+
+        for model in models:
+            index = trigram_registry.get(model)
+            if index is None:
+                raise CommandError(f"{model._meta.label}没有注册三元组索引")
+            total = index.rebuild(batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"{model._meta.label}: 已重建{total}条记录的索引"))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from system.users.seed import Seeder
+
+
+class Command(BaseCommand):
+    help = "生成压测用的用户、角色、菜单及关联数据，同样的参数和种子生成同样的数据，如：manage.py seed --users 1000000"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000, help="用户数")
+        parser.add_argument("--roles", type=int, default=50, help="角色数")
+        parser.add_argument("--roles-per-user", type=int, default=2, help="每个用户的角色数")
+        parser.add_argument("--permissions-per-role", type=int, default=10, help="每个角色的权限数")
+        parser.add_argument("--menu-depth", type=int, default=3, help="菜单树的层数，最后一层为按钮")
+        parser.add_argument("--menu-fanout", type=int, default=5, help="每个菜单的下级数")
+        parser.add_argument("--menus-per-role", type=int, default=20, help="每个角色授权的菜单数")
+        parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+        parser.add_argument("--batch-size", type=int, default=5000, help="每批写入的记录数")
+        parser.add_argument("--password", default="12345", help="所有用户的密码")
+        parser.add_argument("--hash-count", type=int, default=4, help="预先计算的密码哈希个数，用户轮流使用")
+        parser.add_argument("--prefix", default="seed", help="用户名、角色编码、菜单编码的前缀，多次生成时需要不同")
+        parser.add_argument(
+            "--skip-trigrams", action="store_true", help="不写入三元组索引，之后可用rebuild_trigram_index重建"
+        )
+
+    def handle(self, *args, **options):
+        seeder = Seeder(
+            users=options["users"],
+            roles=options["roles"],
+            roles_per_user=options["roles_per_user"],
+            permissions_per_role=options["permissions_per_role"],
+            menu_depth=options["menu_depth"],
+            menu_fanout=options["menu_fanout"],
+            menus_per_role=options["menus_per_role"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            password=options["password"],
+            hash_count=options["hash_count"],
+            prefix=options["prefix"],
+            trigrams=not options["skip_trigrams"],
+        )
+        try:
+            for name, rows, elapsed in seeder.run():
+                rate = rows / elapsed if elapsed else 0
+                self.stdout.write(f"{name}: 写入{rows}行(含关联表)，耗时{elapsed:.1f}秒，{rate:.0f}行/秒")
+        except ValueError as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS("生成完成"))
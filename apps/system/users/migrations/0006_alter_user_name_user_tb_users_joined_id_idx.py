@@ -0,0 +1,26 @@
+# Generated by Django 5.0.3 on 2026-10-18 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('roles', '0003_role_roles_role_order_pk_idx'),
+        ('users', '0005_user_roles'),
+    ]
+
+    operations = [
+        # 基线中User.name的verbose_name已由"姓名"改为"昵称"，但没有对应的迁移，makemigrations时一并生成
+        # 只改verbose_name，不改变表结构；去掉后makemigrations --check会再次检测到差异
+        migrations.AlterField(
+            model_name='user',
+            name='name',
+            field=models.CharField(blank=True, max_length=30, null=True, verbose_name='昵称'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-date_joined', 'id'], name='tb_users_joined_id_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.3 on 2026-10-18 07:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_alter_user_name_user_tb_users_joined_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=50, verbose_name='字段')),
+                ('gram', models.CharField(max_length=3, verbose_name='三元组')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '用户三元组索引',
+                'verbose_name_plural': '用户三元组索引',
+                'db_table': 'tb_users_trigram',
+                'indexes': [models.Index(fields=['field', 'gram', 'owner'], name='tb_users_trigram_gram_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='usertrigram',
+            constraint=models.UniqueConstraint(fields=('owner', 'field', 'gram'), name='tb_users_trigram_uniq'),
+        ),
+    ]
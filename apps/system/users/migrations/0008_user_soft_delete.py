@@ -0,0 +1,49 @@
+# Generated by Django 5.0.3 on 2026-10-18 07:57
+
+import django.contrib.auth.models
+import django.utils.timezone
+import system.users.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('roles', '0005_role_soft_delete'),
+        ('users', '0007_usertrigram'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', system.users.models.UserManager()),
+                ('all_objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='tb_users_joined_id_idx',
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='create_time',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='创建时间'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='is_deleted',
+            field=models.BooleanField(default=False, verbose_name='逻辑删除'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='update_time',
+            field=models.DateTimeField(auto_now=True, verbose_name='更新时间'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_deleted', '-date_joined', 'id'], name='tb_users_del_joined_id_idx'),
+        ),
+    ]
@@ -1,11 +1,18 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as DjangoUserManager
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 from system.roles.models import Role
+from utils.base_models import BaseModel, SoftDeleteManagerMixin
+from utils.trigram import BaseTrigram, TrigramIndex
 
 
-class User(AbstractUser):
+class UserManager(SoftDeleteManagerMixin, DjangoUserManager):
+    pass
+
+
+class User(AbstractUser, BaseModel):
     """
     用户
     """
@@ -20,12 +27,36 @@ class User(AbstractUser):
     enable = models.BooleanField(default=True, verbose_name=_("启用"))
     roles = models.ManyToManyField(Role, blank=True, related_name="users")
 
+    objects = UserManager()
+    # 包含已逻辑删除的用户
+    all_objects = DjangoUserManager()
+
     class Meta:
         db_table = "tb_users"
         verbose_name = _("用户")
         verbose_name_plural = verbose_name
+        # 列表只查未删除的数据，is_deleted放在最前面；游标分页按(-date_joined, id)定位
+        indexes = [models.Index(fields=["is_deleted", "-date_joined", "id"], name="tb_users_del_joined_id_idx")]
 
     def __str__(self):
         return self.username
 
     REQUIRED_FIELDS = ["mobile"]  # 再通过createsuperuser 管理命令创建用户时，会提示输入mobile字段
+
+
+class UserTrigram(BaseTrigram):
+    """
+    用户三元组索引，支撑username、name、mobile、email的子串搜索
+    """
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="trigrams", verbose_name=_("用户"))
+
+    class Meta:
+        db_table = "tb_users_trigram"
+        verbose_name = _("用户三元组索引")
+        verbose_name_plural = verbose_name
+        constraints = [models.UniqueConstraint(fields=["owner", "field", "gram"], name="tb_users_trigram_uniq")]
+        indexes = [models.Index(fields=["field", "gram", "owner"], name="tb_users_trigram_gram_idx")]
+
+
+user_trigram_index = TrigramIndex(User, UserTrigram, fields=("username", "name", "mobile", "email"))
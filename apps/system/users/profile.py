@@ -0,0 +1,108 @@
+# 当前用户信息缓存
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from system.roles.models import Role
+from system.users.models import User
+from utils.base_models import soft_deleted
+
+PROFILE_TIMEOUT = 60 * 60
+PROFILE_VERSION_KEY = "user:profile:version"
+
+
+def get_profile_key(user_id, version):
+    return f"user:profile:{version}:{user_id}"
+
+
+def get_version():
+    return cache.get_or_set(PROFILE_VERSION_KEY, 1, None)
+
+
+def build_profile(user_id):
+    """
+    两条查询：用户、用户的角色(按排序)
+    """
+    roles = Role.objects.filter(enable=True).order_by("order", "pk")
+    user = User.objects.prefetch_related(Prefetch("roles", queryset=roles)).get(pk=user_id)
+    roles = [{"id": role.pk, "code": role.code, "name": role.name, "enable": role.enable} for role in user.roles.all()]
+    return {
+        "id": user.pk,
+        "username": user.username,
+        "enable": user.enable,
+        "profile": {
+            "id": user.pk,
+            "nickName": user.name or user.username,
+            "avatar": user.avatar,
+            "gender": user.gender,
+            "email": user.email,
+            "mobile": user.mobile,
+            "userId": user.pk,
+        },
+        "roles": roles,
+        "currentRole": roles[0] if roles else None,
+    }
+
+
+def get_profile(user_id):
+    """
+    缓存命中时不访问数据库
+    """
+    key = get_profile_key(user_id, get_version())
+    profile = cache.get(key)
+    if profile is None:
+        profile = build_profile(user_id)
+        cache.set(key, profile, PROFILE_TIMEOUT)
+    return profile
+
+
+def invalidate_users(user_ids):
+    version = get_version()
+    cache.delete_many([get_profile_key(user_id, version) for user_id in user_ids])
+
+
+def invalidate_all():
+    # 角色信息变化影响的用户可能很多，直接切换版本号，旧缓存等待超时淘汰
+    try:
+        cache.incr(PROFILE_VERSION_KEY)
+    except ValueError:
+        cache.set(PROFILE_VERSION_KEY, 1, None)
+
+
+def handle_user_change(sender, instance, update_fields=None, **kwargs):
+    # 登录时只更新last_login，不影响用户信息
+    if update_fields is not None and set(update_fields) <= {"last_login", "password"}:
+        return
+    invalidate_users([instance.pk])
+
+
+def handle_soft_deleted(sender, pk_set, **kwargs):
+    if sender is User:
+        invalidate_users(pk_set)
+    elif sender is Role:
+        invalidate_all()
+
+
+def handle_role_change(sender, instance, **kwargs):
+    invalidate_all()
+
+
+def handle_roles_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        invalidate_users([instance.pk])
+    elif pk_set:
+        invalidate_users(pk_set)
+    else:
+        # 从角色一侧clear时没有pk_set
+        invalidate_all()
+
+
+def connect():
+    post_save.connect(handle_user_change, sender=User, dispatch_uid="user-profile:user-save")
+    post_delete.connect(handle_user_change, sender=User, dispatch_uid="user-profile:user-delete")
+    post_save.connect(handle_role_change, sender=Role, dispatch_uid="user-profile:role-save")
+    post_delete.connect(handle_role_change, sender=Role, dispatch_uid="user-profile:role-delete")
+    m2m_changed.connect(handle_roles_changed, sender=User.roles.through, dispatch_uid="user-profile:roles")
+    soft_deleted.connect(handle_soft_deleted, dispatch_uid="user-profile:soft-deleted")
@@ -0,0 +1,164 @@
+# 进程内的refresh token吊销过滤器
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from utils.bloom import BloomFilter
+
+DEFAULTS = {
+    "CAPACITY": 100000,  # 每个过期日的布隆过滤器容量
+    "ERROR_RATE": 0.01,  # 误判率，误判时回表确认
+    "SYNC_INTERVAL": 5,  # 增量同步其它进程写入的黑名单的间隔秒数
+    "SYNC_OVERLAP": 1000,  # 增量同步时回退重新扫描的id数，覆盖事务晚提交、id小于已同步位置的记录
+    "REBUILD_INTERVAL": 60 * 60,  # 全量重建的间隔秒数，同时作为与数据表的一致性校验
+}
+
+DAY = 24 * 60 * 60
+
+
+class RevocationFilter:
+    """
+    黑名单按token过期日分桶放进布隆过滤器，另用一个精确集合记录重建之后新增的吊销
+    - 进程内第一次检查时从黑名单表全量构建，之后按BlacklistedToken.id增量同步，定期全量重建
+      不在AppConfig.ready中构建：启动时访问数据库会影响migrate等命令，表也可能还不存在
+    - 同一时间只有一个线程重建或同步，其它线程继续使用当前的过滤器；只有第一次构建时需要等待
+    - 自增id按分配顺序而不是提交顺序可见，增量同步从last_id - SYNC_OVERLAP开始，补上晚提交的较小id
+    - 精确集合命中直接判定已吊销；布隆过滤器判定不存在时直接放行，判定存在时回表确认
+    - token过期后所在的桶和精确集合中的记录一起丢弃
+    其它进程写入的黑名单最多延迟SYNC_INTERVAL秒可见；refresh轮换时写黑名单发现已存在会拒绝，不受这个延迟影响
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.reset()
+
+    @property
+    def options(self):
+        return {**DEFAULTS, **getattr(settings, "JWT_REVOCATION_FILTER", {})}
+
+    def reset(self):
+        self.buckets = {}
+        self.recent = {}
+        self.last_id = 0
+        self.synced_at = None
+        self.rebuilt_at = None
+
+    def new_bucket(self):
+        options = self.options
+        return BloomFilter(options["CAPACITY"], options["ERROR_RATE"])
+
+    @staticmethod
+    def iter_entries(queryset):
+        for pk, jti, expires_at in queryset.values_list("id", "token__jti", "token__expires_at").iterator():
+            yield pk, jti, int(expires_at.timestamp())
+
+    def rebuild(self):
+        """
+        全量重建，只加载还未过期的token
+        """
+        started_at = time.monotonic()
+        last_id = BlacklistedToken.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+        queryset = BlacklistedToken.objects.filter(id__lte=last_id, token__expires_at__gt=timezone.now())
+        buckets = {}
+        for pk, jti, exp in self.iter_entries(queryset):
+            day = exp // DAY
+            if day not in buckets:
+                buckets[day] = self.new_bucket()
+            buckets[day].add(jti)
+        now = time.monotonic()
+        with self.lock:
+            self.buckets = buckets
+            # 精确集合中的记录都是写表之后才加入的，重建开始前加入的已包含在布隆过滤器中
+            self.recent = {jti: entry for jti, entry in self.recent.items() if entry[1] >= started_at}
+            self.last_id = max(self.last_id, last_id)
+            self.synced_at = self.rebuilt_at = now
+
+    def sync(self):
+        """
+        增量读取上次同步之后写入黑名单表的记录
+        """
+        start_id = max(self.last_id - self.options["SYNC_OVERLAP"], 0)
+        queryset = BlacklistedToken.objects.filter(id__gt=start_id).order_by("id")
+        last_id = self.last_id
+        for pk, jti, exp in self.iter_entries(queryset):
+            last_id = max(last_id, pk)
+            # 回退范围内已经记录过的跳过；布隆过滤器误判时跳过也没关系，查询时回表确认
+            bucket = self.buckets.get(exp // DAY)
+            if jti in self.recent or (bucket is not None and jti in bucket):
+                continue
+            # 增量同步的记录没有进布隆过滤器，留在精确集合中直到下次重建
+            self.add(jti, exp)
+        with self.lock:
+            self.last_id = max(self.last_id, last_id)
+            self.synced_at = time.monotonic()
+        self.expire()
+
+    def expire(self):
+        now = int(time.time())
+        today = now // DAY
+        with self.lock:
+            for day in [day for day in self.buckets if day < today]:
+                del self.buckets[day]
+            self.recent = {jti: entry for jti, entry in self.recent.items() if entry[0] > now}
+
+    def get_due(self):
+        """
+        到期需要执行的刷新：rebuild、sync或None
+        """
+        options = self.options
+        now = time.monotonic()
+        if now - self.rebuilt_at >= options["REBUILD_INTERVAL"]:
+            return self.rebuild
+        if now - self.synced_at >= options["SYNC_INTERVAL"]:
+            return self.sync
+        return None
+
+    def ensure_fresh(self):
+        if self.rebuilt_at is None:
+            with self.refresh_lock:
+                if self.rebuilt_at is None:
+                    self.rebuild()
+            return
+        if self.get_due() is None:
+            return
+        # 其它线程正在重建或同步时不等待
+        if not self.refresh_lock.acquire(blocking=False):
+            return
+        try:
+            # 拿到锁之前其它线程可能刚刷新过
+            due = self.get_due()
+            if due is not None:
+                due()
+        finally:
+            self.refresh_lock.release()
+
+    def add(self, jti, exp):
+        """
+        记录一个已写入黑名单表的token
+        """
+        with self.lock:
+            self.recent[jti] = (exp, time.monotonic())
+
+    def is_revoked(self, jti, exp):
+        if exp <= time.time():
+            # 已过期的token由签名校验拒绝，这里不再关心
+            return False
+        self.ensure_fresh()
+        if jti in self.recent:
+            return True
+        bucket = self.buckets.get(exp // DAY)
+        if bucket is None or jti not in bucket:
+            return False
+        # 布隆过滤器可能误判，回表确认
+        if BlacklistedToken.objects.filter(token__jti=jti).exists():
+            self.add(jti, exp)
+            return True
+        return False
+
+
+revocation_filter = RevocationFilter()
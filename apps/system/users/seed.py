@@ -0,0 +1,270 @@
+# 压测用的合成数据
+import random
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, Permission
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import DateTimeField, Max
+from django.utils import timezone
+
+from system.menus import routes
+from system.menus.models import Menu
+from system.roles.models import Role, role_trigram_index
+from system.roles.permissions import permission_registry
+from system.users.models import User, user_trigram_index
+from utils.count_strategy import CachedCount
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗"
+GIVEN_NAMES = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰"
+# date_joined从这个时间往前分布，不依赖运行时间，同样的种子生成同样的数据
+BASE_TIME = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class Seeder:
+    """
+    生成用户、角色、菜单树以及三张多对多表的数据，同样的参数和种子生成同样的数据
+    - 主键从各表当前的最大值之后连续分配，写入前就能确定所有关联，不需要回查主键
+    - 菜单、Group数量少，分批bulk_create；用户、三元组索引、多对多表数据量大，直接executemany，
+      不经过模型实例和逐字段的pre_save(SQLite下bulk_create每秒不到一万行)；Role是Group的子表，也直接写入
+    - 密码哈希只预先计算hash_count个，所有用户轮流使用
+    - 直接写入不触发信号，三元组索引随用户一起写入，结束后让相关缓存失效
+    只用于离线造数，运行期间不能有其它写入
+    """
+
+    def __init__(
+        self,
+        users=1000,
+        roles=50,
+        roles_per_user=2,
+        permissions_per_role=10,
+        menu_depth=3,
+        menu_fanout=5,
+        menus_per_role=20,
+        seed=0,
+        batch_size=5000,
+        password="12345",
+        hash_count=4,
+        prefix="seed",
+        trigrams=True,
+    ):
+        self.users = users
+        self.roles = roles
+        self.roles_per_user = min(roles_per_user, roles)
+        self.permissions_per_role = permissions_per_role
+        self.menu_depth = menu_depth
+        self.menu_fanout = menu_fanout
+        self.menus_per_role = menus_per_role
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.password = password
+        self.hash_count = hash_count
+        self.prefix = prefix
+        self.trigrams = trigrams
+        self.now = timezone.now()
+
+    def check(self):
+        if User.all_objects.filter(username__startswith=self.prefix).exists():
+            raise ValueError(f"已存在用户名以{self.prefix}开头的用户，换一个前缀")
+        if Group.objects.filter(name__startswith=f"{self.prefix}-").exists():
+            raise ValueError(f"已存在名称以{self.prefix}-开头的角色，换一个前缀")
+
+    def run(self):
+        """
+        逐个阶段写入，每个阶段结束后产出(阶段, 写入的行数, 耗时秒数)
+        """
+        self.check()
+        menu_ids = yield from self.timed("menus", self.create_menus)
+        role_ids = yield from self.timed("roles", self.create_roles, menu_ids)
+        yield from self.timed("users", self.create_users, role_ids)
+        self.reset_sequences()
+        routes.invalidate()
+        permission_registry.invalidate()
+        CachedCount.invalidate(sender=User)
+        CachedCount.invalidate(sender=Role)
+
+    @staticmethod
+    def timed(name, func, *args):
+        start = time.perf_counter()
+        ids, rows = func(*args)
+        yield name, rows, time.perf_counter() - start
+        return ids
+
+    @staticmethod
+    def next_pk(model):
+        return (model._base_manager.aggregate(pk=Max("pk"))["pk"] or 0) + 1
+
+    @staticmethod
+    def insert_rows(table, columns, rows):
+        quote = connection.ops.quote_name
+        sql = "INSERT INTO %s (%s) VALUES (%s)" % (
+            quote(table),
+            ", ".join(quote(column) for column in columns),
+            ", ".join(["%s"] * len(columns)),
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def insert_through(self, field, rows):
+        """
+        多对多表直接写入，rows为(源主键, 目标主键)
+        """
+        through = field.remote_field.through
+        names = (field.m2m_field_name(), field.m2m_reverse_field_name())
+        self.insert_rows(through._meta.db_table, [through._meta.get_field(name).column for name in names], rows)
+        return len(rows)
+
+    def insert_values(self, model, rows):
+        """
+        模型自身的表直接写入，rows为{attname: 值}，没有给出的字段取模型默认值，日期时间按数据库的要求转换
+        """
+        fields = model._meta.local_concrete_fields
+        columns = [(field.attname, field.get_default(), isinstance(field, DateTimeField)) for field in fields]
+        adapt = connection.ops.adapt_datetimefield_value
+        values = []
+        for row in rows:
+            values.append(
+                [
+                    adapt(row.get(attname, default)) if is_datetime else row.get(attname, default)
+                    for attname, default, is_datetime in columns
+                ]
+            )
+        self.insert_rows(model._meta.db_table, [field.column for field in fields], values)
+        return len(rows)
+
+    def insert_trigrams(self, index, rows):
+        """
+        新记录的三元组索引直接写入，rows为(pk, *被索引字段的值)
+        """
+        columns = [index.index_model._meta.get_field(name).column for name in ("owner", "field", "gram")]
+        values = [(pk, field, gram) for pk, *fields in rows for field, gram in set(index.iter_grams(fields))]
+        self.insert_rows(index.index_model._meta.db_table, columns, values)
+        return len(values)
+
+    def create_menus(self):
+        """
+        每层每个节点menu_fanout个下级，最后一层为按钮，按层写入
+        """
+        pk = self.next_pk(Menu)
+        ids, total = [], 0
+        level = [(None, "/")]
+        for depth in range(1, self.menu_depth + 1):
+            menu_type = Menu.TYPE_BUTTON if depth == self.menu_depth and depth > 1 else "MENU"
+            menus = []
+            for parent_id, parent_path in level:
+                for order in range(self.menu_fanout):
+                    menus.append(
+                        Menu(
+                            pk=pk,
+                            name=f"菜单{pk}",
+                            code=f"{self.prefix}_menu_{pk}",
+                            type=menu_type,
+                            parentId_id=parent_id,
+                            path=f"/{self.prefix}/{pk}" if menu_type != Menu.TYPE_BUTTON else None,
+                            order=order,
+                            tree_path=f"{parent_path}{pk}/",
+                        )
+                    )
+                    pk += 1
+            with transaction.atomic():
+                Menu.objects.bulk_create(menus, batch_size=self.batch_size)
+            ids.extend(menu.pk for menu in menus)
+            total += len(menus)
+            level = [(menu.pk, menu.tree_path) for menu in menus if menu.type != Menu.TYPE_BUTTON]
+        return ids, total
+
+    def create_roles(self, menu_ids):
+        pk = self.next_pk(Group)
+        permission_ids = list(Permission.objects.order_by("pk").values_list("pk", flat=True))
+        roles = [
+            {
+                "group_ptr_id": pk + i,
+                "name": f"{self.prefix}-role-{i}",
+                "code": f"{self.prefix.upper()}_ROLE_{i}",
+                "order": i,
+                "enable": self.random.random() > 0.1,
+                "description": f"压测角色{i}",
+                "create_time": self.now,
+                "update_time": self.now,
+            }
+            for i in range(self.roles)
+        ]
+        role_ids = [role["group_ptr_id"] for role in roles]
+        # 父表用bulk_create，子表直接写入
+        with transaction.atomic():
+            Group.objects.bulk_create(
+                [Group(pk=role["group_ptr_id"], name=role["name"]) for role in roles], batch_size=self.batch_size
+            )
+            self.insert_values(Role, roles)
+        total = len(roles) * 2
+        permissions_per_role = min(self.permissions_per_role, len(permission_ids))
+        menus_per_role = min(self.menus_per_role, len(menu_ids))
+        for start in range(0, len(role_ids), self.batch_size):
+            chunk = role_ids[start : start + self.batch_size]
+            grants = [
+                (role_id, permission_id)
+                for role_id in chunk
+                for permission_id in self.random.sample(permission_ids, permissions_per_role)
+            ]
+            menus = [
+                (role_id, menu_id) for role_id in chunk for menu_id in self.random.sample(menu_ids, menus_per_role)
+            ]
+            with transaction.atomic():
+                total += self.insert_through(Role._meta.get_field("permissions"), grants)
+                total += self.insert_through(Role._meta.get_field("menus"), menus)
+        if self.trigrams:
+            with transaction.atomic():
+                total += self.insert_trigrams(
+                    role_trigram_index, [(role["group_ptr_id"], role["name"], role["code"]) for role in roles]
+                )
+        return role_ids, total
+
+    def make_user(self, pk, i, passwords):
+        username = f"{self.prefix}{i:07d}"
+        name = self.random.choice(SURNAMES) + "".join(self.random.choices(GIVEN_NAMES, k=self.random.randint(1, 2)))
+        return {
+            "id": pk,
+            "username": username,
+            "password": passwords[i % len(passwords)],
+            "name": name,
+            "gender": self.random.choice("12"),
+            "mobile": "1%d%09d" % (self.random.choice((3, 5, 7, 8, 9)), self.random.randrange(10**9)),
+            "email": f"{username}@example.com",
+            "enable": self.random.random() > 0.05,
+            "date_joined": BASE_TIME - timedelta(seconds=self.random.randrange(3 * 365 * 24 * 3600)),
+            "create_time": self.now,
+            "update_time": self.now,
+        }
+
+    def create_users(self, role_ids):
+        pk = self.next_pk(User)
+        passwords = [make_password(self.password) for _ in range(max(self.hash_count, 1))]
+        roles_field = User._meta.get_field("roles")
+        total = 0
+        for start in range(0, self.users, self.batch_size):
+            end = min(start + self.batch_size, self.users)
+            users = [self.make_user(pk + i, i, passwords) for i in range(start, end)]
+            memberships = [
+                (user["id"], role_id) for user in users for role_id in self.random.sample(role_ids, self.roles_per_user)
+            ]
+            with transaction.atomic():
+                total += self.insert_values(User, users)
+                total += self.insert_through(roles_field, memberships)
+                if self.trigrams:
+                    total += self.insert_trigrams(
+                        user_trigram_index,
+                        [(user["id"], *(user.get(field) for field in user_trigram_index.fields)) for user in users],
+                    )
+        return None, total
+
+    @staticmethod
+    def reset_sequences():
+        # 主键是显式指定的，PostgreSQL等使用序列的数据库需要把序列调到最大值之后
+        statements = connection.ops.sequence_reset_sql(no_style(), [Group, User, Menu])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
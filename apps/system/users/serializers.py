@@ -1,15 +1,38 @@
-from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from django.contrib.auth.hashers import make_password
+from django.db.models import Prefetch
+from rest_framework import exceptions, serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenObtainSerializer
 from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from django.utils.translation import gettext_lazy as _
 
 from system.roles.models import Role
 from system.roles.serializers import RoleSerializer
+from system.users.backends import PooledModelBackend
 from system.users.models import User
+from system.users.tokens import RevocableRefreshToken
+from utils.base_serializers import BulkPrimaryKeyRelatedField, EagerLoadingMixin, SoftDeleteUniqueMixin
+
+
+class PooledAuthenticationMixin(TokenObtainSerializer):
+    """
+    登录接口直接用PooledModelBackend校验密码，排队已满、进程池异常时返回429/503
+    放在TokenObtainPairSerializer之后，替换TokenObtainSerializer中经过AUTHENTICATION_BACKENDS的认证
+    """
+
+    def validate(self, attrs):
+        self.user = PooledModelBackend().authenticate(
+            self.context.get("request"),
+            **{self.username_field: attrs[self.username_field], "password": attrs["password"]},
+        )
+        if not api_settings.USER_AUTHENTICATION_RULE(self.user):
+            raise exceptions.AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+        return {}
 
 
 # 自定义登录序列化器，继承自TokenObtainPairSerializer
-class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+class MyTokenObtainPairSerializer(TokenObtainPairSerializer, PooledAuthenticationMixin):
+    token_class = RevocableRefreshToken
     username = serializers.CharField(max_length=150, required=True, label=_("确认密码"), help_text=_("确认密码"))
 
     def validate(self, attrs):
@@ -21,6 +44,8 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
 
 # Token刷新序列化器
 class MyTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RevocableRefreshToken
+
     def validate(self, attrs):
         data = super().validate(attrs)
         data["token"] = data.pop("access")
@@ -28,7 +53,7 @@ class MyTokenRefreshSerializer(TokenRefreshSerializer):
 
 
 # 注册序列化器
-class UserRegisterSerializer(serializers.ModelSerializer):
+class UserRegisterSerializer(SoftDeleteUniqueMixin, serializers.ModelSerializer):
     password_confirm = serializers.CharField(
         label=_("确认密码"),
         help_text=_("确认密码"),
@@ -79,12 +104,15 @@ class UserRegisterSerializer(serializers.ModelSerializer):
 
 
 # 用户序列化器，包含创建用户和更新用户
-class UserSerializer(serializers.ModelSerializer):
-    roleIds = serializers.PrimaryKeyRelatedField(
-        source="roles", many=True, queryset=Role.objects.all(), write_only=True
-    )
+class UserSerializer(SoftDeleteUniqueMixin, EagerLoadingMixin, serializers.ModelSerializer):
+    roleIds = BulkPrimaryKeyRelatedField(source="roles", many=True, queryset=Role.objects.all(), write_only=True)
     roles = RoleSerializer(many=True, read_only=True)
 
+    # 嵌套的RoleSerializer声明了自己的预加载，这里把它挂到roles的Prefetch上
+    @classmethod
+    def get_prefetch_related_fields(cls):
+        return (Prefetch("roles", queryset=RoleSerializer.setup_eager_loading(Role.objects.all())),)
+
     class Meta:
         model = User
         fields = ("id", "username", "email", "mobile", "password", "avatar", "enable", "gender", "roles", "roleIds")
@@ -106,18 +134,14 @@ class UserSerializer(serializers.ModelSerializer):
             },
         }
 
-    # 重写create方法，对密码进行加密
+    # 重写create方法，对密码进行加密，加密后再写入，只保存一次
     def create(self, validated_data):
-        user = super().create(validated_data)
-        user.set_password(validated_data["password"])
-        user.save()
-        return user
+        validated_data["password"] = make_password(validated_data["password"])
+        return super().create(validated_data)
 
     # 重写update方法，对密码进行更新
     def update(self, instance, validated_data):
         password = validated_data.pop("password", None)  # 如果没有传递password，则不更新密码
-        user = super().update(instance, validated_data)
         if password:
-            user.set_password(password)
-            user.save()
-        return user
+            validated_data["password"] = make_password(password)
+        return super().update(instance, validated_data)
@@ -1,9 +1,36 @@
-from django.test import TestCase
+import csv
+import io
+import json
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 from django.contrib.auth import get_user_model
 
+from system.roles.models import Role
+from system.users.authentication import CachedJWTAuthentication, user_cache
+from system.users.bulk_import import UserImporter
+from system.users.checks import check_shared_cache
+from system.users.models import UserTrigram, user_trigram_index
+from system.users.revocation import revocation_filter
+from system.users.token_buffer import token_buffer
+from system.users.tokens import RevocableRefreshToken
+from system.users.views import UserViewSet
+from utils.base_viewset import CustomModelViewSet
+from utils.hashing import import_hash_pool, login_hash_pool
+
 
 class UserAPITestCase(TestCase):
     def setUp(self):
@@ -15,6 +42,12 @@ class UserAPITestCase(TestCase):
         response = self.client.post(reverse('login'), {'username': 'testuser', 'password': '12345'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_login_does_not_print_tokens(self):
+        with mock.patch('sys.stdout', new_callable=StringIO) as stdout:
+            response = self.client.post(reverse('login'), {'username': 'testuser', 'password': '12345'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(response.data['data']['refreshToken'], stdout.getvalue())
+
     def test_logout(self):
         response = self.client.post(reverse('logout'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -34,3 +67,633 @@ class UserAPITestCase(TestCase):
     def test_async_routes(self):
         response = self.client.get(reverse('async-routes'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class UserListQueryCountTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=get_user_model().objects.create_user(username='admin', password='12345'))
+        self.permissions = list(Permission.objects.all()[:5])
+        self.roles = []
+        for i in range(3):
+            role = Role.objects.create(name=f'role{i}', code=f'ROLE_{i}')
+            role.permissions.set(self.permissions)
+            self.roles.append(role)
+
+    def seed_users(self, count):
+        User = get_user_model()
+        users = User.objects.bulk_create(
+            [User(username=f'user{i:05d}', mobile='13800000000', password='!') for i in range(count)]
+        )
+        Through = User.roles.through
+        Through.objects.bulk_create([Through(user_id=u.id, role_id=r.id) for u in users for r in self.roles])
+
+    def count_list_queries(self, size):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('user-list'), {'size': size})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries), response.data['data']['list']
+
+    def test_list_query_count_is_constant(self):
+        self.seed_users(9)
+        small_count, small_list = self.count_list_queries(10)
+        self.assertEqual(len(small_list), 10)
+
+        get_user_model().objects.exclude(username='admin').delete()
+        self.seed_users(999)
+        large_count, large_list = self.count_list_queries(1000)
+        self.assertEqual(len(large_list), 1000)
+
+        # count + users + roles + permissions
+        self.assertEqual(small_count, 4)
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(len(large_list[0]['roles']), 3)
+        self.assertEqual(len(large_list[0]['roles'][0]['permissionIds']), 5)
+
+    def test_write_returns_fresh_roles(self):
+        payload = {'username': 'written', 'password': '12345', 'mobile': '13800000000', 'roleIds': [self.roles[0].pk]}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('user-list'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # 密码加密后随INSERT写入，不再额外UPDATE
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "tb_users"')])
+        user = get_user_model().objects.get(username='written')
+        self.assertTrue(user.check_password('12345'))
+
+        payload['roleIds'] = [role.pk for role in self.roles[1:]]
+        response = self.client.put(reverse('user-detail', args=[user.pk]), payload, format='json')
+        self.assertEqual([role['code'] for role in response.data['data']['roles']], ['ROLE_1', 'ROLE_2'])
+        self.assertEqual(len(response.data['data']['roles'][0]['permissionIds']), 5)
+
+
+class UserCursorPaginationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User = get_user_model()
+        # 同一时间注册的用户靠id区分先后
+        joined = timezone.now()
+        User.objects.bulk_create(
+            [User(username=f'user{i:02d}', mobile='13800000000', password='!', date_joined=joined) for i in range(25)]
+        )
+        self.expected = list(User.objects.order_by('-date_joined', 'id').values_list('username', flat=True))
+
+    def get_page(self, cursor=''):
+        response = self.client.get(reverse('user-list'), {'size': 10, 'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['data']
+
+    def test_walk_forward_and_back(self):
+        first = self.get_page()
+        self.assertEqual([u['username'] for u in first['list']], self.expected[:10])
+        self.assertIsNone(first['previous'])
+        self.assertEqual(first['currentPage'], 1)
+
+        second = self.get_page(first['next'])
+        third = self.get_page(second['next'])
+        self.assertEqual([u['username'] for u in second['list']], self.expected[10:20])
+        self.assertEqual([u['username'] for u in third['list']], self.expected[20:])
+        self.assertEqual(third['currentPage'], 3)
+        self.assertIsNone(third['next'])
+
+        back = self.get_page(third['previous'])
+        self.assertEqual([u['username'] for u in back['list']], self.expected[10:20])
+        self.assertEqual(back['currentPage'], 2)
+        self.assertIsNotNone(back['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('user-list'), {'size': 10, 'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_mode_reports_current_page(self):
+        response = self.client.get(reverse('user-list'), {'size': 10, 'page': 2})
+        data = response.data['data']
+        self.assertEqual(data['currentPage'], 2)
+        self.assertEqual(data['total'], 25)
+        self.assertEqual(len(data['list']), 10)
+
+
+class UserListCountStrategyTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        for i in range(3):
+            get_user_model().objects.create_user(username=f'counted{i}', password='12345', mobile='13800000000')
+
+    def get_data(self, **params):
+        response = self.client.get(reverse('user-list'), {'size': 10, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['data']
+
+    def test_cached_total_is_flagged_and_invalidated(self):
+        first = self.get_data(username='counted')
+        self.assertEqual((first['total'], first['totalExact']), (3, True))
+
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.get_data(username='counted')
+        self.assertEqual((cached['total'], cached['totalExact']), (3, False))
+        self.assertFalse(any('COUNT(*)' in q['sql'] for q in ctx.captured_queries))
+
+        # 其它过滤条件使用独立的缓存
+        self.assertEqual(self.get_data(username='counted1')['total'], 1)
+
+        get_user_model().objects.create_user(username='counted3', password='12345', mobile='13800000000')
+        fresh = self.get_data(username='counted')
+        self.assertEqual((fresh['total'], fresh['totalExact']), (4, True))
+
+
+class UserTrigramSearchTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.alice = User.objects.create_user(username='alice_wonder', password='12345', mobile='13811112222')
+        self.bob = User.objects.create_user(username='bob_builder', password='12345', mobile='13933334444')
+
+    def search(self, **params):
+        response = self.client.get(reverse('user-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(u['username'] for u in response.data['data'])
+
+    def test_substring_search(self):
+        self.assertEqual(self.search(username='WONDER'), ['alice_wonder'])
+        self.assertEqual(self.search(username='_b'), ['bob_builder'])
+        self.assertEqual(self.search(mobile='3333'), ['bob_builder'])
+        # 三元组都命中但子串不连续
+        self.assertEqual(self.search(username='alicewon'), [])
+
+    def test_index_follows_updates(self):
+        self.alice.username = 'alice_renamed'
+        self.alice.save()
+        self.assertEqual(self.search(username='wonder'), [])
+        self.assertEqual(self.search(username='renamed'), ['alice_renamed'])
+
+    def test_rebuild_command(self):
+        UserTrigram.objects.all().delete()
+        self.assertEqual(self.search(username='builder'), [])
+        call_command('rebuild_trigram_index', 'users.User', stdout=StringIO())
+        self.assertEqual(self.search(username='builder'), ['bob_builder'])
+
+    def test_rebuild_failure_keeps_index(self):
+        # 第二批写入失败时整个重建回滚，旧索引仍可用
+        with mock.patch.object(user_trigram_index, 'bulk_index', side_effect=[None, RuntimeError]):
+            with self.assertRaises(RuntimeError):
+                user_trigram_index.rebuild(batch_size=1)
+        self.assertEqual(self.search(username='builder'), ['bob_builder'])
+        self.assertEqual(self.search(username='wonder'), ['alice_wonder'])
+
+
+class UserBulkImportTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.role = Role.objects.create(name='tester', code='TESTER')
+        get_user_model().objects.create_user(username='existing', password='12345', mobile='13800000000')
+
+    def upload(self, name, content):
+        return self.client.post(
+            reverse('user-bulk-import'), {'file': SimpleUploadedFile(name, content.encode('utf-8'))}, format='multipart'
+        )
+
+    def test_csv_import_reports_row_errors(self):
+        content = (
+            'username,password,mobile,email,roleIds\n'
+            f'newuser1,secret1,13811111111,a@example.com,{self.role.pk}\n'
+            'existing,secret2,13822222222,,\n'
+            'newuser2,secret3,13833333333,,999\n'
+            'newuser3,secret4,13844444444,not-an-email,\n'
+            'newuser1,secret5,13855555555,,\n'
+            'bad user!,secret6,13866666666,,\n'
+        )
+        response = self.upload('users.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        report = response.data['data']
+        self.assertEqual(report['created'], 1)
+        # 与POST /users一样校验用户名字符
+        self.assertEqual([error['row'] for error in report['errors']], [2, 3, 4, 5, 6])
+        self.assertIn('username', report['errors'][4]['errors'])
+
+        user = get_user_model().objects.get(username='newuser1')
+        self.assertTrue(user.check_password('secret1'))
+        self.assertEqual(list(user.roles.all()), [self.role])
+        self.assertTrue(UserTrigram.objects.filter(owner=user, field='username', gram='new').exists())
+
+    @override_settings(PASSWORD_HASH_WORKERS=2)
+    def test_ndjson_import_in_batches(self):
+        lines = [json.dumps({'username': f'bulk{i:04d}', 'password': f'pass{i:04d}', 'mobile': '13800000000'})
+                 for i in range(25)]
+        lines.insert(3, '{broken')
+        try:
+            report = UserImporter(batch_size=10).run(io.BytesIO('\n'.join(lines).encode('utf-8')), 'ndjson')
+        finally:
+            import_hash_pool.shutdown()
+        self.assertEqual(report['created'], 25)
+        self.assertEqual(report['errors'][0]['row'], 4)
+        self.assertTrue(get_user_model().objects.get(username='bulk0024').check_password('pass0024'))
+
+
+@override_settings(LOGIN_HASH_WORKERS=0)
+class LoginHashPoolTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        get_user_model().objects.create_user(username='pooled', password='12345')
+
+    def test_login_returns_429_when_hash_queue_is_full(self):
+        with mock.patch.object(login_hash_pool, 'try_acquire', return_value=False):
+            response = self.client.post(reverse('login'), {'username': 'pooled', 'password': '12345'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_session_login_does_not_use_hash_pool(self):
+        # admin、session登录走全局认证后端，不受登录进程池排队影响
+        with mock.patch.object(login_hash_pool, 'try_acquire', return_value=False):
+            self.assertTrue(self.client.login(username='pooled', password='12345'))
+            response = self.client.post(
+                reverse('admin:login'), {'username': 'pooled', 'password': 'wrong', 'next': '/admin/'}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_wrong_password_is_rejected(self):
+        response = self.client.post(reverse('login'), {'username': 'pooled', 'password': 'wrong'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_async_login(self):
+        response = self.client.post(
+            reverse('async-login'), {'username': 'pooled', 'password': '12345'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('accessToken', response.json()['data'])
+
+        response = self.client.post(reverse('async-login'), {'username': 'nobody', 'password': '12345'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with mock.patch.object(login_hash_pool, 'try_acquire', return_value=False):
+            response = self.client.post(
+                reverse('async-login'), {'username': 'pooled', 'password': '12345'}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_async_login_rejects_non_object_body(self):
+        for body in ('[1]', '"admin"', '1', 'null', '{bad'):
+            response = self.client.post(reverse('async-login'), body, content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+
+
+class UserExportTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(name='viewer', code='VIEWER')
+        User = get_user_model()
+        users = User.objects.bulk_create(
+            [User(username=f'export{i:02d}', mobile='13800000000', password='!') for i in range(12)]
+        )
+        User.roles.through.objects.bulk_create([User.roles.through(user_id=u.id, role_id=self.role.id) for u in users])
+
+    def export(self, **params):
+        response = self.client.get(reverse('user-export'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode('utf-8-sig')
+
+    def test_csv_export(self):
+        rows = list(csv.DictReader(io.StringIO(self.export())))
+        self.assertEqual(len(rows), 12)
+        self.assertNotIn('password', rows[0])
+        self.assertEqual(json.loads(rows[0]['roles'])[0]['code'], 'VIEWER')
+
+    def test_csv_formula_injection(self):
+        get_user_model().objects.filter(username='export00').update(email='=HYPERLINK("http://x")', mobile='+8613800')
+        rows = list(csv.DictReader(io.StringIO(self.export())))
+        row = next(row for row in rows if row['username'] == 'export00')
+        self.assertEqual(row['email'], '\'=HYPERLINK("http://x")')
+        self.assertEqual(row['mobile'], "'+8613800")
+
+    def test_export_is_opt_in(self):
+        self.assertTrue(hasattr(UserViewSet, 'export'))
+        self.assertFalse(hasattr(CustomModelViewSet, 'export'))
+
+    def test_ndjson_export_honors_filters_and_batches(self):
+        with mock.patch.object(UserViewSet, 'export_chunk_size', 5):
+            with CaptureQueriesContext(connection) as ctx:
+                lines = self.export(type='ndjson', enable='True').splitlines()
+        self.assertEqual(len(lines), 12)
+        self.assertEqual(json.loads(lines[0])['roles'][0]['code'], 'VIEWER')
+        # 每批：users + roles + permissions，共3批
+        self.assertEqual(len(ctx.captured_queries), 9)
+
+
+class UserBatchDeleteTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.users = [User.objects.create_user(username=f'doomed{i}', password='12345') for i in range(4)]
+
+    def list_usernames(self):
+        response = self.client.get(reverse('user-list'))
+        return sorted(u['username'] for u in response.data['data'])
+
+    def test_soft_delete_is_single_update(self):
+        ids = [user.pk for user in self.users[:3]]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('user-batch-delete'), {'ids': ids}, format='json')
+        self.assertEqual(response.data['data'], {'deleted': 3})
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(self.list_usernames(), ['doomed3'])
+        self.assertEqual(get_user_model().all_objects.count(), 4)
+
+        # 逻辑删除的用户不能登录
+        response = self.client.post(reverse('login'), {'username': 'doomed0', 'password': '12345'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_hard_delete_purges_tombstones(self):
+        self.client.delete(reverse('user-detail', args=[self.users[0].pk]))
+        self.assertTrue(get_user_model().all_objects.filter(pk=self.users[0].pk, is_deleted=True).exists())
+
+        ids = [user.pk for user in self.users[:2]]
+        response = self.client.post(reverse('user-batch-delete'), {'ids': ids, 'hard': True}, format='json')
+        self.assertEqual(response.data['data'], {'deleted': 2})
+        self.assertFalse(get_user_model().all_objects.filter(pk__in=ids).exists())
+
+    def test_invalid_ids(self):
+        for payload in ({'ids': ['abc']}, {'ids': []}, {}, {'ids': 1}):
+            response = self.client.post(reverse('user-batch-delete'), payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, payload)
+        self.assertEqual(len(self.list_usernames()), 4)
+
+    def test_username_of_deleted_user_is_taken(self):
+        self.client.post(reverse('user-batch-delete'), {'ids': [self.users[0].pk]}, format='json')
+        response = self.client.post(
+            reverse('user-list'), {'username': 'doomed0', 'password': '12345', 'mobile': '13800000000'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('username', response.data)
+
+    def test_trigram_rows_are_removed(self):
+        self.client.delete(reverse('user-detail', args=[self.users[0].pk]))
+        self.assertFalse(UserTrigram.objects.filter(owner_id=self.users[0].pk).exists())
+        self.assertTrue(UserTrigram.objects.filter(owner_id=self.users[1].pk).exists())
+
+
+class UserProfileTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='profiled', password='12345', name='Pro')
+        self.role = Role.objects.create(name='管理员', code='ADMIN')
+        self.user.roles.add(self.role)
+        self.client.force_authenticate(user=self.user)
+
+    def get_profile(self):
+        response = self.client.get(reverse('user-detail'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['data']
+
+    def test_profile_is_cached_and_invalidated(self):
+        with CaptureQueriesContext(connection) as ctx:
+            profile = self.get_profile()
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(profile['username'], 'profiled')
+        self.assertEqual(profile['profile']['nickName'], 'Pro')
+        self.assertEqual(profile['currentRole']['code'], 'ADMIN')
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.get_profile()
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        self.role.name = '超级管理员'
+        self.role.save()
+        self.assertEqual(self.get_profile()['currentRole']['name'], '超级管理员')
+
+        self.user.roles.clear()
+        self.assertIsNone(self.get_profile()['currentRole'])
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('user-detail'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_is_unauthorized(self):
+        # 逻辑删除不经过信号，认证缓存中的快照仍然有效
+        user_cache.set(self.user.pk, object())
+        get_user_model().objects.filter(pk=self.user.pk).soft_delete()
+        response = self.client.get(reverse('user-detail'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIsNone(user_cache.get(self.user.pk))
+
+    def test_process_local_cache_is_reported(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}
+        with override_settings(DEBUG=False, CACHES=locmem):
+            self.assertEqual([w.id for w in check_shared_cache(None)], ['users.E001'])
+        with override_settings(DEBUG=True, CACHES=locmem):
+            self.assertEqual(check_shared_cache(None), [])
+        with override_settings(DEBUG=False, CACHES=redis):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class RevocationFilterTestCase(TestCase):
+    def setUp(self):
+        revocation_filter.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='revoked', password='12345')
+
+    def test_valid_token_is_checked_without_queries(self):
+        token = RevocableRefreshToken.for_user(self.user)
+        RevocableRefreshToken.for_user(self.user).blacklist()
+        revocation_filter.rebuild()
+        with CaptureQueriesContext(connection) as ctx:
+            RevocableRefreshToken(str(token))
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_blacklisted_token_is_rejected(self):
+        token = RevocableRefreshToken.for_user(self.user)
+        revocation_filter.rebuild()
+        token.blacklist()
+        with CaptureQueriesContext(connection) as ctx:
+            with self.assertRaises(TokenError):
+                RevocableRefreshToken(str(token))
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        # 重建后由布隆过滤器命中，回表确认
+        revocation_filter.rebuild()
+        with self.assertRaises(TokenError):
+            RevocableRefreshToken(str(token))
+
+    @override_settings(JWT_REVOCATION_FILTER={'SYNC_INTERVAL': 0})
+    def test_blacklist_written_by_other_process_is_synced(self):
+        token = RevocableRefreshToken.for_user(self.user)
+        revocation_filter.rebuild()
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+        with self.assertRaises(TokenError):
+            RevocableRefreshToken(str(token))
+
+    @override_settings(JWT_REVOCATION_FILTER={'SYNC_INTERVAL': 0})
+    def test_late_committed_lower_id_is_synced(self):
+        token = RevocableRefreshToken.for_user(self.user)
+        revocation_filter.rebuild()
+        row = BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+        # 其它事务先提交了更大的id，已同步位置越过了这条记录
+        revocation_filter.last_id = row.pk + 10
+        with self.assertRaises(TokenError):
+            RevocableRefreshToken(str(token))
+
+    @override_settings(JWT_REVOCATION_FILTER={'SYNC_INTERVAL': 0, 'REBUILD_INTERVAL': 0})
+    def test_refresh_is_single_flight(self):
+        revocation_filter.rebuild()
+        # 其它线程正在刷新时不等待，也不重复刷新
+        with revocation_filter.refresh_lock, mock.patch.object(revocation_filter, 'rebuild') as rebuild:
+            with CaptureQueriesContext(connection) as ctx:
+                revocation_filter.ensure_fresh()
+        rebuild.assert_not_called()
+        self.assertEqual(len(ctx.captured_queries), 0)
+        with mock.patch.object(revocation_filter, 'rebuild') as rebuild:
+            revocation_filter.ensure_fresh()
+        rebuild.assert_called_once()
+
+    def test_logout_is_idempotent(self):
+        response = self.client.post(reverse('login'), {'username': 'revoked', 'password': '12345'})
+        refresh = response.data['data']['refreshToken']
+        for _ in range(2):
+            response = self.client.post(reverse('logout'), {'refresh_token': refresh})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('logout'), {'refresh_token': 'broken'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        response = self.client.post(reverse('login'), {'username': 'revoked', 'password': '12345'})
+        refresh = response.data['data']['refreshToken']
+        response = self.client.post(reverse('refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # 其它进程的过滤器还没同步到时，写黑名单发现已存在同样拒绝
+        revocation_filter.reset()
+        revocation_filter.rebuild()
+        revocation_filter.buckets.clear()
+        response = self.client.post(reverse('refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CachedJWTAuthenticationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='cached', password='12345')
+        self.role = Role.objects.create(name='审计', code='AUDIT')
+        self.user.roles.add(self.role)
+        token = RevocableRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get_detail(self):
+        return self.client.get(reverse('user-detail'))
+
+    def test_user_is_loaded_once(self):
+        self.assertEqual(self.get_detail().status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get_detail()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(user_cache.get(self.user.pk).role_codes, {'AUDIT'})
+
+    def test_cache_is_invalidated(self):
+        self.get_detail()
+        self.user.roles.remove(self.role)
+        self.get_detail()
+        self.assertEqual(user_cache.get(self.user.pk).role_codes, set())
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_detail().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_direct_permissions_invalidate_cache(self):
+        self.get_detail()
+        self.user.user_permissions.add(Permission.objects.get(codename='change_role'))
+        self.assertIsNone(user_cache.get(self.user.pk))
+        self.get_detail()
+        self.assertEqual(user_cache.get(self.user.pk).extra_permissions, {'roles.change_role'})
+
+    def test_deleted_user_is_rejected(self):
+        self.get_detail()
+        self.client.post(reverse('user-batch-delete'), {'ids': [self.user.pk]}, format='json')
+        self.assertEqual(self.get_detail().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_model_attributes_are_loaded_lazily(self):
+        token = self.client._credentials['HTTP_AUTHORIZATION'].split()[1]
+        authentication = CachedJWTAuthentication()
+        cached = authentication.get_user(authentication.get_validated_token(token))
+        with self.assertNumQueries(0):
+            self.assertEqual(cached.username, 'cached')
+            self.assertEqual(cached, self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(cached.get_username(), 'cached')
+            self.assertIsNone(cached.name)
+        self.assertEqual(list(cached.roles.values_list('code', flat=True)), ['AUDIT'])
+        # 缓存中的快照没有带上这个请求查询的完整用户
+        self.assertNotIn('_user', user_cache.get(self.user.pk).__dict__)
+
+        cached.name = 'renamed'
+        cached.username = 'cached2'
+        cached.save()
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.name, self.user.username), ('renamed', 'cached2'))
+
+
+@override_settings(JWT_TOKEN_WRITE_BEHIND={'ENABLED': True, 'FLUSH_INTERVAL': 0, 'MAX_BATCH': 3})
+class TokenWriteBufferTestCase(TestCase):
+    def setUp(self):
+        revocation_filter.reset()
+        token_buffer.flush()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='buffered', password='12345')
+
+    def login(self):
+        response = self.client.post(reverse('login'), {'username': 'buffered', 'password': '12345'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['data']['refreshToken']
+
+    def test_tokens_are_written_in_batches(self):
+        with CaptureQueriesContext(connection) as ctx:
+            refresh = self.login()
+        self.assertFalse([q for q in ctx.captured_queries if 'token_blacklist' in q['sql']])
+        self.assertEqual(len(token_buffer), 1)
+
+        # 轮换：新token和旧token的黑名单都在队列中，达到MAX_BATCH后一起写入
+        response = self.client.post(reverse('refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(OutstandingToken.objects.count(), 0)
+        self.login()
+        self.assertEqual(len(token_buffer), 0)
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=RevocableRefreshToken(refresh, verify=False)['jti']))
+
+    def test_failed_flush_does_not_fail_the_request(self):
+        refresh = self.login()
+        self.client.post(reverse('refresh'), {'refresh': refresh})
+        with mock.patch.object(token_buffer, 'write', side_effect=DatabaseError('down')):
+            with self.assertLogs('system.users.token_buffer', 'ERROR'):
+                self.login()
+        # 写入失败的数据放回队列，下次写入
+        self.assertEqual(len(token_buffer), 3)
+        token_buffer.flush()
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+    def test_pending_blacklist_is_visible(self):
+        refresh = self.login()
+        response = self.client.post(reverse('refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(BlacklistedToken.objects.exists())
+        # 过滤器中没有这条记录时(如其它线程重建过)，仍能从待写入队列中看到
+        revocation_filter.reset()
+        revocation_filter.rebuild()
+        response = self.client.post(reverse('refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        token_buffer.flush()
+        revocation_filter.reset()
+        response = self.client.post(reverse('refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
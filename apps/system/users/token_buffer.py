@@ -0,0 +1,159 @@
+# token表的延迟批量写入
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": False,  # 默认关闭，关闭时与simplejwt一样逐条同步写入
+    "MAX_BATCH": 500,  # 待写入达到这个数量时由当前请求立即写入，写入失败只记录日志，不影响请求
+    "FLUSH_INTERVAL": 1,  # 后台线程写入的间隔秒数，为0时不启动后台线程
+    "MAX_PENDING": 10000,  # 写入失败时最多保留的待写入数，超出的丢弃并记录日志
+}
+
+
+class TokenWriteBuffer:
+    """
+    登录签发的OutstandingToken、refresh轮换和退出写入的BlacklistedToken先放在进程内，按批写入
+    - 待写入达到MAX_BATCH时当前请求同步写入，否则由后台线程每FLUSH_INTERVAL秒写入一次
+    - 写入失败时数据放回队列等待下次写入，token已经签发，请求仍然成功
+    - 进程正常退出时同步写入剩余数据；进程崩溃最多丢失一个写入间隔内的数据
+    - 待写入和正在写入的黑名单在本进程的吊销检查中立即可见，其它进程在写入并同步后可见
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.outstanding = []
+        self.blacklisted = {}
+        # 正在写入的黑名单，写入完成前吊销检查仍然可见
+        self.flushing = {}
+        self.thread = None
+        self.registered = False
+
+    @property
+    def options(self):
+        return {**DEFAULTS, **getattr(settings, "JWT_TOKEN_WRITE_BEHIND", {})}
+
+    @property
+    def enabled(self):
+        return self.options["ENABLED"]
+
+    def __len__(self):
+        return len(self.outstanding) + len(self.blacklisted)
+
+    def add_outstanding(self, user, token):
+        with self.lock:
+            self.outstanding.append(
+                OutstandingToken(
+                    user=user,
+                    jti=token[api_settings.JTI_CLAIM],
+                    token=str(token),
+                    created_at=token.current_time,
+                    expires_at=datetime_from_epoch(token["exp"]),
+                )
+            )
+        self.schedule()
+
+    def add_blacklisted(self, jti, token, exp):
+        """
+        返回是否新加入，同一个token已在待写入中时返回False
+        """
+        with self.lock:
+            if jti in self.blacklisted or jti in self.flushing:
+                return False
+            self.blacklisted[jti] = (token, exp)
+        self.schedule()
+        return True
+
+    def is_blacklisted(self, jti):
+        return jti in self.blacklisted or jti in self.flushing
+
+    def schedule(self):
+        options = self.options
+        if not self.registered:
+            self.registered = True
+            atexit.register(self.flush)
+        if len(self) >= options["MAX_BATCH"]:
+            self.try_flush()
+        elif options["FLUSH_INTERVAL"] and self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name="token-write-buffer", daemon=True)
+                    self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.options["FLUSH_INTERVAL"])
+            try:
+                self.try_flush()
+            finally:
+                close_old_connections()
+
+    def try_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("token write buffer flush failed")
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                outstanding, self.outstanding = self.outstanding, []
+                blacklisted, self.blacklisted = self.blacklisted, {}
+                self.flushing = blacklisted
+            if not outstanding and not blacklisted:
+                return
+            try:
+                self.write(outstanding, blacklisted)
+            except Exception:
+                self.requeue(outstanding, blacklisted)
+                raise
+            finally:
+                with self.lock:
+                    self.flushing = {}
+
+    def requeue(self, outstanding, blacklisted):
+        limit = self.options["MAX_PENDING"]
+        with self.lock:
+            outstanding = outstanding + self.outstanding
+            blacklisted = {**blacklisted, **self.blacklisted}
+            dropped = max(len(outstanding) - limit, 0) + max(len(blacklisted) - limit, 0)
+            # 超出上限时丢弃最早的数据
+            self.outstanding = outstanding[-limit:]
+            self.blacklisted = dict(list(blacklisted.items())[-limit:])
+        if dropped:
+            logger.error("token write buffer is full, dropped %s pending rows", dropped)
+
+    @staticmethod
+    def write(outstanding, blacklisted):
+        with transaction.atomic():
+            OutstandingToken.objects.bulk_create(outstanding, ignore_conflicts=True)
+            if not blacklisted:
+                return
+            # 被吊销的token可能不是本进程签发的，缺少的OutstandingToken一并补上
+            existing = dict(OutstandingToken.objects.filter(jti__in=list(blacklisted)).values_list("jti", "pk"))
+            OutstandingToken.objects.bulk_create(
+                [
+                    OutstandingToken(jti=jti, token=token, expires_at=datetime_from_epoch(exp))
+                    for jti, (token, exp) in blacklisted.items()
+                    if jti not in existing
+                ],
+                ignore_conflicts=True,
+            )
+            if len(existing) < len(blacklisted):
+                existing = dict(OutstandingToken.objects.filter(jti__in=list(blacklisted)).values_list("jti", "pk"))
+            BlacklistedToken.objects.bulk_create(
+                [BlacklistedToken(token_id=pk) for pk in existing.values()], ignore_conflicts=True
+            )
+
+
+token_buffer = TokenWriteBuffer()
@@ -0,0 +1,197 @@
+# 过期token清理
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class TokenPurger:
+    """
+    按主键分批删除已过期的OutstandingToken和对应的BlacklistedToken，每批一个短事务
+    批次之间休眠sleep秒，避免长时间占用锁和复制带宽
+    token按签发顺序写入、有效期固定，过期记录集中在主键较小的一端，按主键扫描不需要expires_at索引
+    """
+
+    def __init__(self, batch_size=1000, sleep=0, grace=timedelta(0), max_batches=None):
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.cutoff = timezone.now() - grace
+        self.max_batches = max_batches
+
+    def get_expired_ids(self, last_id):
+        queryset = OutstandingToken.objects.filter(expires_at__lt=self.cutoff)
+        if last_id is not None:
+            queryset = queryset.filter(pk__gt=last_id)
+        return list(queryset.order_by("pk").values_list("pk", flat=True)[: self.batch_size])
+
+    @staticmethod
+    def delete_batch(ids):
+        # 黑名单表没有其它关联，级联删除时直接按token_id批量删除
+        with transaction.atomic(using=router.db_for_write(OutstandingToken)):
+            total, deleted = OutstandingToken.objects.filter(pk__in=ids).delete()
+        return deleted.get(OutstandingToken._meta.label, 0), deleted.get(BlacklistedToken._meta.label, 0)
+
+    def run(self):
+        """
+        逐批删除，每批结束后产出累计进度
+        {"batches": 批次数, "outstanding": 删除的OutstandingToken数, "blacklisted": 删除的BlacklistedToken数,
+         "elapsed": 耗时秒数, "rate": 每秒删除的OutstandingToken数}
+        """
+        stats = {"batches": 0, "outstanding": 0, "blacklisted": 0, "elapsed": 0.0, "rate": 0.0}
+        started_at = time.monotonic()
+        last_id = None
+        while self.max_batches is None or stats["batches"] < self.max_batches:
+            ids = self.get_expired_ids(last_id)
+            if not ids:
+                return
+            outstanding, blacklisted = self.delete_batch(ids)
+            last_id = ids[-1]
+            stats["batches"] += 1
+            stats["outstanding"] += outstanding
+            stats["blacklisted"] += blacklisted
+            stats["elapsed"] = time.monotonic() - started_at
+            stats["rate"] = stats["outstanding"] / stats["elapsed"] if stats["elapsed"] else 0.0
+            yield dict(stats)
+            if len(ids) < self.batch_size:
+                return
+            if self.sleep:
+                time.sleep(self.sleep)
+
+
+class TokenPartitions:
+    """
+    MySQL下按过期日对OutstandingToken做RANGE分区，过期的数据整个分区删除，不再逐行DELETE
+    分区名为p<YYYYMMDD>，存放expires_at早于该日的记录，最后一个分区pmax兜底
+    MySQL分区表不支持外键(自身的外键和其它表指向它的外键都不行)、唯一键必须包含分区字段，
+    因此分区前需要去掉这些外键、主键改为(id, expires_at)、其它唯一索引改为普通索引，见layout_sql()
+    去掉外键后级联删除仍由Django的on_delete在应用层处理
+    """
+
+    table = OutstandingToken._meta.db_table
+
+    def __init__(self, using=None):
+        self.connection = connections[using or router.db_for_write(OutstandingToken)]
+
+    @property
+    def supported(self):
+        # 分区相关的SQL只适用于MySQL，调用方使用前先检查
+        return self.connection.vendor == "mysql"
+
+    @staticmethod
+    def partition_name(day):
+        return f"p{day:%Y%m%d}"
+
+    def partition_sql(self, day):
+        return f"PARTITION {self.partition_name(day)} VALUES LESS THAN (TO_DAYS('{day:%Y-%m-%d}'))"
+
+    def get_foreign_keys(self):
+        """
+        表自身的外键和其它表指向它的外键，[(表名, 外键名)]
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT TABLE_NAME, CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+                "WHERE CONSTRAINT_SCHEMA = DATABASE() AND (TABLE_NAME = %s OR REFERENCED_TABLE_NAME = %s) "
+                "ORDER BY TABLE_NAME, CONSTRAINT_NAME",
+                [self.table, self.table],
+            )
+            return [(table, name) for table, name in cursor.fetchall()]
+
+    def get_unique_indexes(self):
+        """
+        主键以外的唯一索引，[(索引名, [字段])]
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND NON_UNIQUE = 0 AND INDEX_NAME <> 'PRIMARY' "
+                "ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+                [self.table],
+            )
+            indexes = {}
+            for name, column in cursor.fetchall():
+                indexes.setdefault(name, []).append(column)
+            return list(indexes.items())
+
+    def layout_sql(self, days_ahead=8):
+        """
+        把现有表改为分区表的DDL，只生成不执行，由DBA在维护窗口执行
+        外键名和索引名由迁移生成，从information_schema读取当前库中的实际名称
+        """
+        quote_name = self.connection.ops.quote_name
+        today = timezone.now().date()
+        partitions = ",\n  ".join(
+            [self.partition_sql(today + timedelta(days=i)) for i in range(days_ahead + 1)]
+            + ["PARTITION pmax VALUES LESS THAN MAXVALUE"]
+        )
+        sql = [
+            f"ALTER TABLE {quote_name(table)} DROP FOREIGN KEY {quote_name(name)}"
+            for table, name in self.get_foreign_keys()
+        ]
+        changes = []
+        for name, columns in self.get_unique_indexes():
+            index = quote_name(f"{self.table}_{'_'.join(columns)}_idx")
+            changes.append(f"DROP INDEX {quote_name(name)}")
+            changes.append(f"ADD INDEX {index} ({', '.join(quote_name(column) for column in columns)})")
+        changes.append("DROP PRIMARY KEY, ADD PRIMARY KEY (id, expires_at)")
+        sql.append(f"ALTER TABLE {self.table} {', '.join(changes)}")
+        sql.append(f"ALTER TABLE {self.table} PARTITION BY RANGE (TO_DAYS(expires_at)) (\n  {partitions}\n)")
+        return sql
+
+    def get_partitions(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+                "ORDER BY PARTITION_ORDINAL_POSITION",
+                [self.table],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def create_ahead(self, days_ahead=8):
+        """
+        从pmax中拆出未来days_ahead天的分区，返回新建的分区名
+        """
+        existing = set(self.get_partitions())
+        if "pmax" not in existing:
+            return []
+        today = timezone.now().date()
+        days = [
+            today + timedelta(days=i)
+            for i in range(days_ahead + 1)
+            if self.partition_name(today + timedelta(days=i)) not in existing
+        ]
+        last = max((name for name in existing if name != "pmax"), default="")
+        days = [day for day in days if self.partition_name(day) > last]
+        if not days:
+            return []
+        partitions = ", ".join([self.partition_sql(day) for day in days] + ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {self.table} REORGANIZE PARTITION pmax INTO ({partitions})")
+        return [self.partition_name(day) for day in days]
+
+    def drop_expired(self, cutoff, batch_size=1000, sleep=0):
+        """
+        删除整个分区都已过期的分区，返回删除的分区名
+        先分批删除这些分区中token对应的BlacklistedToken，黑名单表没有expires_at，无法跟着分区删除
+        """
+        boundary = self.partition_name(cutoff.date())
+        expired = [name for name in self.get_partitions() if name != "pmax" and name <= boundary]
+        if not expired:
+            return []
+        upper = datetime.strptime(expired[-1][1:], "%Y%m%d").replace(tzinfo=dt_timezone.utc)
+        while True:
+            ids = list(
+                BlacklistedToken.objects.filter(token__expires_at__lt=upper).values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            BlacklistedToken.objects.filter(pk__in=ids).delete()
+            if sleep:
+                time.sleep(sleep)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {self.table} DROP PARTITION {', '.join(expired)}")
+        return expired
@@ -0,0 +1,47 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+
+from system.users.revocation import revocation_filter
+from system.users.token_buffer import token_buffer
+
+
+class TokenRevoked(TokenError):
+    """
+    token已在黑名单中
+    """
+
+
+# refresh token，黑名单检查先走进程内的吊销过滤器
+class RevocableRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        if not token_buffer.enabled:
+            return super().for_user(user)
+        # 跳过BlacklistMixin的逐条写入，OutstandingToken交给token_buffer批量写入
+        token = super(BlacklistMixin, cls).for_user(user)
+        token_buffer.add_outstanding(user, token)
+        return token
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if token_buffer.is_blacklisted(jti) or revocation_filter.is_revoked(jti, self.payload["exp"]):
+            raise TokenRevoked(_("Token is blacklisted"))
+
+    def blacklist(self):
+        """
+        写入黑名单表后同步到本进程的过滤器
+        黑名单已存在说明token已被其它请求吊销(其它进程的过滤器可能还没同步到)，按已吊销处理
+        开启token_buffer时只放入待写入队列，返回的黑名单记录为None
+        """
+        jti = self.payload[api_settings.JTI_CLAIM]
+        exp = self.payload["exp"]
+        if token_buffer.enabled:
+            blacklisted, created = None, token_buffer.add_blacklisted(jti, str(self), exp)
+        else:
+            blacklisted, created = super().blacklist()
+        revocation_filter.add(jti, exp)
+        if not created:
+            raise TokenRevoked(_("Token is blacklisted"))
+        return blacklisted, created
@@ -12,6 +12,8 @@ router.register("users", views.UserViewSet)
 urlpatterns = [
     # 用户登录
     path("auth/login", views.LoginView.as_view(), name="login"),
+    # 用户登录(异步，ASGI部署时使用)
+    path("auth/login/async", views.AsyncLoginView.as_view(), name="async-login"),
     # 用户退出
     path("auth/logout", views.LogoutView.as_view(), name="logout"),
     # 刷新token
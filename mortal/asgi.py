@@ -16,3 +16,8 @@ DJANGO_SETTINGS_MODULE_PATH = "mortal.settings"
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", DJANGO_SETTINGS_MODULE_PATH)
 
 application = get_asgi_application()
+
+# 登录走auth/login/async时密码在进程池中校验，启动时提前拉起子进程
+from utils.hashing import login_hash_pool  # noqa: E402
+
+login_hash_pool.warm()
@@ -1,3 +1,4 @@
+import os
 import sys
 from datetime import timedelta
 from pathlib import Path
@@ -37,6 +38,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "utils.metrics.MetricsMiddleware",  # 接口指标，放在最前面统计整个请求
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -80,6 +82,16 @@ DATABASES = {
     }
 }
 
+# 缓存，用户信息、异步路由、角色权限、分页总数的版本号保存在这里，改动时切换版本号让所有进程的缓存失效
+# 多进程部署(gunicorn多worker)时必须配置共享缓存，进程内的LocMemCache只能让当前进程失效，见system.users.checks
+CACHES = {
+    "default": (
+        {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": os.environ["REDIS_URL"]}
+        if os.environ.get("REDIS_URL")
+        else {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    )
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -122,7 +134,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # DRF配置
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "system.users.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ],
     # drf_yasg配置
@@ -139,6 +151,41 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,  # 刷新token后，旧token失效
 }
 
+# refresh token吊销过滤器，见system.users.revocation
+JWT_REVOCATION_FILTER = {
+    "CAPACITY": 100000,  # 每个过期日的布隆过滤器容量
+    "ERROR_RATE": 0.01,  # 误判率，误判时回表确认
+    "SYNC_INTERVAL": 5,  # 增量同步黑名单表的间隔秒数
+    "SYNC_OVERLAP": 1000,  # 增量同步时回退重新扫描的id数，覆盖晚提交的较小id
+    "REBUILD_INTERVAL": 60 * 60,  # 全量重建的间隔秒数
+}
+
+# OutstandingToken、BlacklistedToken延迟批量写入，见system.users.token_buffer
+# 开启后进程崩溃最多丢失FLUSH_INTERVAL秒内签发、吊销的记录
+JWT_TOKEN_WRITE_BEHIND = {
+    "ENABLED": False,
+    "MAX_BATCH": 500,  # 待写入达到这个数量时立即写入
+    "FLUSH_INTERVAL": 1,  # 后台写入间隔秒数
+    "MAX_PENDING": 10000,  # 写入失败时最多保留的待写入数
+}
+
+# JWT认证的用户缓存，见system.users.authentication
+# 本进程的修改立即失效，其它进程的修改(禁用、删除用户，调整角色)最多TIMEOUT秒后生效
+JWT_USER_CACHE = {
+    "MAX_SIZE": 10000,  # 最多缓存的用户数
+    "TIMEOUT": 10,  # 缓存秒数，多进程部署时即其它进程的最长延迟
+}
+
+# 密码哈希进程池大小，批量导入等场景把PBKDF2计算分散到多个进程，0表示在当前进程内计算
+PASSWORD_HASH_WORKERS = os.cpu_count() or 1
+# 登录密码校验进程池，与批量导入隔离
+LOGIN_HASH_WORKERS = max((os.cpu_count() or 1) // 2, 1)
+LOGIN_HASH_QUEUE_SIZE = 64  # 同时排队的登录校验数，超出返回429
+LOGIN_HASH_TIMEOUT = 5  # 等待校验结果的秒数，超时返回503
+
+# 认证后端，admin、session登录在当前线程校验密码；登录接口直接使用PooledModelBackend，在登录进程池中校验
+AUTHENTICATION_BACKENDS = ["system.users.backends.RoleModelBackend"]
+
 # CORS配置
 CORS_ALLOW_ORIGINS = ["*"]  # 允许跨域的域名列表，*代表允许所有域名跨域访问
 
@@ -202,3 +249,16 @@ LOGGING = {
 }
 # 指定项目中的用户模型
 AUTH_USER_MODEL = "users.User"
+
+# 接口指标，见utils.metrics，/metrics输出Prometheus文本格式
+METRICS = {
+    "ENABLED": True,
+    # /metrics默认返回404，开放后只应对内网开放，可以再限制来源地址、要求Authorization: Bearer <TOKEN>
+    "EXPOSE": False,
+    "ALLOWED_IPS": [],
+    "TOKEN": os.environ.get("METRICS_TOKEN") or None,
+    # 多进程部署(gunicorn多worker)时各worker定期把快照写到这个目录，/metrics合并所有worker；为空时只统计当前进程
+    # 退出的worker的快照合并进exited.json，重新部署时清空目录即可从零开始计数
+    "DIR": os.environ.get("METRICS_DIR") or None,
+    "FLUSH_INTERVAL": 5,  # worker写快照的间隔秒数
+}
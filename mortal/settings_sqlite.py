@@ -0,0 +1,29 @@
+# 本地SQLite配置，不依赖MySQL，用于本地开发和测试
+# DJANGO_SETTINGS_MODULE=mortal.settings_sqlite python manage.py test tests
+from mortal.settings import *  # noqa: F401,F403
+from mortal.settings import BASE_DIR
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.sqlite3",  # 测试时使用内存数据库
+    }
+}
+
+# 测试数据量大时PBKDF2太慢，本地使用MD5，不能用于生产
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+# 密码在当前进程内计算，不启动进程池
+PASSWORD_HASH_WORKERS = 0
+LOGIN_HASH_WORKERS = 0
+
+# 日志只输出到控制台，不需要logs目录
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "root": {"handlers": ["console"], "level": "WARNING"},
+}
+
+# 测试在单个进程内运行，不需要共享缓存
+SILENCED_SYSTEM_CHECKS = ["users.E001"]
@@ -4,6 +4,8 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework.documentation import include_docs_urls
 
+from utils.metrics import metrics_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Peanuts API",
@@ -27,4 +29,5 @@ urlpatterns = [
     path("", include("system.roles.urls")),
     path("api-auth/", include("rest_framework.urls")),
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
 ]
@@ -0,0 +1,74 @@
+# purge_expired_tokens命令：分批清理过期令牌、MySQL分区
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from system.users.token_purge import TokenPartitions
+
+
+class PurgeExpiredTokensTestCase(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        tokens = OutstandingToken.objects.bulk_create(
+            [
+                OutstandingToken(jti=f'jti{i}', token='t', expires_at=now + timedelta(days=-1 if i < 7 else 1))
+                for i in range(10)
+            ]
+        )
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens[::2]])
+
+    def test_purges_expired_rows_in_batches(self):
+        out = StringIO()
+        call_command('purge_expired_tokens', batch_size=3, report_every=1, stdout=out)
+        self.assertEqual(OutstandingToken.objects.count(), 3)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn('OutstandingToken 7条', lines[-1])
+
+    def test_max_batches(self):
+        call_command('purge_expired_tokens', batch_size=3, max_batches=1, stdout=StringIO())
+        self.assertEqual(OutstandingToken.objects.count(), 7)
+
+    def test_partitions_require_mysql(self):
+        with self.assertRaisesMessage(CommandError, '只支持MySQL'):
+            call_command('purge_expired_tokens', partitions='drop', stdout=StringIO())
+
+    def test_layout_sql_uses_actual_constraint_names(self):
+        partitions = TokenPartitions()
+        partitions.connection = mock.MagicMock(vendor='mysql')
+        partitions.connection.ops.quote_name = lambda name: f'`{name}`'
+        cursor = partitions.connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.side_effect = [
+            [
+                ('token_blacklist_blacklistedtoken', 'token_blacklist_blac_token_id_3cc7fe56_fk'),
+                ('token_blacklist_outstandingtoken', 'token_blacklist_outs_user_id_83bc629a_fk_tb_users'),
+            ],
+            [('token_blacklist_outstandingtoken_jti_hex_d9bdf6f7_uniq', 'jti')],
+        ]
+        sql = partitions.layout_sql(days_ahead=1)
+        self.assertEqual(
+            sql[:2],
+            [
+                'ALTER TABLE `token_blacklist_blacklistedtoken` '
+                'DROP FOREIGN KEY `token_blacklist_blac_token_id_3cc7fe56_fk`',
+                'ALTER TABLE `token_blacklist_outstandingtoken` '
+                'DROP FOREIGN KEY `token_blacklist_outs_user_id_83bc629a_fk_tb_users`',
+            ],
+        )
+        self.assertIn('DROP INDEX `token_blacklist_outstandingtoken_jti_hex_d9bdf6f7_uniq`', sql[2])
+        self.assertIn('ADD INDEX `token_blacklist_outstandingtoken_jti_idx` (`jti`)', sql[2])
+        self.assertIn('PARTITION BY RANGE', sql[3])
+        self.assertNotIn('<', ''.join(sql))
+
+    def test_invalid_options(self):
+        for options in ({'report_every': 0}, {'batch_size': 0}, {'max_batches': 0}, {'days_ahead': -1}):
+            with self.assertRaises(CommandError, msg=options):
+                call_command('purge_expired_tokens', stdout=StringIO(), **options)
+        self.assertEqual(OutstandingToken.objects.count(), 10)
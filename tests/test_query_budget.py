@@ -0,0 +1,343 @@
+# 接口查询预算：每个接口声明SQL条数和耗时上限，超出时输出重复执行的SQL
+# DJANGO_SETTINGS_MODULE=mortal.settings_sqlite python manage.py test tests
+import json
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, resolve, reverse
+from rest_framework.test import APIClient
+
+from system.menus import routes
+from system.menus.models import Menu
+from system.roles.models import Role
+from system.roles.permissions import permission_registry
+from system.users.authentication import user_cache
+from system.users.revocation import revocation_filter
+from system.users.tokens import RevocableRefreshToken
+
+User = get_user_model()
+
+# 不属于本项目接口的路由，按URL前缀排除
+EXCLUDED_PREFIXES = ("swagger/", "redoc/", "docs/", "api-auth/", "admin/")
+
+HTTP_METHODS = ("get", "post", "put", "patch", "delete")
+
+
+@dataclass
+class Case:
+    """
+    name: URL名称，同名的URL用path指定路径；args、payload可以是根据测试用例生成参数的函数
+    queries: SQL条数上限；seconds: 耗时上限
+    """
+
+    name: str
+    method: str
+    queries: int
+    args: object = None
+    payload: object = None
+    params: dict = field(default_factory=dict)
+    format: str = "json"
+    status: int = 200
+    seconds: float = 1.0
+    path: str = None
+
+    def __str__(self):
+        return f"{self.method.upper()} {self.path or self.name} {self.params or ''}".strip()
+
+    def get_url(self, test):
+        if self.path is not None:
+            return self.path
+        return reverse(self.name, args=self.args(test) if callable(self.args) else self.args)
+
+    def get_payload(self, test):
+        return self.payload(test) if callable(self.payload) else self.payload
+
+
+def upload(test):
+    content = "username,password,mobile,roleIds\n" + "".join(
+        f"import{i:03d},12345,13800000000,{test.role_ids[i % 3]}\n" for i in range(20)
+    )
+    return {"file": SimpleUploadedFile("users.csv", content.encode("utf-8"))}
+
+
+CASES = [
+    Case("login", "post", 2, payload=lambda test: {"username": "user000", "password": "12345"}),
+    Case("async-login", "post", 2, payload=lambda test: {"username": "user000", "password": "12345"}),
+    Case("logout", "post", 5, payload=lambda test: {"refresh_token": test.new_refresh_token()}),
+    Case("refresh", "post", 5, payload=lambda test: {"refresh": test.new_refresh_token()}),
+    Case(
+        "register",
+        "post",
+        10,
+        payload={
+            "username": "newuser", "password": "12345", "password_confirm": "12345", "mobile": "13800000000"
+        },
+        status=201,
+    ),
+    Case("user-list", "get", 4, params={"size": 20}),
+    # 用户名子串搜索，三元组候选作为子查询，与不带条件的列表条数相同
+    Case("user-list", "get", 4, params={"size": 20, "username": "user01"}),
+    Case(
+        "user-list",
+        "post",
+        12,
+        payload=lambda test: {
+            "username": "created", "password": "12345", "mobile": "13800000000", "roleIds": test.role_ids
+        },
+        status=201,
+    ),
+    Case("user-batch-delete", "post", 2, payload=lambda test: {"ids": test.user_ids[:10]}),
+    Case("user-bulk-import", "post", 7, payload=upload, format="multipart"),
+    Case("user-export", "get", 3),
+    Case("user-detail", "get", 3, args=lambda test: [test.user_ids[0]]),
+    Case(
+        "user-detail",
+        "put",
+        14,
+        args=lambda test: [test.user_ids[0]],
+        payload=lambda test: {
+            "username": "user000", "password": "12345", "mobile": "13900000000", "roleIds": test.role_ids[:2]
+        },
+    ),
+    Case("user-detail", "patch", 11, args=lambda test: [test.user_ids[0]], payload={"mobile": "13900000000"}),
+    Case("user-detail", "delete", 5, args=lambda test: [test.user_ids[0]], status=204),
+    Case("user-detail", "get", 0, path="/users/details"),
+    Case("async-routes", "get", 1),
+    Case("menu-list", "get", 1),
+    Case("menu-tree", "get", 1),
+    Case(
+        "menu-list",
+        "post",
+        12,
+        payload={
+            "name": "新目录", "code": "NewDir", "type": "MENU",
+            "children": [{"name": f"子菜单{i}", "code": f"NewDir{i}", "type": "MENU"} for i in range(10)],
+        },
+        status=201,
+    ),
+    Case("menu-detail", "get", 2, args=lambda test: [test.menu_ids[0]]),
+    Case(
+        "menu-detail",
+        "put",
+        7,
+        args=lambda test: [test.menu_ids[0]],
+        payload={"name": "目录0", "code": "Dir0", "type": "MENU"},
+    ),
+    Case("menu-detail", "patch", 6, args=lambda test: [test.menu_ids[0]], payload={"order": 9}),
+    Case("menu-detail", "delete", 8, args=lambda test: [test.menu_ids[0]], status=204),
+    Case("role-list", "get", 3, params={"size": 20}),
+    Case(
+        "role-list",
+        "post",
+        13,
+        payload=lambda test: {"name": "新角色", "code": "NEW_ROLE", "permissionIds": test.permission_ids},
+        status=201,
+    ),
+    Case("role-batch-delete", "post", 2, payload=lambda test: {"ids": test.role_ids[:3]}),
+    Case("role-export", "get", 2),
+    Case("role-detail", "get", 2, args=lambda test: [test.role_ids[0]]),
+    Case(
+        "role-detail",
+        "put",
+        13,
+        args=lambda test: [test.role_ids[0]],
+        payload=lambda test: {"name": "角色0", "code": "ROLE_0", "permissionIds": test.permission_ids[:5]},
+    ),
+    Case("role-detail", "patch", 8, args=lambda test: [test.role_ids[0]], payload={"order": 9}),
+    Case("role-detail", "delete", 4, args=lambda test: [test.role_ids[0]], status=204),
+    Case(
+        "role-members",
+        "post",
+        7,
+        args=lambda test: [test.role_ids[0]],
+        payload=lambda test: {"action": "replace", "userIds": test.user_ids[:30]},
+    ),
+    Case("role-menus", "get", 2, args=lambda test: [test.role_ids[0]]),
+    Case(
+        "role-menus",
+        "put",
+        4,
+        args=lambda test: [test.role_ids[0]],
+        payload=lambda test: {"menuIds": test.menu_ids[:20]},
+    ),
+    # 默认不开放，返回404
+    Case("metrics", "get", 0, status=404),
+]
+
+
+def get_api_routes():
+    """
+    本项目注册的全部路由，返回{(视图, 请求方法): URL模式}
+    """
+    result = {}
+
+    def walk(patterns, prefix=""):
+        for pattern in patterns:
+            route = prefix + str(pattern.pattern).lstrip("^")
+            if route.startswith(EXCLUDED_PREFIXES):
+                continue
+            if hasattr(pattern, "url_patterns"):
+                walk(pattern.url_patterns, route)
+                continue
+            callback = pattern.callback
+            actions = getattr(callback, "actions", None)
+            view_class = getattr(callback, "view_class", None)
+            if actions:
+                # HEAD由GET自动处理
+                methods = [method for method in actions if method in HTTP_METHODS]
+            elif view_class is not None:
+                methods = [method for method in HTTP_METHODS if hasattr(view_class, method)]
+            else:
+                methods = ["get"]
+            for method in methods:
+                result[(callback, method)] = route
+
+    walk(get_resolver().url_patterns)
+    return result
+
+
+def normalize_sql(sql):
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    return re.sub(r"\(\?(?:, \?)*\)", "(...)", sql)
+
+
+def describe_queries(queries):
+    """
+    按去掉参数后的SQL分组，重复执行的排在前面
+    """
+    counter = Counter(normalize_sql(query["sql"]) for query in queries)
+    duplicated = [(count, sql) for sql, count in counter.most_common() if count > 1]
+    lines = [f"重复执行的SQL({len(duplicated)}种):"] + [f"  {count}x {sql}" for count, sql in duplicated]
+    lines += ["全部SQL:"] + [f"  {i}. {query['sql']}" for i, query in enumerate(queries, 1)]
+    return "\n".join(lines)
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    有一定数据量(用户、角色、权限、菜单、授权)时逐个请求接口，SQL条数不随数据量增长
+    每个接口在回滚的事务中执行，互不影响；缓存在每次请求前清空并用一次请求预热认证
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password("12345")
+        cls.permission_ids = list(Permission.objects.order_by("pk").values_list("pk", flat=True)[:40])
+
+        # 多表继承的模型不能bulk_create
+        roles = [Role.objects.create(name=f"角色{i}", code=f"ROLE_{i}", order=i) for i in range(12)]
+        cls.role_ids = [role.pk for role in roles]
+        Role.permissions.through.objects.bulk_create(
+            [
+                Role.permissions.through(group_id=role.pk, permission_id=permission_id)
+                for i, role in enumerate(roles)
+                for permission_id in cls.permission_ids[i : i + 10]
+            ]
+        )
+
+        menus = []
+        for i in range(5):
+            directory = Menu.objects.create(name=f"目录{i}", code=f"Dir{i}", type="MENU", order=i)
+            menus.append(directory)
+            for j in range(4):
+                menu = Menu.objects.create(
+                    name=f"菜单{i}-{j}", code=f"Menu{i}{j}", type="MENU", parentId=directory, order=j
+                )
+                menus.append(menu)
+                for k in range(2):
+                    menus.append(
+                        Menu.objects.create(
+                            name=f"按钮{i}-{j}-{k}", code=f"Btn{i}{j}{k}", type=Menu.TYPE_BUTTON, parentId=menu
+                        )
+                    )
+        cls.menu_ids = [menu.pk for menu in menus]
+        Role.menus.through.objects.bulk_create(
+            [
+                Role.menus.through(role_id=role.pk, menu_id=menu_id)
+                for i, role in enumerate(roles)
+                for menu_id in cls.menu_ids[i * 4 : i * 4 + 20]
+            ]
+        )
+
+        users = User.objects.bulk_create(
+            [
+                User(username=f"user{i:03d}", mobile="13800000000", password=password, email=f"user{i:03d}@example.com")
+                for i in range(60)
+            ]
+        )
+        cls.user_ids = [user.pk for user in users]
+        User.roles.through.objects.bulk_create(
+            [
+                User.roles.through(user_id=user.pk, role_id=cls.role_ids[(i + offset) % len(roles)])
+                for i, user in enumerate(users)
+                for offset in range(2)
+            ]
+        )
+        # bulk_create不触发信号，统一重建索引和树路径
+        call_command("rebuild_trigram_index", stdout=StringIO())
+        cls.admin = User.objects.create_superuser(username="admin", mobile="13800000000", password="12345")
+
+    def setUp(self):
+        self.client = APIClient()
+        access = RevocableRefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def new_refresh_token(self):
+        return str(RevocableRefreshToken.for_user(User.objects.get(pk=self.user_ids[1])))
+
+    def warm_up(self):
+        """
+        缓存(含共享缓存中的列表总数)清空后预热，每个接口的SQL条数与执行顺序无关
+        """
+        cache.clear()
+        user_cache.clear()
+        routes.invalidate()
+        permission_registry.invalidate()
+        revocation_filter.rebuild()
+        self.client.get(reverse("user-detail"))
+
+    def request(self, case, url, payload):
+        if case.method == "get":
+            return self.client.get(url, case.params)
+        if case.name == "async-login":
+            return self.client.post(url, json.dumps(payload), content_type="application/json")
+        return getattr(self.client, case.method)(url, payload, format=case.format)
+
+    def test_budgets(self):
+        for case in CASES:
+            with self.subTest(case=str(case)):
+                with transaction.atomic():
+                    self.warm_up()
+                    url, payload = case.get_url(self), case.get_payload(self)
+                    with CaptureQueriesContext(connection) as context:
+                        start = time.perf_counter()
+                        response = self.request(case, url, payload)
+                        if response.streaming:
+                            b"".join(response.streaming_content)
+                        elapsed = time.perf_counter() - start
+                    transaction.set_rollback(True)
+                self.assertEqual(response.status_code, case.status, getattr(response, "data", None))
+                self.assertLessEqual(
+                    len(context), case.queries, f"{case}超出SQL预算\n{describe_queries(context.captured_queries)}"
+                )
+                self.assertLessEqual(elapsed, case.seconds, f"{case}耗时{elapsed:.3f}秒，超出预算")
+
+    def test_every_route_has_budget(self):
+        covered = {(resolve(case.get_url(self)).func, case.method) for case in CASES}
+        missing = sorted(
+            f"{method.upper()} {route}" for (view, method), route in get_api_routes().items()
+            if (view, method) not in covered
+        )
+        self.assertEqual(missing, [], "以下接口没有声明查询预算")
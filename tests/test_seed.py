@@ -0,0 +1,43 @@
+# seed命令：生成用户、角色、菜单等模拟数据
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from system.roles.models import Role
+
+
+class SeedCommandTestCase(TestCase):
+    def seed(self, prefix, seed=1):
+        call_command(
+            'seed', users=30, roles=4, roles_per_user=2, permissions_per_role=3, menu_depth=2, menu_fanout=3,
+            menus_per_role=5, seed=seed, batch_size=7, prefix=prefix, stdout=StringIO(),
+        )
+        users = get_user_model().objects.filter(username__startswith=prefix).order_by('pk')
+        return [(user.username[len(prefix):], user.name, user.mobile, user.date_joined) for user in users]
+
+    def test_seed(self):
+        rows = self.seed('a')
+        self.assertEqual(len(rows), 30)
+        user = get_user_model().objects.get(username='a0000007')
+        self.assertTrue(user.check_password('12345'))
+        self.assertEqual(user.roles.count(), 2)
+        self.assertEqual(Role.objects.filter(code__startswith='A_ROLE_').count(), 4)
+        self.assertEqual(Role.objects.get(code='A_ROLE_0').permissions.count(), 3)
+        self.assertEqual(Role.objects.get(code='A_ROLE_0').menus.count(), 5)
+        # 三元组索引随用户一起写入
+        response = APIClient().get(reverse('user-list'), {'username': '0000007'})
+        self.assertEqual([item['username'] for item in response.data['data']], ['a0000007'])
+
+    def test_deterministic(self):
+        self.assertEqual(self.seed('a'), self.seed('b'))
+        self.assertNotEqual(self.seed('c', seed=2), self.seed('d'))
+
+    def test_prefix_conflict(self):
+        self.seed('a')
+        with self.assertRaises(CommandError):
+            self.seed('a')
@@ -0,0 +1,46 @@
+# utils.base_serializers.BulkPrimaryKeyRelatedField：批量校验主键，以角色的permissionIds为例
+from django.contrib.auth.models import Permission
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from system.roles.models import Role
+
+
+class BulkPrimaryKeyFieldTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.permission_ids = list(Permission.objects.order_by('pk').values_list('pk', flat=True)[:20])
+
+    def create(self, permission_ids, code='BULK'):
+        return self.client.post(
+            reverse('role-list'),
+            {'name': code.lower(), 'code': code, 'permissionIds': permission_ids},
+            format='json',
+        )
+
+    def test_query_count_does_not_grow(self):
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.create(self.permission_ids[:2], 'FEW').status_code, status.HTTP_201_CREATED)
+        with CaptureQueriesContext(connection) as many:
+            response = self.create(self.permission_ids)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(many), len(few))
+        role = Role.objects.get(code='BULK')
+        self.assertEqual(set(role.permissions.values_list('pk', flat=True)), set(self.permission_ids))
+
+    def test_duplicate_ids_are_collapsed(self):
+        ids = self.permission_ids[:3]
+        response = self.create(ids + ids[::-1] + [str(ids[0])])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['data']['permissionIds'], ids)
+
+    def test_missing_ids_reported_together(self):
+        response = self.create(self.permission_ids[:2] + [999998, 999999])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('999998', str(response.data))
+        self.assertIn('999999', str(response.data))
+        self.assertFalse(Role.objects.filter(code='BULK').exists())
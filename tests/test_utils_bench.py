@@ -0,0 +1,64 @@
+# utils.bench与bench命令：场景执行、基线对比
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from system.roles.models import Role
+from utils.bench import compare, percentile
+
+
+class BenchCommandTestCase(TestCase):
+    def bench(self, baseline, **options):
+        output = os.path.join(self.tmp.name, 'result.json')
+        call_command(
+            'bench', iterations=3, warmup=1, users=20, allow_seed=True, output=output, baseline=baseline,
+            stdout=StringIO(), **options
+        )
+        with open(output, encoding='utf-8') as f:
+            return json.load(f)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.baseline = os.path.join(self.tmp.name, 'baseline.json')
+
+    def test_bench(self):
+        result = self.bench(self.baseline, update_baseline=True)
+        self.assertEqual(
+            list(result['results']),
+            ['login', 'refresh', 'users-list', 'users-search', 'async-routes', 'menu-tree', 'role-create'],
+        )
+        self.assertEqual(result['results']['login']['iterations'], 3)
+        self.assertGreater(result['results']['users-list']['queries'], 0)
+        self.assertIn('database', result['environment'])
+        # 每个场景在回滚的事务中执行
+        self.assertFalse(Role.objects.filter(code__startswith='BENCH_NEW_').exists())
+        # 与刚生成的基线对比，SQL条数相同
+        self.bench(self.baseline, scenario=['users-list'])
+
+    def test_regression(self):
+        result = self.bench(self.baseline, scenario=['menu-tree'])
+        result['results']['menu-tree']['queries'] -= 1
+        with open(self.baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        with self.assertRaises(CommandError):
+            self.bench(self.baseline, scenario=['menu-tree'])
+
+    def test_seed_requires_opt_in(self):
+        with self.assertRaisesMessage(CommandError, '--allow-seed'):
+            call_command('bench', stdout=StringIO())
+        self.assertFalse(get_user_model().all_objects.filter(username__startswith='bench').exists())
+
+    def test_compare(self):
+        base = {'queries': 3, 'p50_ms': 10.0}
+        self.assertEqual(compare({'a': {'queries': 3, 'p50_ms': 20.0}}, {'a': base}), [])
+        self.assertEqual(len(compare({'a': {'queries': 3, 'p50_ms': 20.0}}, {'a': base}, tolerance=0.3)), 1)
+        self.assertEqual(len(compare({'a': {'queries': 4, 'p50_ms': 10.0}}, {'a': base})), 1)
+        self.assertEqual(compare({'b': {'queries': 9, 'p50_ms': 99.0}}, {'a': base}), [])
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2.5)
@@ -0,0 +1,111 @@
+# utils.metrics：中间件采集、/metrics导出、多worker合并
+import os
+import tempfile
+import threading
+
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from utils.metrics import MetricsMiddleware, MetricsRegistry, merge_snapshots, registry, render
+
+
+@override_settings(METRICS={'EXPOSE': True})
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        registry.reset()
+
+    def test_route_metrics(self):
+        self.client.get(reverse('user-list'))
+        self.client.get(reverse('user-list'))
+        self.client.get('/no-such-page/')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode('utf-8')
+        self.assertIn('http_requests_total{route="user-list",method="GET",status="200"} 2', text)
+        self.assertIn('http_requests_total{route="unmatched",method="GET",status="404"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{route="user-list",method="GET"} 2', text)
+        self.assertIn('http_request_db_queries_bucket{route="user-list",method="GET",le="+Inf"} 2', text)
+        self.assertIn('http_response_bytes_count{route="user-list",method="GET"} 2', text)
+
+    async def test_async_requests(self):
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(MetricsMiddleware(view)))
+        response = await AsyncClient().post(
+            reverse('async-login'), {'username': 'nobody', 'password': '12345'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        text = render(*registry.collect())
+        self.assertIn('http_requests_total{route="async-login",method="POST",status="401"} 1', text)
+        self.assertIn('http_request_db_queries_sum{route="async-login",method="POST"} 1.0', text)
+
+    def test_dead_thread_shards_are_merged(self):
+        metrics = MetricsRegistry()
+        threads = [
+            threading.Thread(target=metrics.inc, args=('http_requests_total', ('login', 'POST', 200))) for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+            thread.join()
+        metrics.inc('http_requests_total', ('login', 'POST', 200))
+        text = render(*merge_snapshots([metrics.snapshot()]))
+        self.assertIn('http_requests_total{route="login",method="POST",status="200"} 6', text)
+        self.assertEqual(len(metrics.shards), 1)
+
+    def test_exposure(self):
+        with override_settings(METRICS={}):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_404_NOT_FOUND)
+        with override_settings(METRICS={'EXPOSE': True, 'ALLOWED_IPS': ['10.0.0.1']}):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+            response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with override_settings(METRICS={'EXPOSE': True, 'TOKEN': 'secret'}):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_merge_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            other = MetricsRegistry(directory=directory)
+            other.observe('http_request_db_queries', ('login', 'POST'), 3)
+            other.inc('http_requests_total', ('login', 'POST', 200))
+            other.flush()
+            # 模拟另一个还在运行的worker写入的快照(pid 1一直存在)
+            os.replace(other.get_path(), other.get_path('1-0'))
+            worker = MetricsRegistry(directory=directory)
+            worker.observe('http_request_db_queries', ('login', 'POST'), 30)
+            worker.inc('http_requests_total', ('login', 'POST', 200))
+            text = render(*worker.collect())
+        self.assertIn('http_requests_total{route="login",method="POST",status="200"} 2', text)
+        self.assertIn('http_request_db_queries_bucket{route="login",method="POST",le="3.0"} 1', text)
+        self.assertIn('http_request_db_queries_sum{route="login",method="POST"} 33.0', text)
+
+    def test_exited_workers_are_folded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for i in range(2):
+                exited = MetricsRegistry(directory=directory)
+                exited.inc('http_requests_total', ('login', 'POST', 200), 5)
+                exited.close()
+            # 被kill的worker没有机会合并，导出时按pid检测到已退出再合并
+            killed = MetricsRegistry(directory=directory)
+            killed.inc('http_requests_total', ('login', 'POST', 200), 7)
+            killed.flush()
+            os.replace(killed.get_path(), killed.get_path(f'{2 ** 22 + 1}-0'))
+            worker = MetricsRegistry(directory=directory)
+            worker.inc('http_requests_total', ('login', 'POST', 200))
+            for _ in range(2):
+                text = render(*worker.collect())
+                self.assertIn('http_requests_total{route="login",method="POST",status="200"} 18', text)
+            self.assertEqual(sorted(name for name in os.listdir(directory) if name.endswith('.json')), ['exited.json'])
+
+            # 相同pid的进程启动时间不同，不会覆盖旧进程的文件
+            self.assertNotEqual(MetricsRegistry(directory=directory).get_path(), worker.get_path())
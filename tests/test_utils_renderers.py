@@ -0,0 +1,75 @@
+# utils.renderers.FastJSONRenderer与DRF JSONRenderer输出一致
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from utils.renderers import Envelope, FastJSONRenderer, has_non_finite
+
+
+class FastJSONRendererTestCase(TestCase):
+    def setUp(self):
+        self.data = {
+            'list': [
+                {'id': i, 'name': f'用户{i}', 'score': 1.5, 'time': timezone.now(), 'tags': ('a', 'b')}
+                for i in range(3)
+            ],
+            'total': 3,
+            'text': 'line\u2028break',
+            1: None,
+        }
+
+    def test_same_as_json_renderer(self):
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(FastJSONRenderer().render(self.data), expected)
+        with mock.patch('utils.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.data), expected)
+
+    def test_non_finite_floats(self):
+        for value in (float('nan'), float('inf'), -float('inf')):
+            data = {'list': [{'score': value, 'avatar': None}]}
+            with self.assertRaises(ValueError):
+                JSONRenderer().render(data)
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render(data)
+            with mock.patch('utils.renderers.orjson', None):
+                with self.assertRaises(ValueError):
+                    FastJSONRenderer().render(data)
+
+        class LooseRenderer(FastJSONRenderer):
+            strict = False
+
+        data = {'score': float('nan')}
+        self.assertEqual(LooseRenderer().render(data), b'{"score":NaN}')
+
+    def test_envelope(self):
+        envelope = Envelope(success=True, code=1001, data=self.data)
+        self.assertEqual(FastJSONRenderer().render(envelope), JSONRenderer().render(envelope))
+        self.assertEqual(FastJSONRenderer().render(Envelope(data=[1])), b'{"data":[1]}')
+
+    def test_non_finite_values_through_default(self):
+        for data in ({'scores': {1.0, float('nan')}}, {'price': Decimal('Infinity')}):
+            with self.assertRaises(ValueError):
+                JSONRenderer().render(data)
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render(data)
+
+    def test_no_rescan_without_non_finite_values(self):
+        with mock.patch('utils.renderers.has_non_finite', wraps=has_non_finite) as check:
+            FastJSONRenderer().render(self.data)
+        # 只检查经过default转换的值(时间、元组)，不再遍历整个数据
+        self.assertTrue(all(call.args[0] is not self.data for call in check.call_args_list))
+
+    def test_viewset(self):
+        user = get_user_model().objects.create_user(username='render', mobile='13800000000', password='12345')
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(reverse('user-list'), {'size': 20})
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(json.loads(response.content)['data']['list'][0]['username'], 'render')
@@ -1,5 +1,31 @@
 # 模型基类
 from django.db import models
+from django.dispatch import Signal
+from django.utils import timezone
+
+# 逻辑删除不经过save/delete，批量逻辑删除后发送，参数：sender=模型, pk_set=主键集合
+soft_deleted = Signal()
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def soft_delete(self):
+        """
+        逻辑删除，一条UPDATE语句，不触发save/delete信号
+        """
+        return self.update(is_deleted=True, update_time=timezone.now())
+
+
+class SoftDeleteManagerMixin:
+    """
+    默认管理器只返回未逻辑删除的数据
+    """
+
+    def get_queryset(self):
+        return SoftDeleteQuerySet(self.model, using=self._db).filter(is_deleted=False)
+
+
+class SoftDeleteManager(SoftDeleteManagerMixin, models.Manager):
+    pass
 
 
 class BaseModel(models.Model):
@@ -11,6 +37,10 @@ class BaseModel(models.Model):
     update_time = models.DateTimeField("更新时间", auto_now=True)
     is_deleted = models.BooleanField("逻辑删除", default=False)
 
+    objects = SoftDeleteManager()
+    # 包含已逻辑删除的数据
+    all_objects = models.Manager.from_queryset(SoftDeleteQuerySet)()
+
     class Meta:
         # 抽象模型，用于继承，迁移的时候不会创建
         abstract = True
@@ -0,0 +1,122 @@
+# 序列化器基类
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import prefetch_related_objects
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+from rest_framework.validators import UniqueValidator
+
+
+class EagerLoadingMixin:
+    """
+    预加载声明，序列化器通过类属性声明自身(及嵌套序列化器)需要的关联数据，
+    视图集在get_queryset中调用setup_eager_loading，列表查询的SQL条数与分页大小无关
+    """
+
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def get_prefetch_related_fields(cls):
+        return cls.prefetch_related_fields
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        prefetch_fields = cls.get_prefetch_related_fields()
+        if prefetch_fields:
+            queryset = queryset.prefetch_related(*prefetch_fields)
+        return queryset
+
+    def save(self, **kwargs):
+        # 写入后预加载的关联已过期，返回数据前对写入的对象重新预加载，避免逐个关联对象查询
+        instance = super().save(**kwargs)
+        prefetch_fields = self.get_prefetch_related_fields()
+        if prefetch_fields:
+            instance._prefetched_objects_cache = {}
+            prefetch_related_objects([instance], *prefetch_fields)
+        return instance
+
+
+class SoftDeleteUniqueMixin:
+    """
+    唯一性校验包含已逻辑删除的数据：数据库的唯一约束对这些数据同样生效，
+    只按默认管理器校验时，重新使用已删除数据的用户名、编码会在写入时报IntegrityError
+    """
+
+    def build_standard_field(self, field_name, model_field):
+        field_class, field_kwargs = super().build_standard_field(field_name, model_field)
+        manager = getattr(model_field.model, "all_objects", None)
+        if manager is not None and field_kwargs.get("validators"):
+            field_kwargs["validators"] = [
+                (
+                    UniqueValidator(queryset=manager.all(), message=validator.message, lookup=validator.lookup)
+                    if isinstance(validator, UniqueValidator)
+                    else validator
+                )
+                for validator in field_kwargs["validators"]
+            ]
+        return field_class, field_kwargs
+
+
+class BatchDeleteSerializer(serializers.Serializer):
+    """
+    批量删除的参数
+    """
+
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    hard = serializers.BooleanField(default=False)
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """
+    主键列表一次IN查询解析，不存在的主键一起报错；queryset使用过滤了逻辑删除的管理器，已删除的数据按不存在处理
+    返回的对象按提交顺序去重，ModelSerializer保存时直接用于多对多写入，不再重复查询
+    """
+
+    default_error_messages = {
+        "does_not_exist": _("主键不存在: {pk_value}"),
+        "incorrect_type": _("主键类型错误: {pk_value}"),
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        queryset = self.child_relation.get_queryset()
+        pk_field = queryset.model._meta.pk
+        # dict按插入顺序去重，成员判断O(1)
+        pks, invalid = {}, []
+        for item in data:
+            try:
+                if isinstance(item, bool):
+                    raise DjangoValidationError(item)
+                pks[pk_field.to_python(item)] = None
+            except DjangoValidationError:
+                invalid.append(item)
+        if invalid:
+            self.fail("incorrect_type", pk_value=invalid)
+
+        # 默认排序可能带联表，按主键查找不需要
+        objects = queryset.order_by().in_bulk(list(pks))
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            self.fail("does_not_exist", pk_value=missing)
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    many=True时使用BulkManyRelatedField，单个主键时与PrimaryKeyRelatedField相同
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
@@ -1,37 +1,123 @@
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 
+from utils.base_models import BaseModel, soft_deleted
+from utils.base_serializers import BatchDeleteSerializer, EagerLoadingMixin
 from utils.constant import BusinessStatusCode
+from utils.count_strategy import CachedCount, ExactCount
+from utils.export import iter_chunks, stream_csv, stream_ndjson
+from utils.pagination import CustomPageNumberPagination, KeysetPagination
+from utils.renderers import Envelope, FastJSONRenderer
+
+
+class ExportMixin:
+    """
+    导出接口，需要的视图集显式继承，如：class UserViewSet(ExportMixin, CustomModelViewSet)
+    """
+
+    # 导出时每批查询的行数
+    export_chunk_size = 1000
+
+    # 导出，按列表相同的过滤条件分批查询，流式输出csv(默认)或ndjson(?type=ndjson)
+    @action(detail=False, methods=["get"])
+    def export(self, request, *args, **kwargs):
+        file_format = request.query_params.get("type", "csv")
+        if file_format not in ("csv", "ndjson"):
+            return CustomResponse(
+                data={"detail": "type只支持csv或ndjson"},
+                status=status.HTTP_400_BAD_REQUEST,
+                busi_status=BusinessStatusCode.DATA_VALIDATION_FAILED,
+            )
+        queryset = self.filter_queryset(self.get_queryset())
+        chunks = iter_chunks(queryset, self.cursor_ordering or ("pk",), self.export_chunk_size)
+
+        def serialize(chunk):
+            return self.get_serializer(chunk, many=True).data
+
+        if file_format == "csv":
+            fields = [name for name, field in self.get_serializer().fields.items() if not field.write_only]
+            content, content_type = stream_csv(chunks, serialize, fields), "text/csv; charset=utf-8"
+        else:
+            content, content_type = stream_ndjson(chunks, serialize), "application/x-ndjson; charset=utf-8"
+        response = StreamingHttpResponse(content, content_type=content_type)
+        filename = f"{queryset.model._meta.model_name}.{file_format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
 
 
 class CustomModelViewSet(viewsets.ModelViewSet):
-    pagination_class = PageNumberPagination
+    pagination_class = CustomPageNumberPagination
+    # 列表数据量大，JSON用FastJSONRenderer编码
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    # 游标分页的排序字段，如("-date_joined", "id")；设置后请求带cursor参数即切换为游标分页
+    cursor_ordering = None
+    # 分页总数统计策略：ExactCount、CachedCount、EstimatedCount
+    count_strategy = ExactCount()
 
-    def list(self, request, *args, **kwargs):
-        pageSize = request.query_params.get("size", None)
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            if self.cursor_ordering and KeysetPagination.cursor_query_param in self.request.query_params:
+                self._paginator = KeysetPagination(self.cursor_ordering)
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # 序列化器声明了预加载时，按声明一次性取出关联数据，避免N+1查询
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, "setup_eager_loading"):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
 
+    def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
 
-        if pageSize is not None:
-            self.pagination_class.page_size = pageSize
-            page = self.paginate_queryset(queryset)
-            if page is not None:
-                serializer = self.get_serializer(page, many=True)
-                return CustomResponse(
-                    {
-                        "list": serializer.data,
-                        "total": self.paginator.page.paginator.count,
-                        "pageSize": pageSize,
-                        "currentPage": 1
-                    },
-                    status=status.HTTP_200_OK,
-                    busi_status=BusinessStatusCode.OPERATION_SUCCESS,
-                )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return CustomResponse(
+                self.paginator.get_paginated_data(serializer.data),
+                status=status.HTTP_200_OK,
+                busi_status=BusinessStatusCode.OPERATION_SUCCESS,
+            )
 
         serializer = self.get_serializer(queryset, many=True)
         return CustomResponse(data=serializer.data, status=status.HTTP_200_OK, busi_status=BusinessStatusCode.OPERATION_SUCCESS)
 
+    # 批量删除，body为{"ids": [...], "hard": false}，模型支持逻辑删除时默认逻辑删除
+    @action(detail=False, methods=["post"], url_path="batch-delete")
+    def batch_delete(self, request, *args, **kwargs):
+        serializer = BatchDeleteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return CustomResponse(
+                data=serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST,
+                busi_status=BusinessStatusCode.DATA_VALIDATION_FAILED,
+            )
+        ids, hard = serializer.validated_data["ids"], serializer.validated_data["hard"]
+        model = self.queryset.model
+        if hard or not self.is_soft_delete():
+            # 物理删除时已逻辑删除的数据也一并清理
+            deleted = model._base_manager.filter(pk__in=ids).delete()[1].get(model._meta.label, 0)
+        else:
+            deleted = model._default_manager.filter(pk__in=ids).soft_delete()
+            # UPDATE不触发信号，手动让缓存的总数失效
+            CachedCount.invalidate(sender=model)
+            soft_deleted.send(sender=model, pk_set=set(ids))
+        return CustomResponse(
+            data={"deleted": deleted}, status=status.HTTP_200_OK, busi_status=BusinessStatusCode.OPERATION_SUCCESS
+        )
+
+    def is_soft_delete(self):
+        return issubclass(self.queryset.model, BaseModel)
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -45,8 +131,20 @@ class CustomModelViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        # 预加载的关联缓存在更新后已过期，清空后重新读取；EagerLoadingMixin的序列化器保存时已重新预加载
+        if getattr(instance, "_prefetched_objects_cache", None) and not isinstance(serializer, EagerLoadingMixin):
+            instance._prefetched_objects_cache = {}
         return CustomResponse(data=serializer.data, status=status.HTTP_200_OK, busi_status=BusinessStatusCode.OPERATION_SUCCESS)
 
+    def perform_destroy(self, instance):
+        # 支持逻辑删除的模型只打删除标记
+        if self.is_soft_delete():
+            type(instance)._default_manager.filter(pk=instance.pk).soft_delete()
+            CachedCount.invalidate(sender=type(instance))
+            soft_deleted.send(sender=type(instance), pk_set={instance.pk})
+        else:
+            instance.delete()
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         self.perform_destroy(instance)
@@ -55,9 +153,9 @@ class CustomModelViewSet(viewsets.ModelViewSet):
 
 class CustomResponse(Response):
     def __init__(self, data=None, busi_status=None, status=None, template_name=None, headers=None, exception=False, content_type=None):
-        datas = {
-            "success": True if status in (200, 201) else False,
-            "code": busi_status,
-            "data": data
-        }
+        datas = Envelope(
+            success=True if status in (200, 201) else False,
+            code=busi_status,
+            data=data,
+        )
         super().__init__(datas, status, template_name, headers, exception, content_type)
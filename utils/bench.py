@@ -0,0 +1,120 @@
+# 接口基准测试：进程内用测试客户端发请求，统计吞吐量、延迟分位数、每个请求的SQL条数和内存峰值
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from contextlib import ExitStack
+
+import django
+from django.conf import settings
+from django.db import connections
+
+from utils.metrics import QueryStats
+
+
+def percentile(values, p):
+    """
+    已排序的values的p分位数(0-100)，线性插值
+    """
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+def get_peak_rss():
+    # Linux下ru_maxrss单位是KB，macOS下是字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak * 1024 if sys.platform != "darwin" else peak
+
+
+def get_environment():
+    database = settings.DATABASES["default"]
+    return {
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "database": database["ENGINE"].rsplit(".", 1)[-1],
+        "password_hasher": settings.PASSWORD_HASHERS[0].rsplit(".", 1)[-1],
+    }
+
+
+class BenchmarkRunner:
+    """
+    scenario为无参函数，每次调用发一个请求并返回响应；先预热warmup次，再计时iterations次
+    SQL条数通过execute_wrapper统计，不开启DEBUG的SQL记录，对计时的影响很小
+    """
+
+    def __init__(self, iterations=200, warmup=20):
+        self.iterations = iterations
+        self.warmup = warmup
+
+    def run(self, scenario, expected_status=200):
+        for _ in range(self.warmup):
+            self.check(scenario(), expected_status)
+
+        queries = QueryStats()
+        latencies = []
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            started_at = time.perf_counter()
+            for _ in range(self.iterations):
+                start = time.perf_counter()
+                response = scenario()
+                latencies.append(time.perf_counter() - start)
+                self.check(response, expected_status)
+            elapsed = time.perf_counter() - started_at
+
+        latencies.sort()
+        return {
+            "iterations": self.iterations,
+            "throughput": round(self.iterations / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "queries": round(queries.count / self.iterations, 2),
+            "db_ms": round(queries.duration / self.iterations * 1000, 3),
+            # 进程启动以来的峰值，按场景执行的顺序单调不减
+            "peak_rss_mb": round(get_peak_rss() / 1024 / 1024, 1),
+        }
+
+    @staticmethod
+    def check(response, expected_status):
+        if response.status_code != expected_status:
+            content = getattr(response, "data", None) or response.content[:500]
+            raise AssertionError(f"状态码{response.status_code}，期望{expected_status}: {content}")
+
+
+def compare(results, baseline, tolerance=None):
+    """
+    与基线对比，返回回归的说明列表
+    SQL条数必须不多于基线；给出tolerance时，p50延迟超出基线的比例大于tolerance也算回归
+    延迟只在产生基线的同一台机器上有可比性，p95、p99和吞吐量受机器负载影响大，只记录不比较
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["queries"] > base["queries"]:
+            regressions.append(f"{name}: 每个请求的SQL条数 {base['queries']} -> {result['queries']}")
+        if tolerance is not None and result["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p50延迟 {base['p50_ms']}ms -> {result['p50_ms']}ms")
+    return regressions
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def dump_results(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": get_environment(), "results": results}, f, ensure_ascii=False, indent=2)
+        f.write("\n")
@@ -0,0 +1,103 @@
+# 分页总数统计策略
+import hashlib
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+
+
+class ExactCount:
+    """
+    精确统计，每次执行COUNT(*)
+    """
+
+    def count(self, queryset):
+        return queryset.count(), True
+
+
+class CachedCount:
+    """
+    按查询条件缓存统计结果，超时或模型有写入(post_save/post_delete)时失效
+    缓存命中的结果在超时时间内可能略有偏差(queryset.update等不触发信号的写入)，因此标记为非精确
+    """
+
+    key_prefix = "count"
+
+    def __init__(self, timeout=60):
+        self.timeout = timeout
+        self.registered = set()
+
+    def count(self, queryset):
+        model = queryset.model
+        self.register(model)
+        version_key = self.get_version_key(model)
+        version = cache.get_or_set(version_key, 1, None)
+        sql, params = queryset.query.sql_with_params()
+        signature = hashlib.md5(repr((queryset.db, sql, params)).encode("utf-8")).hexdigest()
+        key = f"{self.key_prefix}:{model._meta.label_lower}:{version}:{signature}"
+
+        total = cache.get(key)
+        if total is not None:
+            return total, False
+        total = queryset.count()
+        cache.set(key, total, self.timeout)
+        return total, True
+
+    @classmethod
+    def get_version_key(cls, model):
+        return f"{cls.key_prefix}:version:{model._meta.label_lower}"
+
+    @classmethod
+    def invalidate(cls, sender, **kwargs):
+        # 版本号自增后旧的缓存键不再被命中，等待超时自然淘汰
+        try:
+            cache.incr(cls.get_version_key(sender))
+        except ValueError:
+            cache.set(cls.get_version_key(sender), 1, None)
+
+    def register(self, model):
+        if model in self.registered:
+            return
+        uid = f"count-invalidate:{model._meta.label_lower}"
+        post_save.connect(self.invalidate, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(self.invalidate, sender=model, weak=False, dispatch_uid=uid)
+        self.registered.add(model)
+
+
+class EstimatedCount:
+    """
+    大表估算统计，表的统计行数超过threshold且查询不带额外过滤条件时，直接使用数据库统计信息(MySQL information_schema、PostgreSQL pg_class)
+    小表、带过滤条件的查询或不支持估算的数据库交给fallback统计
+    """
+
+    def __init__(self, threshold=100000, fallback=None):
+        self.threshold = threshold
+        self.fallback = fallback or ExactCount()
+
+    def count(self, queryset):
+        # 除默认管理器自带的条件(如逻辑删除)外没有其它过滤条件
+        if queryset.query.where == queryset.model._default_manager.all().query.where:
+            estimate = estimate_table_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.threshold:
+                return estimate, False
+        return self.fallback.count(queryset)
+
+
+def estimate_table_rows(model, using="default"):
+    """
+    从数据库统计信息读取表的估算行数，不支持的数据库返回None
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == "mysql":
+        sql = "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+    elif connection.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
@@ -0,0 +1,62 @@
+# 流式导出
+import csv
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from utils.pagination import KeysetPagination
+
+
+class Echo:
+    """
+    csv.writer需要一个文件对象，这里直接把写入的内容返回给生成器
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_chunks(queryset, ordering, chunk_size=1000):
+    """
+    按ordering做keyset分批读取，每批单独查询(含预加载)，内存占用与总行数无关
+    """
+    queryset = queryset.order_by(*ordering)
+    values = None
+    while True:
+        chunk_queryset = queryset
+        if values is not None:
+            chunk_queryset = queryset.filter(KeysetPagination.build_keyset_filter(ordering, values))
+        chunk = list(chunk_queryset[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        values = [getattr(chunk[-1], name.lstrip("-")) for name in ordering]
+
+
+# Excel等表格软件会把以这些字符开头的单元格当作公式执行
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def to_cell(value):
+    # 嵌套的列表、字典用json表示
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, cls=JSONEncoder, ensure_ascii=False)
+    # 防止公式注入，以公式字符开头的文本前加单引号，按普通文本显示
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(chunks, serialize, fields):
+    writer = csv.writer(Echo())
+    # 带BOM，Excel打开时按utf-8识别
+    yield "\ufeff" + writer.writerow(fields)
+    for chunk in chunks:
+        yield "".join(writer.writerow([to_cell(row.get(field)) for field in fields]) for row in serialize(chunk))
+
+
+def stream_ndjson(chunks, serialize):
+    for chunk in chunks:
+        yield "".join(json.dumps(row, cls=JSONEncoder, ensure_ascii=False) + "\n" for row in serialize(chunk))
@@ -0,0 +1,183 @@
+# 密码哈希进程池
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+from django.utils.crypto import get_random_string
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+
+
+class HashQueueFull(Throttled):
+    default_detail = _("请求过多，请稍后重试")
+
+
+class HashUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _("服务繁忙，请稍后重试")
+    default_code = "service_unavailable"
+
+
+def _init_worker(settings_module):
+    # spawn出来的子进程需要重新初始化django才能读取PASSWORD_HASHERS
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+
+    django.setup()
+
+
+class HashPool:
+    """
+    哈希进程池，进程数从settings读取，为0时在当前线程内计算
+    设置了queue_setting时限制同时排队的任务数，超出直接抛HashQueueFull，不让请求线程堆积
+    """
+
+    def __init__(self, workers_setting, queue_setting=None):
+        self.workers_setting = workers_setting
+        self.queue_setting = queue_setting
+        self.executor = None
+        self.semaphore = None
+        self.lock = threading.Lock()
+
+    @property
+    def workers(self):
+        return getattr(settings, self.workers_setting, os.cpu_count() or 1)
+
+    def get_executor(self):
+        if not self.workers:
+            return None
+        with self.lock:
+            if self.executor is None:
+                # 不用fork，避免复制web进程中的线程和数据库连接
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "mortal.settings"),),
+                )
+        return self.executor
+
+    def warm(self):
+        """
+        提前拉起所有子进程，避免第一波请求承担进程启动开销
+        """
+        executor = self.get_executor()
+        if executor is not None:
+            for future in [executor.submit(os.getpid) for _ in range(self.workers)]:
+                future.result()
+
+    def try_acquire(self):
+        if self.queue_setting is None:
+            return True
+        with self.lock:
+            if self.semaphore is None:
+                self.semaphore = threading.BoundedSemaphore(getattr(settings, self.queue_setting))
+        return self.semaphore.acquire(blocking=False)
+
+    def release(self, future=None):
+        if self.queue_setting is not None:
+            self.semaphore.release()
+
+    def submit(self, fn, *args):
+        if not self.try_acquire():
+            raise HashQueueFull()
+        executor = self.get_executor()
+        if executor is None:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self.release()
+            return future
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self.release()
+            self.reset()
+            raise HashUnavailable()
+        future.add_done_callback(self.release)
+        return future
+
+    def map(self, fn, iterable):
+        items = list(iterable)
+        executor = self.get_executor()
+        if executor is None or len(items) < 2:
+            return [fn(item) for item in items]
+        chunksize = max(1, len(items) // (self.workers * 4))
+        return list(executor.map(fn, items, chunksize=chunksize))
+
+    def reset(self):
+        # 子进程异常退出后进程池不可再用，丢弃后下次使用时重建
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+# 批量导入用的进程池
+import_hash_pool = HashPool("PASSWORD_HASH_WORKERS")
+# 登录校验用的进程池，与批量导入隔离，排队数有上限
+login_hash_pool = HashPool("LOGIN_HASH_WORKERS", queue_setting="LOGIN_HASH_QUEUE_SIZE")
+
+_dummy_password = None
+
+
+def get_dummy_password():
+    """
+    用户不存在时也做一次同样开销的校验，避免通过响应时间判断用户名是否存在
+    """
+    global _dummy_password
+    if _dummy_password is None:
+        _dummy_password = make_password(get_random_string(12))
+    return _dummy_password
+
+
+def make_passwords(passwords):
+    """
+    批量计算密码哈希，结果与输入顺序一致
+    """
+    return import_hash_pool.map(make_password, passwords)
+
+
+def verify_password_in_pool(password, encoded):
+    """
+    在登录进程池中校验密码，返回(是否正确, 是否需要重新计算哈希)
+    排队已满抛HashQueueFull(429)，超时或进程池异常抛HashUnavailable(503)
+    """
+    future = login_hash_pool.submit(verify_password, password, encoded)
+    try:
+        return future.result(timeout=settings.LOGIN_HASH_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        raise HashUnavailable()
+    except BrokenProcessPool:
+        login_hash_pool.reset()
+        raise HashUnavailable()
+
+
+async def averify_password_in_pool(password, encoded):
+    """
+    verify_password_in_pool的异步版本，等待期间不占用事件循环
+    """
+    future = login_hash_pool.submit(verify_password, password, encoded)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), settings.LOGIN_HASH_TIMEOUT)
+    except TimeoutError:
+        raise HashUnavailable()
+    except BrokenProcessPool:
+        login_hash_pool.reset()
+        raise HashUnavailable()
@@ -0,0 +1,48 @@
+# 进程内的LRU缓存
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    容量有上限，条目超过timeout秒过期；多线程共用一把锁
+    只在进程内有效，其它进程的写入需要依赖timeout收敛
+    """
+
+    def __init__(self, maxsize=10000, timeout=60):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self.data[key]
+                return default
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + self.timeout)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
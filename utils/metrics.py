@@ -0,0 +1,422 @@
+# 接口指标：按路由统计耗时、SQL条数、SQL耗时、响应字节数，Prometheus文本格式输出
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULTS = {"ENABLED": True, "DIR": None, "FLUSH_INTERVAL": 5, "EXPOSE": False, "ALLOWED_IPS": (), "TOKEN": None}
+METRICS = {**DEFAULTS, **getattr(settings, "METRICS", {})}
+# 已退出进程的快照合并到这个文件
+EXITED_NAME = "exited"
+
+# 名称 -> (说明, 桶上界)
+HISTOGRAMS = {
+    "http_request_duration_seconds": ("请求耗时(秒)", (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    "http_request_db_queries": ("每个请求执行的SQL条数", (0, 1, 2, 3, 5, 10, 20, 50, 100)),
+    "http_request_db_seconds": ("每个请求的SQL耗时(秒)", (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)),
+    "http_response_bytes": ("响应体字节数", (100, 1000, 10000, 100000, 1000000, 10000000)),
+}
+COUNTERS = {
+    "http_requests_total": "请求数",
+}
+HISTOGRAM_LABELS = ("route", "method")
+COUNTER_LABELS = ("route", "method", "status")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsRegistry:
+    """
+    每个线程写自己的分片，记录时不加锁，只有线程第一次记录时加锁登记分片；导出时合并所有分片
+    已结束线程的分片在登记新分片和导出时合并进retired后移除，分片数量不随线程的创建销毁增长
+    多进程部署时各进程定期把快照写到METRICS["DIR"]/<pid>-<启动时间>.json，导出时合并目录下所有进程的快照
+    进程退出时(或导出时发现进程已不存在)把它的快照合并进exited.json后删除，计数不回退，文件数量也不随重启增长
+    """
+
+    def __init__(self, directory=None, flush_interval=5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.local = threading.local()
+        # [(线程, 分片)]
+        self.shards = []
+        self.retired = new_shard()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+        self.owner = None
+
+    def get_shard(self):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = new_shard()
+            with self.lock:
+                self.prune()
+                self.shards.append((threading.current_thread(), shard))
+        return shard
+
+    def prune(self):
+        # 调用方持有self.lock；线程结束后不会再写它的分片，合并时不会漏计
+        alive = []
+        for thread, shard in self.shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                merge_shard(self.retired, shard)
+        self.shards = alive
+
+    def observe(self, name, labels, value):
+        histograms = self.get_shard()["histograms"]
+        key = (name, *labels)
+        item = histograms.get(key)
+        if item is None:
+            # 各桶的计数(不累计，最后一个为+Inf)、总和、次数
+            item = histograms[key] = [[0] * (len(HISTOGRAMS[name][1]) + 1), 0.0, 0]
+        item[0][bisect_left(HISTOGRAMS[name][1], value)] += 1
+        item[1] += value
+        item[2] += 1
+
+    def inc(self, name, labels, value=1):
+        counters = self.get_shard()["counters"]
+        key = (name, *labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def snapshot(self):
+        """
+        合并本进程的所有分片，返回可以JSON序列化的结构
+        """
+        merged = new_shard()
+        with self.lock:
+            self.prune()
+            merge_shard(merged, self.retired)
+            shards = [shard for thread, shard in self.shards]
+        for shard in shards:
+            merge_shard(merged, shard)
+        return to_snapshot(merged["histograms"], merged["counters"])
+
+    def get_name(self):
+        """
+        快照文件名<pid>-<启动时间>，pid被新进程复用时不会覆盖旧进程的文件；fork出的worker第一次使用时重新取名
+        """
+        pid = os.getpid()
+        if self.owner is None or self.owner[0] != pid:
+            self.owner = (pid, f"{pid}-{time.time_ns() // 1000}")
+        return self.owner[1]
+
+    def get_path(self, name=None):
+        return os.path.join(self.directory, f"{name or self.get_name()}.json")
+
+    def flush(self):
+        """
+        快照写到临时文件后原子替换，读取方不会读到写了一半的文件
+        """
+        write_json(self.get_path(), self.snapshot())
+        self.flushed_at = time.monotonic()
+
+    def maybe_flush(self):
+        if not self.directory or time.monotonic() - self.flushed_at < self.flush_interval:
+            return
+        # 只有一个线程写文件，其它线程不等待
+        if self.flush_lock.acquire(blocking=False):
+            try:
+                self.flush()
+            finally:
+                self.flush_lock.release()
+
+    def load(self, name):
+        try:
+            with open(self.get_path(name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def collect(self):
+        """
+        合并所有进程的快照，当前进程使用内存中的最新数据
+        """
+        snapshots = [self.snapshot()]
+        if self.directory:
+            own = self.get_name()
+            self.fold([name for name in self.list_names() if name != own and not is_running(name)])
+            for name in self.list_names():
+                snapshot = self.load(name) if name != own else None
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+        return merge_snapshots(snapshots)
+
+    def list_names(self):
+        return [name[: -len(".json")] for name in os.listdir(self.directory) if name.endswith(".json")]
+
+    def fold(self, names):
+        """
+        把已退出进程的快照合并进exited.json后删除
+        合并时持有目录下的文件锁；已合并的文件名记录在exited.json中，删除前中断也不会重复合并
+        """
+        if not names or fcntl is None:
+            return
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            exited = self.load(EXITED_NAME) or {"histograms": [], "counters": [], "folded": []}
+            # 只保留文件还在的记录，避免这个列表一直增长
+            folded = {name for name in exited["folded"] if os.path.exists(self.get_path(name))}
+            snapshots, added = [exited], []
+            for name in names:
+                if name in folded:
+                    continue
+                snapshot = self.load(name)
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+                    added.append(name)
+            if added or folded != set(exited["folded"]):
+                exited = {**to_snapshot(*merge_snapshots(snapshots)), "folded": sorted(folded | set(added))}
+                write_json(self.get_path(EXITED_NAME), exited)
+            for name in folded | set(added):
+                try:
+                    os.remove(self.get_path(name))
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        """
+        进程退出时写出最后的快照并合并进exited.json
+        """
+        if self.directory:
+            self.flush()
+            self.fold([self.get_name()])
+
+    def reset(self):
+        with self.lock:
+            for shard in [self.retired] + [shard for thread, shard in self.shards]:
+                shard["histograms"].clear()
+                shard["counters"].clear()
+
+
+def new_shard():
+    return {"histograms": {}, "counters": {}}
+
+
+def merge_shard(target, shard):
+    for key, (buckets, total, count) in list(shard["histograms"].items()):
+        merge_histogram(target["histograms"], key, buckets, total, count)
+    for key, value in list(shard["counters"].items()):
+        target["counters"][key] = target["counters"].get(key, 0) + value
+
+
+def write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def is_running(name):
+    """
+    快照文件名中的pid对应的进程是否还在；不是<pid>-<启动时间>格式的文件(如exited)按运行中处理，不会被合并
+    pid被其它进程复用时文件会保留到那个进程退出，计数不受影响
+    """
+    pid, _, started = name.partition("-")
+    if not pid.isdigit() or not started:
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge_snapshots(snapshots):
+    histograms, counters = {}, {}
+    for snapshot in snapshots:
+        for *key, buckets, total, count in snapshot["histograms"]:
+            if key[0] in HISTOGRAMS and len(buckets) == len(HISTOGRAMS[key[0]][1]) + 1:
+                merge_histogram(histograms, tuple(key), buckets, total, count)
+        for *key, value in snapshot["counters"]:
+            counters[tuple(key)] = counters.get(tuple(key), 0) + value
+    return histograms, counters
+
+
+def to_snapshot(histograms, counters):
+    return {
+        "histograms": [[*key, buckets, total, count] for key, (buckets, total, count) in histograms.items()],
+        "counters": [[*key, value] for key, value in counters.items()],
+    }
+
+
+def merge_histogram(histograms, key, buckets, total, count):
+    item = histograms.get(key)
+    if item is None:
+        histograms[key] = [list(buckets), total, count]
+        return
+    for i, value in enumerate(buckets):
+        item[0][i] += value
+    item[1] += total
+    item[2] += count
+
+
+def format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in pairs
+    )
+    return "{%s}" % ",".join(f'{name}="{value}"' for name, value in escaped)
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(histograms, counters):
+    """
+    Prometheus文本格式，桶计数为累计值
+    """
+    lines = []
+    for name, (help_text, bounds) in HISTOGRAMS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for key in sorted(key for key in histograms if key[0] == name):
+            buckets, total, count = histograms[key]
+            labels = key[1:]
+            cumulative = 0
+            for bound, value in zip((*bounds, "+Inf"), buckets):
+                cumulative += value
+                le = bound if bound == "+Inf" else format_value(float(bound))
+                lines.append(f"{name}_bucket{format_labels(HISTOGRAM_LABELS, labels, ('le', le))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(HISTOGRAM_LABELS, labels)} {format_value(float(total))}")
+            lines.append(f"{name}_count{format_labels(HISTOGRAM_LABELS, labels)} {count}")
+    for name, help_text in COUNTERS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for key in sorted(key for key in counters if key[0] == name):
+            lines.append(f"{name}{format_labels(COUNTER_LABELS, key[1:])} {counters[key]}")
+    return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry(directory=METRICS["DIR"], flush_interval=METRICS["FLUSH_INTERVAL"])
+
+
+def get_route(request):
+    """
+    路由按URL的名称统计，没有名称时用URL模式，未匹配的请求归为unmatched，避免标签数量无限增长
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match.route or "unmatched"
+
+
+class QueryStats:
+    """
+    execute_wrapper，统计一个请求内的SQL条数和耗时
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.stack = ExitStack()
+
+    def install(self):
+        for connection in connections.all():
+            self.stack.enter_context(connection.execute_wrapper(self))
+
+    def uninstall(self):
+        self.stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    """
+    放在MIDDLEWARE的最前面，统计整个请求的耗时
+    同时支持同步和异步，ASGI部署时不会让之后的中间件和异步视图退回同步执行
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not METRICS["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        if registry.directory:
+            os.makedirs(registry.directory, exist_ok=True)
+            atexit.register(registry.close)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = QueryStats()
+        start = time.perf_counter()
+        queries.install()
+        try:
+            response = self.get_response(request)
+        finally:
+            queries.uninstall()
+        self.record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryStats()
+        start = time.perf_counter()
+        # execute_wrapper按线程生效，异步请求的SQL在sync_to_async的线程中执行，在那个线程中安装和移除
+        await sync_to_async(queries.install)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(queries.uninstall)()
+        self.record(request, response, time.perf_counter() - start, queries)
+        return response
+
+    @staticmethod
+    def record(request, response, duration, queries):
+        route, method = get_route(request), request.method
+        registry.observe("http_request_duration_seconds", (route, method), duration)
+        registry.observe("http_request_db_queries", (route, method), queries.count)
+        registry.observe("http_request_db_seconds", (route, method), queries.duration)
+        if not response.streaming:
+            registry.observe("http_response_bytes", (route, method), len(response.content))
+        registry.inc("http_requests_total", (route, method, response.status_code))
+        registry.maybe_flush()
+
+
+def metrics_view(request):
+    """
+    默认不开放(EXPOSE)；开放后可以用ALLOWED_IPS限制来源地址，用TOKEN要求请求头Authorization: Bearer <TOKEN>
+    """
+    options = {**DEFAULTS, **getattr(settings, "METRICS", {})}
+    if not options["EXPOSE"]:
+        raise Http404
+    if options["ALLOWED_IPS"] and request.META.get("REMOTE_ADDR") not in options["ALLOWED_IPS"]:
+        return HttpResponse(status=403)
+    if options["TOKEN"] and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {options['TOKEN']}"
+    ):
+        response = HttpResponse(status=401)
+        response["WWW-Authenticate"] = "Bearer"
+        return response
+    return HttpResponse(render(*registry.collect()), content_type=CONTENT_TYPE)
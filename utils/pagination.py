@@ -0,0 +1,176 @@
+# 分页器
+import base64
+import binascii
+import datetime
+import json
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.settings import api_settings
+
+from utils.count_strategy import ExactCount
+
+
+class CountStrategyPaginator(Paginator):
+    """
+    总数交给统计策略计算，count_exact标记总数是否精确
+    """
+
+    def __init__(self, *args, count_strategy=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_strategy = count_strategy or ExactCount()
+        self.count_exact = True
+
+    @cached_property
+    def count(self):
+        total, self.count_exact = self.count_strategy.count(self.object_list)
+        return total
+
+
+class CustomPageNumberPagination(PageNumberPagination):
+    """
+    页码分页，每页条数从请求参数size读取，不再写入类属性(多线程下会相互覆盖)
+    未传size时不分页，保持原有接口行为
+    """
+
+    page_size_query_param = "size"
+    count_strategy = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # 视图上声明的count_strategy优先
+        count_strategy = getattr(view, "count_strategy", None) or self.count_strategy
+        self.django_paginator_class = partial(CountStrategyPaginator, count_strategy=count_strategy)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_page_size(self, request):
+        if self.page_size_query_param not in request.query_params:
+            return None
+        return super().get_page_size(request)
+
+    def get_paginated_data(self, data):
+        return {
+            "list": data,
+            "total": self.page.paginator.count,
+            "totalExact": self.page.paginator.count_exact,
+            "pageSize": self.page.paginator.per_page,
+            "currentPage": self.page.number,
+        }
+
+
+class KeysetPagination(BasePagination):
+    """
+    游标(keyset)分页，按ordering中的字段组合定位，翻到任意深度都只走一次索引范围扫描，不做OFFSET和COUNT
+    游标为不透明字符串，内容是边界行的排序字段值、翻页方向和页码
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "size"
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self, ordering):
+        self.ordering = tuple(ordering)
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(request.query_params[self.page_size_query_param], strict=True)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.fields = [self.get_field(queryset.model, name) for name in self.ordering]
+        values, reverse, self.page_number = self.decode_cursor(request)
+
+        ordering = self.invert_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.build_keyset_filter(ordering, values))
+
+        # 多取一条用于判断是否还有下一页
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.has_next = has_more if not reverse else values is not None
+        self.has_previous = has_more if reverse else values is not None
+        self.first_row = results[0] if results else None
+        self.last_row = results[-1] if results else None
+        return results
+
+    def get_paginated_data(self, data):
+        return {
+            "list": data,
+            "total": None,
+            "totalExact": False,
+            "pageSize": self.page_size,
+            "currentPage": self.page_number,
+            "next": self.get_next_cursor(),
+            "previous": self.get_previous_cursor(),
+        }
+
+    def get_next_cursor(self):
+        if not self.has_next or self.last_row is None:
+            return None
+        return self.encode_cursor(self.get_row_values(self.last_row), False, self.page_number + 1)
+
+    def get_previous_cursor(self):
+        if not self.has_previous or self.first_row is None:
+            return None
+        return self.encode_cursor(self.get_row_values(self.first_row), True, self.page_number - 1)
+
+    @staticmethod
+    def get_field(model, name):
+        name = name.lstrip("-")
+        return model._meta.pk if name == "pk" else model._meta.get_field(name)
+
+    @staticmethod
+    def invert_ordering(ordering):
+        return tuple(name[1:] if name.startswith("-") else "-" + name for name in ordering)
+
+    @staticmethod
+    def build_keyset_filter(ordering, values):
+        # (a, b) 在 (x, y) 之后 等价于 a > x or (a = x and b > y)，降序字段换成 <
+        condition = Q()
+        for index, name in enumerate(ordering):
+            lookup = "lt" if name.startswith("-") else "gt"
+            term = Q(**{f"{name.lstrip('-')}__{lookup}": values[index]})
+            for prev_name, prev_value in zip(ordering[:index], values[:index]):
+                term &= Q(**{prev_name.lstrip("-"): prev_value})
+            condition |= term
+        return condition
+
+    def get_row_values(self, row):
+        return [getattr(row, name.lstrip("-")) for name in self.ordering]
+
+    def encode_cursor(self, values, reverse, page_number):
+        payload = json.dumps({"v": values, "r": int(reverse), "p": page_number}, default=self.encode_value)
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def encode_value(value):
+        # 时间保留微秒精度，DjangoJSONEncoder会截断到毫秒导致边界行重复
+        if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+            return value.isoformat()
+        return str(value)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False, 1
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            values = payload["v"]
+            if len(values) != len(self.fields):
+                raise ValueError
+            values = [field.to_python(value) for field, value in zip(self.fields, values)]
+            return values, bool(payload["r"]), max(int(payload["p"]), 1)
+        except (TypeError, KeyError, ValueError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
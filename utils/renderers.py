@@ -0,0 +1,107 @@
+# 高速JSON渲染：安装了orjson时用orjson编码，否则退回标准库json，输出与DRF的JSONRenderer一致
+import json
+import math
+import pickle
+import re
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# pickle把float编码为BINFLOAT：b"G"加8字节大端IEEE 754，NaN、Infinity的11位指数全为1
+NON_FINITE_BINFLOAT = re.compile(rb"G[\x7f\xff][\xf0-\xff]")
+
+
+class Envelope(dict):
+    """
+    CustomResponse的响应外壳{success, code, data}，渲染时外壳和data分开编码再拼接
+    """
+
+
+def has_non_finite(data):
+    """
+    数据中是否有NaN、Infinity
+    """
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, Decimal):
+        return not data.is_finite()
+    if isinstance(data, dict):
+        return any(has_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple, set, frozenset)):
+        return any(has_non_finite(value) for value in data)
+    return False
+
+
+def may_have_non_finite(data):
+    """
+    orjson把NaN、Infinity编码为null且不经过default，原生float只能另外检查
+    由C实现的pickle遍历数据，只查找非有限的float，比Python逐个检查快一个数量级；
+    不会漏报，误报(其它字节恰好相同)或无法pickle时返回True，由has_non_finite逐个确认
+    """
+    try:
+        return NON_FINITE_BINFLOAT.search(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)) is not None
+    except Exception:
+        return True
+
+
+def dumps(data, strict=True):
+    """
+    编码为紧凑的UTF-8字节，不转义非ASCII字符；特殊类型交给DRF的JSONEncoder，日期时间格式与DRF一致
+    NaN、Infinity的处理与JSONRenderer一致：strict时抛出ValueError，否则输出NaN、Infinity
+    """
+    encoder = JSONEncoder()
+
+    def default(obj):
+        # Decimal、set、带tolist方法的对象等经DRF的JSONEncoder转换，转换结果在编码时检查
+        value = encoder.default(obj)
+        if has_non_finite(value):
+            raise ValueError("Out of range float values are not JSON compliant")
+        return value
+
+    if orjson is not None:
+        try:
+            body = orjson.dumps(data, default=default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            # 有NaN、Infinity，或超过64位的整数、嵌套过深等orjson不支持的情况，交给标准库
+            pass
+        else:
+            # 有NaN、Infinity时交给标准库，按strict抛出ValueError或输出NaN
+            if not may_have_non_finite(data) or not has_non_finite(data):
+                return body
+    return json.dumps(
+        data, default=encoder.default, ensure_ascii=False, allow_nan=not strict, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    视图通过renderer_classes选用；Envelope的外壳只有两个字段，data编码后直接拼接
+    请求指定缩进(Accept: application/json; indent=4)时交给JSONRenderer
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if isinstance(data, Envelope):
+            head = self.encode({key: value for key, value in data.items() if key != "data"})[:-1]
+            separator = b"," if len(head) > 1 else b""
+            return b'%s%s"data":%s}' % (head, separator, self.encode(data.get("data")))
+        return self.encode(data)
+
+    def encode(self, data):
+        body = dumps(data, strict=self.strict)
+        # 与JSONRenderer一致，转义JavaScript中不能直接出现的行分隔符
+        if b"\xe2\x80\xa8" in body or b"\xe2\x80\xa9" in body:
+            body = body.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return body
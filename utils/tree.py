@@ -0,0 +1,51 @@
+# 邻接表构建树
+
+
+def build_tree(nodes, root=None, depth=None, key="id", parent_key="parentId"):
+    """
+    由按兄弟顺序排好的节点(dict)构建树，每个节点只访问一次
+    root为None时从顶层节点开始，否则只返回以root为根的子树；depth限制返回的层数
+    上级不在nodes中的节点(如上级已停用)不会出现在结果中
+    """
+    children = {}
+    by_key = {}
+    for node in nodes:
+        by_key[node[key]] = node
+        children.setdefault(node[parent_key], []).append(node)
+
+    if root is None:
+        tree = children.get(None, [])
+    elif root in by_key:
+        tree = [by_key[root]]
+    else:
+        return None
+
+    level, current_depth = tree, 1
+    while level:
+        reached_limit = depth is not None and current_depth >= depth
+        next_level = []
+        for node in level:
+            node["children"] = [] if reached_limit else children.get(node[key], [])
+            next_level.extend(node["children"])
+        level, current_depth = next_level, current_depth + 1
+    return tree
+
+
+def compute_paths(pairs):
+    """
+    由(id, parent_id)计算物化路径，如"/1/5/12/"，返回({id: path}, 无法到达顶层的id列表)
+    上级不存在或成环的节点无法到达顶层
+    """
+    children = {}
+    for pk, parent_id in pairs:
+        children.setdefault(parent_id, []).append(pk)
+    paths = {}
+    level = [(pk, f"/{pk}/") for pk in children.get(None, [])]
+    while level:
+        next_level = []
+        for pk, path in level:
+            paths[pk] = path
+            next_level.extend((child, f"{path}{child}/") for child in children.get(pk, []))
+        level = next_level
+    unreachable = [pk for pk, parent_id in pairs if pk not in paths]
+    return paths, unreachable
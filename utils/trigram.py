@@ -0,0 +1,133 @@
+# 三元组(trigram)子串索引
+from django.db import models, transaction
+from django.db.models import Count
+from django.db.models.signals import post_save
+
+from utils.base_models import soft_deleted
+
+# 已注册的索引，{被索引的模型: TrigramIndex}，供重建索引命令使用
+trigram_registry = {}
+
+
+def make_trigrams(value):
+    """
+    把字符串拆成小写的三元组集合，长度不足3时返回空集合
+    """
+    value = str(value or "").lower()
+    return {value[i : i + 3] for i in range(len(value) - 2)}
+
+
+class BaseTrigram(models.Model):
+    """
+    三元组索引表基类，子类需要定义指向被索引模型的外键owner
+    """
+
+    field = models.CharField(max_length=50, verbose_name="字段")
+    gram = models.CharField(max_length=3, verbose_name="三元组")
+
+    class Meta:
+        abstract = True
+
+
+class TrigramIndex:
+    """
+    维护被索引模型的三元组索引表，并把icontains过滤改写成先按三元组求交集、再用icontains校验
+    """
+
+    def __init__(self, model, index_model, fields):
+        self.model = model
+        self.index_model = index_model
+        self.fields = tuple(fields)
+        trigram_registry[model] = self
+
+    def connect(self):
+        # 物理删除由owner外键级联处理，逻辑删除时清理对应的索引
+        dispatch_uid = f"trigram:{self.model._meta.label_lower}"
+        post_save.connect(self.handle_save, sender=self.model, weak=False, dispatch_uid=dispatch_uid)
+        soft_deleted.connect(self.handle_soft_delete, sender=self.model, weak=False, dispatch_uid=dispatch_uid)
+
+    def handle_save(self, sender, instance, raw=False, update_fields=None, **kwargs):
+        if raw:
+            return
+        # 只更新了未索引的字段(如登录时的last_login)时跳过
+        if update_fields is not None and not set(update_fields) & set(self.fields):
+            return
+        self.reindex(instance)
+
+    def handle_soft_delete(self, sender, pk_set, **kwargs):
+        self.index_model.objects.filter(owner_id__in=pk_set).delete()
+
+    def iter_grams(self, values):
+        for field, value in zip(self.fields, values):
+            for gram in make_trigrams(value):
+                yield field, gram
+
+    def reindex(self, instance):
+        """
+        对比已有的三元组，只删除和插入有变化的部分
+        """
+        wanted = set(self.iter_grams(self.get_values(instance)))
+        rows = self.index_model.objects.filter(owner_id=instance.pk)
+        existing = set(rows.values_list("field", "gram"))
+        removed = existing - wanted
+        added = wanted - existing
+        with transaction.atomic():
+            for field in {field for field, _ in removed}:
+                rows.filter(field=field, gram__in=[gram for f, gram in removed if f == field]).delete()
+            self.index_model.objects.bulk_create(
+                [self.index_model(owner_id=instance.pk, field=field, gram=gram) for field, gram in added],
+                ignore_conflicts=True,
+            )
+
+    def get_values(self, instance):
+        return [getattr(instance, field) for field in self.fields]
+
+    def bulk_index(self, rows, batch_size=2000):
+        """
+        批量写入新记录的索引，rows为(pk, *fields的值)，用于bulk_create等不触发信号的写入
+        """
+        self.index_model.objects.bulk_create(
+            [
+                self.index_model(owner_id=pk, field=field, gram=gram)
+                for pk, *values in rows
+                for field, gram in self.iter_grams(values)
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
+    def rebuild(self, batch_size=2000):
+        """
+        全量重建，按主键分批读取被索引模型并批量写入，返回处理的记录数
+        删除和写入在同一个事务中，重建期间其它连接仍读到旧索引，中途失败时旧索引保持不变
+        """
+        total = 0
+        last_pk = None
+        queryset = self.model._default_manager.order_by("pk").values_list("pk", *self.fields)
+        with transaction.atomic():
+            self.index_model.objects.all().delete()
+            while True:
+                chunk = queryset.filter(pk__gt=last_pk) if last_pk is not None else queryset
+                chunk = list(chunk[:batch_size])
+                if not chunk:
+                    return total
+                self.bulk_index(chunk, batch_size=batch_size)
+                total += len(chunk)
+                last_pk = chunk[-1][0]
+
+    def filter(self, queryset, field, term):
+        """
+        子串过滤，等价于 queryset.filter(<field>__icontains=term)
+        """
+        grams = make_trigrams(term)
+        if grams:
+            matched = (
+                self.index_model.objects.filter(field=field, gram__in=sorted(grams))
+                .values("owner_id")
+                .annotate(hits=Count("gram"))
+                .filter(hits=len(grams))
+                .values("owner_id")
+            )
+            queryset = queryset.filter(pk__in=matched)
+        # 三元组命中只说明包含所有片段，最终仍需要校验完整子串
+        return queryset.filter(**{f"{field}__icontains": term})